@@ -9,7 +9,8 @@ from database.db_track_codes import check_track_codes_existence, bulk_assign_tra
 from database.db_users import get_user_by_id
 from filters_and_config import IsAdmin, admin_ids
 from keyboards.user_keyboards import main_keyboard, cancel_keyboard
-from utils.message_common import extract_text_from_message
+from utils.file_intake import UploadError, open_upload, read_track_codes
+from utils.track_code_tokenizer import format_rejects
 
 admin_bulk_router = Router()
 logger = getLogger(__name__)
@@ -34,7 +35,7 @@ async def start_bulk_bind(message: Message, state: FSMContext):
     await state.set_state(BindTrackStates.waiting_for_track_codes)
     await message.answer(
         "📦 <b>Массовая привязка</b>\n\n"
-        "Отправьте список трек-кодов (текстом или .txt файлом).",
+        "Отправьте список трек-кодов (текстом или файлом .txt, .csv, .xlsx).",
         reply_markup=cancel_keyboard
     )
 
@@ -42,18 +43,25 @@ async def start_bulk_bind(message: Message, state: FSMContext):
 # --- 2. ОБРАБОТКА КОДОВ И ПРОВЕРКА В БД ---
 @admin_bulk_router.message(BindTrackStates.waiting_for_track_codes)
 async def process_track_codes(message: Message, state: FSMContext, bot: Bot):
-    # Используем extract_text_from_message с bot
-    raw_content = await extract_text_from_message(message, bot)
+    upload = await open_upload(message, bot)
 
-    if not raw_content:
+    if not upload:
         await message.answer("❌ Не удалось извлечь данные.", reply_markup=cancel_keyboard)
         return
 
-    # Превращаем текст в список уникальных кодов
-    track_codes = list(set([line.strip() for line in raw_content.splitlines() if line.strip()]))
+    # Файл читается потоком и сразу превращается в список уникальных кодов
+    async with upload:
+        try:
+            track_codes, rejects = await read_track_codes(upload, per_line=True)
+        except UploadError as e:
+            await message.answer(f"❌ {e}", reply_markup=cancel_keyboard)
+            return
 
     if not track_codes:
-        await message.answer("❌ Список трек-кодов пуст.", reply_markup=cancel_keyboard)
+        await message.answer(
+            "\n\n".join(filter(None, ["❌ Список трек-кодов пуст.", format_rejects(rejects)])),
+            reply_markup=cancel_keyboard
+        )
         return
 
     await message.answer(f"⏳ Проверка <b>{len(track_codes)}</b> кодов в базе данных...")
@@ -81,6 +89,9 @@ async def process_track_codes(message: Message, state: FSMContext, bot: Bot):
         preview = "\n".join(non_existing_codes[:5])
         text += f"\n\n<i>Первые 5 не найденных:</i>\n<code>{preview}</code>"
 
+    if rejects.rejected:
+        text += f"\n\n{format_rejects(rejects)}"
+
     text += "\n\nВведите внутренний ID пользователя (например: <b>FS1234</b> или просто <b>1234</b>):"
 
     await state.set_state(BindTrackStates.waiting_for_user_id)
@@ -1,11 +1,12 @@
 from logging import getLogger
+from time import time
 from typing import List
 
 from aiogram import F, Router, Bot
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
-from aiogram.types import Message, CallbackQuery
+from aiogram.types import Message, CallbackQuery, BufferedInputFile
 
 from admin.admin_search import admin_search_router
 from admin.admins_trackcode import admin_tc_router
@@ -15,11 +16,21 @@ from admin.broadcast import admin_broadcast_router
 from database.db_track_codes import drop_track_codes_table, delete_multiple_track_codes
 from database.db_track_admin import delete_shipped_track_codes
 from database.db_base import setup_database
+from database.db_info_content import info_content_cache
+from database.db_jobs import get_job_stats
+from database.db_track_events import get_status_event_stats
 from database.db_users import drop_users_table
-from filters_and_config import IsAdmin, admin_ids
+from filters_and_config import IsAdmin, admin_ids, WORKER_HEARTBEAT_INTERVAL
 from keyboards.admin_keyboards import admin_keyboard, contact_admin_keyboard, confirm_keyboard
 from keyboards.user_keyboards import cancel_keyboard
-from utils.message_common import extract_text_from_message
+from order_maker.thumbnail_cache import thumbnail_cache
+from utils.job_queue import job_queue
+from utils.file_intake import UploadError, open_upload, read_track_codes
+from utils.message_common import send_chunked_response
+from utils.metrics import metrics, format_metrics_summary
+from utils.sql_profiler import sql_profiler
+from utils.workers import get_workers_status, process_scope_note
+from utils.track_code_tokenizer import format_rejects
 
 admin_router = Router()
 admin_router.include_routers(
@@ -61,6 +72,147 @@ async def admin_contact_command(message: Message):
     )
 
 
+@admin_router.message(Command(commands="cache_stats"), IsAdmin(admin_ids))
+async def show_cache_stats(message: Message):
+    """Показывает статистику кэшей бота."""
+    content_stats = info_content_cache.stats()
+    thumb_stats = thumbnail_cache.stats()
+    await message.answer(
+        "📊 <b>Кэш контента</b>\n"
+        f"Ключей: <b>{content_stats['keys']}</b>\n"
+        f"Попадания: <b>{content_stats['hits']}</b>\n"
+        f"Промахи: <b>{content_stats['misses']}</b>\n"
+        f"Hit rate: <b>{content_stats['hit_rate']:.1%}</b>\n\n"
+        "🖼 <b>Кэш миниатюр бланков</b>\n"
+        f"Файлов: <b>{thumb_stats['keys']}</b> "
+        f"({thumb_stats['size_mb']:.1f} из {thumb_stats['max_mb']:.0f} МБ)\n"
+        f"Попадания: <b>{thumb_stats['hits']}</b>\n"
+        f"Промахи: <b>{thumb_stats['misses']}</b>\n"
+        f"Вытеснено: <b>{thumb_stats['evictions']}</b>\n"
+        f"Hit rate: <b>{thumb_stats['hit_rate']:.1%}</b>"
+    )
+
+
+@admin_router.message(Command(commands="workers"), IsAdmin(admin_ids))
+async def show_workers(message: Message):
+    """Показывает пульс входного процесса и воркеров (режим BOT_WORKERS > 0)."""
+    status = await get_workers_status()
+    if status is None:
+        await message.answer("Бот работает в одном процессе (BOT_WORKERS=0).")
+        return
+
+    now = time()
+    lines = ["⚙️ <b>Воркеры</b>"]
+
+    ingress = status.get("ingress")
+    if ingress:
+        lines.append(f"Входной процесс: pid {ingress['pid']}, раздано: {', '.join(map(str, ingress['routed']))}")
+
+    for index in sorted(key for key in status if isinstance(key, int)):
+        worker = status[index]
+        age = now - worker["ts"]
+        mark = "🟢" if age < WORKER_HEARTBEAT_INTERVAL * 3 else "🔴"
+        lines.append(
+            f"{mark} #{index} pid {worker['pid']}: обработано <b>{worker['processed']}</b>, "
+            f"ошибок {worker['errors']}, в работе {worker['in_flight']}, пульс {age:.0f} с назад"
+        )
+
+    await message.answer("\n".join(lines))
+
+
+@admin_router.message(Command(commands="metrics"), IsAdmin(admin_ids))
+async def show_metrics(message: Message, command: CommandObject):
+    """Сводка задержек хендлеров, запросов к БД и Bot API. /metrics reset — обнулить."""
+    if (command.args or "").strip().lower() == "reset":
+        metrics.reset()
+        await message.answer("Метрики обнулены." + process_scope_note())
+        return
+
+    await message.answer(format_metrics_summary() + process_scope_note())
+
+
+@admin_router.message(Command(commands="sql_profile"), IsAdmin(admin_ids))
+async def sql_profile_command(message: Message, command: CommandObject):
+    """
+    SQL-профайлер и поиск N+1 в текущем процессе (при BOT_WORKERS > 0 — в воркере, который обрабатывает
+    апдейты админа; остальные воркеры не профилируются).
+    /sql_profile on [порог] — включить, off — выключить, reset — очистить, без аргументов — отчёт.
+    """
+    args = (command.args or "").split()
+    action = args[0].lower() if args else "report"
+
+    if action == "on":
+        threshold = int(args[1]) if len(args) > 1 and args[1].isdigit() else None
+        sql_profiler.enable(threshold)
+        await message.answer(
+            f"🔬 SQL-профайлер включён. Порог N+1: <b>{sql_profiler.threshold}</b> одинаковых запросов за апдейт.\n"
+            "Отчёт: /sql_profile, выключить: /sql_profile off" + process_scope_note()
+        )
+        return
+
+    if action == "off":
+        sql_profiler.disable()
+    elif action == "reset":
+        sql_profiler.reset()
+        await message.answer("Статистика SQL-профайлера очищена." + process_scope_note())
+        return
+
+    report = sql_profiler.format_report() + process_scope_note()
+    if len(report) <= 4000:
+        await message.answer(report)
+    else:
+        await message.answer_document(
+            BufferedInputFile(sql_profiler.format_report(limit=50, html=False).encode(), filename="sql_profile.txt"),
+            caption="Отчёт SQL-профайлера" + process_scope_note()
+        )
+
+
+@admin_router.message(Command(commands="jobs"), IsAdmin(admin_ids))
+async def show_jobs(message: Message):
+    """
+    Показывает состояние фоновой очереди задач. Счётчики — из БД, общие для всех процессов;
+    «здесь» — задачи этого процесса (при BOT_WORKERS > 0 очередь работает только во входном процессе).
+    """
+    stats = await get_job_stats()
+    running = job_queue.stats()["running"] if job_queue.started else None
+
+    if not stats:
+        await message.answer("Очередь задач пуста.")
+        return
+
+    lines = ["🗂 <b>Фоновые задачи</b>"]
+    for job_type, counts in sorted(stats.items()):
+        lines.append(
+            f"<b>{job_type}</b>: в очереди {counts.get('pending', 0)}, "
+            f"выполняется {counts.get('running', 0)}"
+            + (f" (здесь {running.get(job_type, 0)})" if running is not None else "")
+            + ", "
+            f"готово {counts.get('done', 0)}, ошибок {counts.get('failed', 0)}"
+        )
+
+    await message.answer("\n".join(lines))
+
+
+@admin_router.message(Command(commands="track_stats"), IsAdmin(admin_ids))
+async def show_track_stats(message: Message, command: CommandObject):
+    """/track_stats [дней] — сколько кодов по дням пришло на склад, отправлено и прибыло (из истории статусов)."""
+    days = min(max(int(command.args), 1), 366) if command.args and command.args.isdigit() else 14
+    stats = await get_status_event_stats(days)
+
+    if not stats:
+        await message.answer(f"За {days} дн. статусы трек-кодов не менялись.")
+        return
+
+    lines = [f"📈 <b>Смены статусов за {days} дн.</b> (склад / отправлено / прибыло / добавлено)"]
+    for day, counts in stats.items():
+        lines.append(
+            f"{day:%d.%m}: {counts.get('in_stock', 0)} / {counts.get('shipped', 0)} / "
+            f"{counts.get('arrived', 0)} / {counts.get('out_of_stock', 0)}"
+        )
+
+    await send_chunked_response(message, "\n".join(lines))
+
+
 @admin_router.message(F.text == "Удалить отправленные трек-коды", IsAdmin(admin_ids))
 async def initiate_delete_shipped(message: Message, state: FSMContext):
     try:
@@ -93,17 +245,25 @@ async def process_list_delete_tracks(message: Message, state: FSMContext, bot: B
         await state.clear()
         return
 
-    content = await extract_text_from_message(message, bot)
+    upload = await open_upload(message, bot)
 
-    if not content:
+    if not upload:
         if not message.document:
             await message.answer("❌ Ошибка: отправьте текст или файл.", reply_markup=cancel_keyboard)
         return
 
-    track_codes_to_delete = [line.strip() for line in content.splitlines() if line.strip()]
+    async with upload:
+        try:
+            track_codes_to_delete, rejects = await read_track_codes(upload, per_line=True)
+        except UploadError as e:
+            await message.answer(f"❌ {e}", reply_markup=cancel_keyboard)
+            return
 
     if not track_codes_to_delete:
-        await message.answer("❌ Не найдено трек-кодов для удаления.", reply_markup=cancel_keyboard)
+        await message.answer(
+            "\n\n".join(filter(None, ["❌ Не найдено трек-кодов для удаления.", format_rejects(rejects)])),
+            reply_markup=cancel_keyboard
+        )
         return
 
     await state.update_data(track_codes_to_delete=track_codes_to_delete)
@@ -112,6 +272,7 @@ async def process_list_delete_tracks(message: Message, state: FSMContext, bot: B
     warning = (
         f"Вы собираетесь безвозвратно удалить <b>{len(track_codes_to_delete)}</b> кодов.\n"
         f"Первые 5: <code>{preview}</code>"
+        + (f"\n\n{format_rejects(rejects)}" if rejects.rejected else "")
     )
 
     await ask_confirmation(
@@ -5,11 +5,13 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.types import Message, CallbackQuery
 
-from database.db_track_codes import get_track_code
-from database.db_users import get_info_profile, get_user_by_id, update_user_by_internal_id
+from database.db_track_codes import get_track_codes_info
+from database.db_users import get_user_by_id, get_users_by_tg_ids, update_user_by_internal_id
 from filters_and_config import IsAdmin, admin_ids
 from keyboards.admin_keyboards import get_admin_edit_user_keyboard
 from keyboards.user_keyboards import cancel_keyboard, main_keyboard
+from utils.message_common import send_chunked_response
+from utils.track_code_tokenizer import extract_track_codes
 
 admin_search_router = Router()
 logger = getLogger(__name__)
@@ -62,7 +64,8 @@ async def _display_user_info(message: Message, user_data: dict, prefix: str = ""
 
 @admin_search_router.message(F.text == "Найти владельца трек-кода", IsAdmin(admin_ids))
 async def find_owner_start(message: Message, state: FSMContext):
-    await message.answer("Отправьте трек-код для поиска владельца.", reply_markup=cancel_keyboard)
+    await message.answer("Отправьте трек-код (или несколько через пробел/с новой строки) для поиска владельца.",
+                         reply_markup=cancel_keyboard)
     await state.set_state(AdminSearchAndEditStates.waiting_for_owner_search_code)
 
 
@@ -73,8 +76,20 @@ async def process_owner_search(message: Message, state: FSMContext):
         await state.clear()
         return
 
-    track_code = message.text.strip()
-    info = await get_track_code(track_code)
+    track_codes = extract_track_codes(message.text) if message.text else []
+
+    if not track_codes:
+        await message.answer("Пожалуйста, отправьте трек-код текстом.", reply_markup=cancel_keyboard)
+        return
+
+    codes_info = await get_track_codes_info(track_codes)
+    owners = await get_users_by_tg_ids(info['tg_id'] for info in codes_info.values() if info and info['tg_id'])
+
+    if len(codes_info) > 1:
+        await _display_owners_list(message, codes_info, owners)
+        return
+
+    track_code, info = next(iter(codes_info.items()))
 
     if not info:
         await message.answer(
@@ -97,8 +112,8 @@ async def process_owner_search(message: Message, state: FSMContext):
         )
         return
 
-    # Владелец есть, ищем его профиль
-    user_data = await get_info_profile(owner_tg_id)
+    # Владелец есть, берём его профиль
+    user_data = owners.get(owner_tg_id)
 
     if user_data:
         prefix = f"✅ <b>Владелец найден (Статус кода: {status})</b>"
@@ -114,6 +129,27 @@ async def process_owner_search(message: Message, state: FSMContext):
         )
 
 
+async def _display_owners_list(message: Message, codes_info: dict, owners: dict):
+    """Выводит владельцев для списка трек-кодов одним отчётом."""
+    lines = [f"🔎 <b>Владельцы {len(codes_info)} кодов:</b>\n"]
+
+    for code, info in codes_info.items():
+        if not info:
+            lines.append(f"• <code>{code}</code>: ❌ Нет в базе")
+        elif not info['tg_id']:
+            lines.append(f"• <code>{code}</code> ({info['status']}): ⚪️ Не привязан")
+        elif info['tg_id'] in owners:
+            owner = owners[info['tg_id']]
+            lines.append(
+                f"• <code>{code}</code> ({info['status']}): <code>FS{owner['id']:04d}</code> {owner['name']}"
+            )
+        else:
+            lines.append(f"• <code>{code}</code> ({info['status']}): ⚠️ TG ID <code>{info['tg_id']}</code> без профиля")
+
+    await send_chunked_response(message, "\n".join(lines))
+    await message.answer("Отправьте ещё коды или нажмите Отмена.", reply_markup=cancel_keyboard)
+
+
 # ************************************************
 # 2. ПОИСК ПОЛЬЗОВАТЕЛЯ ПО ID (FS...)
 # ************************************************
@@ -1,24 +1,32 @@
 from logging import getLogger
-from typing import Optional, List, Tuple
-from os import remove
-from re import search
+from typing import Any, AsyncIterator, Dict, Optional, List
 
 from aiogram import Bot, Router, F
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import Message, FSInputFile
-from openpyxl.styles import Alignment
-from openpyxl.workbook import Workbook
 
-
-from database.db_track_admin import add_or_update_track_codes_list
-from database.db_track_codes import get_all_track_codes, delete_multiple_track_codes
-from filters_and_config import IsAdmin, admin_ids
+from database.db_track_admin import TrackCodeRow, add_or_update_track_codes_list
+from database.db_track_codes import delete_multiple_track_codes
+from filters_and_config import IsAdmin, admin_ids, REPORT_GZIP_TEXT, EXPORT_JOBS
 from keyboards.user_keyboards import cancel_keyboard, main_keyboard
-from utils.message_common import extract_text_from_message
+from utils.file_intake import CSV, XLSX, Upload, UploadError, open_upload, iter_token_batches, read_track_codes
+from utils.job_queue import job_queue, JobPriority
+from utils.notification_dispatcher import notification_dispatcher
+from utils.progress import ThrottledProgress
+from utils.manifest_import import ManifestParser, iter_manifest_batches, parse_column_mapping
+from utils.track_code_tokenizer import ALL_KINDS, FS, TrackCodeTokenizer, format_rejects
+from .track_codes_report import export_track_codes_report
 
 logger = getLogger(__name__)
 
+# Как часто обновлять сообщение с прогрессом загрузки (секунды)
+PROGRESS_INTERVAL = 3.0
+MANIFEST_HINT = (
+    "\n\nМожно прислать таблицу склада (.xlsx/.csv) с колонками «Трек-код», «ID клиента», «Вес», «Дата» "
+    "или указать колонки в подписи к файлу: <code>код=B id=A вес=D дата=E</code>."
+)
+
 
 class AdminTrackCodeStates(StatesGroup):
     """Состояния для обработки ввода трек-кодов в админ-панели."""
@@ -32,47 +40,45 @@ admin_tc_router = Router()
 
 # --- ПАРСИНГ КОДОВ ---
 
-async def extract_parsed_codes(content: str, status: str) -> List[Tuple[str, Optional[int]]]:
+async def iter_code_rows(upload: Upload, tokenizer: TrackCodeTokenizer, status: str) -> AsyncIterator[List[TrackCodeRow]]:
+    """Пачки (код, ID) из списка кодов: для прибывших — внутренний ID пользователя из FS-кода."""
+    async for tokens in iter_token_batches(upload, tokenizer):
+        yield [(code, internal_id if status == "arrived" else None) for code, _, internal_id in tokens]
+
+
+async def import_batches(
+        batches: AsyncIterator[List[TrackCodeRow]],
+        status: str,
+        progress: Optional[ThrottledProgress] = None
+) -> Dict[str, Any]:
     """
-    Извлекает трек-коды и при необходимости, внутренний ID пользователя из текста или файла.
+    Пишет пачки в БД по мере чтения файла (каждая — своя транзакция) и обновляет прогресс.
+    Память — одна пачка: повторы внутри пачки схлопывает add_or_update_track_codes_list, а код,
+    повторённый в следующей пачке, уже имеет этот статус — второго уведомления не будет.
     """
-    codes_data = []
-    lines = list(filter(None, map(str.strip, content.splitlines())))
-
-    if status == "arrived":
-        # Ожидаем формат типа FSXXXX-YYMM-Z
-        for line in lines:
-            match = search(r"(FS\d{4}-\d{4}-\d+)", line)
-            if match:
-                full_track_code = match.group(1)
-                user_internal_id_match = search(r"FS(\d{4})", full_track_code)
-                user_internal_id = None
-
-                if user_internal_id_match:
-                    try:
-                        user_internal_id = int(user_internal_id_match.group(1))
-                        codes_data.append((full_track_code, user_internal_id))
-                    except ValueError:
-                        logger.warning(
-                            f"Не удалось преобразовать ID пользователя для '{full_track_code}'.")
-                else:
-                    logger.warning(f"Не найден ID в трек-коде 'прибывший': '{full_track_code}'.")
-            else:
-                logger.warning(f"Не удалось распарсить 'прибывший' трек-код из строки: '{line}'.")
-    else:
-        # Для in_stock и shipped просто извлекаем код
-        for line in lines:
-            if line:
-                codes_data.append((line, None))
+    totals = {"rows": 0, "seconds": 0.0, "notified": 0, "unknown_ids": 0, "unchanged": 0}
 
-    return codes_data
+    async for batch in batches:
+        if not batch:
+            continue
+
+        # Вызываем функцию сложной логики из db_track_admin
+        stats = await add_or_update_track_codes_list(batch, status)
+        notification_dispatcher.wake()
+        for key in totals:
+            totals[key] += stats[key]
+
+        if progress:
+            await progress.update(f"⏳ Записано в базу: <b>{totals['rows']}</b> кодов…")
+
+    return totals
 
 
 # --- ДОБАВЛЕНИЕ ТРЕК-КОДОВ ---
 
 @admin_tc_router.message(F.text == "️Добавить прибывшие на склад трек-коды", IsAdmin(admin_ids))
 async def add_in_stock_track_codes(message: Message, state: FSMContext):
-    await message.answer("Отправьте список кодов (текст/файл) для статуса <b>На складе</b>.",
+    await message.answer("Отправьте список кодов (текст/файл) для статуса <b>На складе</b>." + MANIFEST_HINT,
                          reply_markup=cancel_keyboard)
     await state.set_state(AdminTrackCodeStates.waiting_for_codes)
     await state.update_data(status="in_stock")
@@ -80,7 +86,7 @@ async def add_in_stock_track_codes(message: Message, state: FSMContext):
 
 @admin_tc_router.message(F.text == "Добавить отправленные трек-коды", IsAdmin(admin_ids))
 async def add_shipped_track_codes(message: Message, state: FSMContext):
-    await message.answer("Отправьте список кодов (текст/файл) для статуса <b>Отправлен</b>.",
+    await message.answer("Отправьте список кодов (текст/файл) для статуса <b>Отправлен</b>." + MANIFEST_HINT,
                          reply_markup=cancel_keyboard)
     await state.set_state(AdminTrackCodeStates.waiting_for_codes)
     await state.update_data(status="shipped")
@@ -89,7 +95,7 @@ async def add_shipped_track_codes(message: Message, state: FSMContext):
 @admin_tc_router.message(F.text == "Добавить прибывшие посылки", IsAdmin(admin_ids))
 async def add_arrived_track_codes(message: Message, state: FSMContext):
     await message.answer(
-        "Отправьте список кодов (<code>FSXXXX-YYMM-Z</code>) для статуса <b>Прибыл</b>.",
+        "Отправьте список кодов (<code>FSXXXX-YYMM-Z</code>) для статуса <b>Прибыл</b>." + MANIFEST_HINT,
         reply_markup=cancel_keyboard
     )
     await state.set_state(AdminTrackCodeStates.waiting_for_arrived_codes)
@@ -101,21 +107,48 @@ async def add_arrived_track_codes(message: Message, state: FSMContext):
 async def process_track_codes(message: Message, state: FSMContext, bot: Bot):
     """Обрабатывает ввод трек-кодов, добавляя или обновляя их в базе данных."""
 
-    # 1. Используем обновленный extract_text_from_message
-    content = await extract_text_from_message(message, bot)
+    upload = await open_upload(message, bot)
 
-    if not content:
-        # Если файл не читается, extract_text_from_message уже отправил ошибку
+    if not upload:
+        # Если файл не читается, open_upload уже отправил ошибку
         await state.clear()
         return
 
     data = await state.get_data()
     status = data.get("status")
 
-    codes_to_process: List[Tuple[str, Optional[int]]] = await extract_parsed_codes(content, status)
-
-    if not codes_to_process:
-        await message.answer("Не удалось получить трек-коды. Проверьте формат.", reply_markup=cancel_keyboard)
+    progress = None
+    if message.document:
+        progress_message = await message.answer("⏳ Читаю файл…")
+        progress = ThrottledProgress(bot, message.chat.id, progress_message.message_id, interval=PROGRESS_INTERVAL)
+
+    # Файл читается и пишется в БД пачками по UPLOAD_BATCH_SIZE кодов, целиком в памяти не лежит
+    async with upload:
+        try:
+            if upload.kind in (CSV, XLSX):
+                # Таблица склада: колонки кода, ID клиента, веса и даты (по заголовку или из подписи)
+                rejects = ManifestParser(status, parse_column_mapping(message.caption))
+                batches = iter_manifest_batches(upload, rejects)
+            else:
+                # Прибывшие посылки — только формат FSXXXX-YYMM-Z
+                rejects = TrackCodeTokenizer([FS] if status == "arrived" else ALL_KINDS, per_line=True)
+                batches = iter_code_rows(upload, rejects, status)
+            totals = await import_batches(batches, status, progress)
+        except UploadError as e:
+            await message.answer(f"❌ {e}", reply_markup=cancel_keyboard)
+            return
+
+    if rejects.rejected:
+        logger.warning(
+            "Не распознано строк со статусом %s: %s. Первые: %s",
+            status, rejects.rejected, rejects.rejects[:5]
+        )
+
+    if not totals["rows"]:
+        await message.answer(
+            "\n\n".join(filter(None, ["Не удалось получить трек-коды. Проверьте формат.", format_rejects(rejects)])),
+            reply_markup=cancel_keyboard
+        )
         return
 
     status_display = {
@@ -125,12 +158,17 @@ async def process_track_codes(message: Message, state: FSMContext, bot: Bot):
     }.get(status, ("", ""))
 
     status_display_text, action_text = status_display
-
-    # 2. Вызываем функцию сложной логики из db_track_admin
-    await add_or_update_track_codes_list(codes_to_process, status, bot)
+    rows_per_sec = totals["rows"] / totals["seconds"] if totals["seconds"] else float(totals["rows"])
 
     await message.answer(
-        f"✅ Успешно {action_text} <b>{len(codes_to_process)}</b> трек-кодов со статусом '<b>{status_display_text}</b>'.",
+        f"✅ Успешно {action_text} <b>{totals['rows']}</b> трек-кодов со статусом '<b>{status_display_text}</b>'.\n"
+        f"⏱ {totals['seconds']:.2f} сек. ({rows_per_sec:.0f} строк/сек), "
+        f"уведомлений в очереди: <b>{totals['notified']}</b>."
+        + (f"\nID клиентов не найдено у <b>{totals['unknown_ids']}</b> кодов (привязка не изменена)."
+           if totals["unknown_ids"] else "")
+        + (f"\nУже были в этом статусе: <b>{totals['unchanged']}</b> (повторно не уведомлялись)."
+           if totals["unchanged"] else "")
+        + (f"\n\n{format_rejects(rejects)}" if rejects.rejected else ""),
         reply_markup=main_keyboard
     )
     await state.clear()
@@ -153,18 +191,26 @@ async def process_track_codes_deletion(message: Message, state: FSMContext, bot:
         return
 
     # Теперь поддерживаем и файлы для удаления
-    content = await extract_text_from_message(message, bot)
+    upload = await open_upload(message, bot)
 
-    if not content:
+    if not upload:
         if not message.document:
             await message.answer("Не удалось получить трек-коды. Попробуйте снова.", reply_markup=cancel_keyboard)
         return
 
-    codes_to_delete = [line.strip() for line in content.splitlines() if line.strip()]
+    async with upload:
+        try:
+            codes_to_delete, rejects = await read_track_codes(upload, per_line=True)
+        except UploadError as e:
+            await message.answer(f"❌ {e}", reply_markup=cancel_keyboard)
+            return
     total_count = len(codes_to_delete)
 
     if not codes_to_delete:
-        await message.answer("Не найдено трек-кодов для удаления.", reply_markup=cancel_keyboard)
+        await message.answer(
+            "\n\n".join(filter(None, ["Не найдено трек-кодов для удаления.", format_rejects(rejects)])),
+            reply_markup=cancel_keyboard
+        )
         return
 
     try:
@@ -178,6 +224,9 @@ async def process_track_codes_deletion(message: Message, state: FSMContext, bot:
         if failed_count > 0:
             response_text += f"\n— Не найдено в БД: <b>{failed_count}</b>."
 
+        if rejects.rejected:
+            response_text += f"\n\n{format_rejects(rejects)}"
+
         await message.answer(response_text, reply_markup=main_keyboard)
         await state.clear()
 
@@ -189,55 +238,41 @@ async def process_track_codes_deletion(message: Message, state: FSMContext, bot:
 
 # --- ПОЛУЧЕНИЕ СПИСКА ТРЕК-КОДОВ (ОТЧЕТ) ---
 
-async def generate_track_codes_report(track_codes: list) -> Tuple[str, str]:
-    """Генерирует Excel и текстовый файлы со списком трек-кодов."""
-    excel_file_path = "track_codes.xlsx"
-    text_file_path = "track_codes.txt"
-    excel_workbook = Workbook()
-    sheet = excel_workbook.active
-    sheet.title = "Track Codes"
-
-    headers = ["ID", "Track Code", "Status", "User TG_ID"]
-    sheet.append(headers)
-
-    # Применяем стили к заголовкам
-    for col in sheet.iter_cols(min_row=1, max_row=1, min_col=1, max_col=len(headers)):
-        for cell in col:
-            cell.alignment = Alignment(horizontal="center", vertical="center")
-
-    with open(text_file_path, "w", encoding="utf-8") as text_file:
-        text_file.write("Список трек-кодов\n" + "=" * 40 + "\n")
+@job_queue.register(
+    "track_codes_export",
+    JobPriority.EXPORT,
+    concurrency=EXPORT_JOBS,
+    failure_text="⚠️ Не удалось сформировать отчёт по трек-кодам. Попробуйте ещё раз."
+)
+async def export_track_codes_job(bot: Bot, chat_id: int, payload: dict):
+    """Фоновая задача: выгружает все трек-коды и отправляет Excel и текстовый файл в чат."""
+    report = await export_track_codes_report(gzip_text=payload.get("gzip_text", False), executor=job_queue.executor)
+
+    if not report:
+        await bot.send_message(chat_id, "База трек-кодов пуста. Отчет не сгенерирован.", reply_markup=main_keyboard)
+        return
 
-        for row in track_codes:
-            # Принимаем, что row - это словарь, как возвращает get_all_track_codes
-            user_info = f"TG_ID: {row['tg_id']}" if row["tg_id"] else "Не привязан"
-            sheet.append([row["id"], row["track_code"], row["status"], user_info])
-            text_file.write(
-                f"{row['id']:03d}. Track Code: {row['track_code']}, Status: {row['status']}, User: {user_info}\n")
+    text_name = "track_codes.txt.gz" if report.gzip_text else "track_codes.txt"
 
-    excel_workbook.save(excel_file_path)
-    return excel_file_path, text_file_path
+    try:
+        await bot.send_document(chat_id, FSInputFile(report.excel_path, filename="track_codes.xlsx"))
+        await bot.send_document(chat_id, FSInputFile(report.text_path, filename=text_name))
+    finally:
+        # Очистка временных файлов
+        report.cleanup()
 
 
 @admin_tc_router.message(F.text == "Список трек-кодов", IsAdmin(admin_ids))
 async def generate_track_codes_list(message: Message):
-    """Генерирует и отправляет список всех трек-кодов в виде Excel и текстового файла."""
+    """Ставит выгрузку всех трек-кодов (Excel и текстовый файл) в фоновую очередь."""
     await message.delete()
 
-    # 4. Вызываем новую функцию get_all_track_codes из db_track_codes
-    track_codes = await get_all_track_codes()
+    job_id = await job_queue.enqueue(
+        "track_codes_export", message.chat.id, {"gzip_text": REPORT_GZIP_TEXT}, unique=True
+    )
 
-    if not track_codes:
-        await message.answer("База трек-кодов пуста. Отчет не сгенерирован.", reply_markup=main_keyboard)
+    if job_id is None:
+        await message.answer("⏳ Отчёт уже формируется, файлы придут в этот чат.")
         return
 
-    excel_file_path, text_file_path = await generate_track_codes_report(track_codes)
-    excel_file_input = FSInputFile(excel_file_path)
-    text_file_input = FSInputFile(text_file_path)
-
-    await message.answer_document(excel_file_input)
-    await message.answer_document(text_file_input)
-
-    # Очистка временных файлов
-    remove(excel_file_path)
-    remove(text_file_path)
+    await message.answer("⏳ Формирую отчёт по трек-кодам, файлы придут в этот чат.")
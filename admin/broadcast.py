@@ -1,16 +1,17 @@
-from asyncio import sleep
+from asyncio import Task, sleep, create_task
 from logging import getLogger
+from typing import Optional, List, Dict, Any, Set
 
 from aiogram import Router, F, Bot
-from aiogram.exceptions import TelegramForbiddenError, TelegramBadRequest, TelegramRetryAfter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.types import Message, CallbackQuery
 
-from database.db_users import get_all_user_tg_ids
+from database.db_broadcasts import get_broadcast_recipients, count_broadcast_recipients, create_broadcast_job
 from filters_and_config import IsAdmin, admin_ids
 from keyboards.admin_keyboards import admin_keyboard, get_broadcast_confirm_keyboard
 from keyboards.user_keyboards import cancel_keyboard
+from utils.broadcast_engine import broadcast_engine, BROADCAST_SEGMENTS
 
 admin_broadcast_router = Router()
 logger = getLogger(__name__)
@@ -21,48 +22,130 @@ class BroadcastStates(StatesGroup):
     confirm_send = State()
 
 
+# Сообщения альбома приходят по одному — собираем их, пока идут (секунды)
+ALBUM_COLLECT_DELAY = 1.0
+_album_buffers: Dict[str, List[Message]] = {}
+_album_tasks: Set[Task] = set()
+
+
+def _extract_media(message: Message) -> Optional[Dict[str, str]]:
+    """file_id медиа сообщения (для фото — самый большой размер) или None для текста."""
+    if message.photo:
+        return {"type": "photo", "file_id": message.photo[-1].file_id}
+    for media_type in ("video", "document", "animation", "audio"):
+        media = getattr(message, media_type)
+        if media:
+            return {"type": media_type, "file_id": media.file_id}
+    return None
+
+
+def _build_content(messages: List[Message]) -> Dict[str, Any]:
+    """Описание рассылки: откуда копировать и запасные file_id / HTML-текст."""
+    first = messages[0]
+    media = [item for item in map(_extract_media, messages) if item]
+    caption_message = next((m for m in messages if m.caption), first)
+
+    if len(messages) > 1:
+        content_type = "album"
+    else:
+        content_type = media[0]["type"] if media else "text"
+
+    return {
+        "content_type": content_type,
+        "text": caption_message.html_text if (caption_message.text or caption_message.caption) else "",
+        "source_chat_id": first.chat.id,
+        "source_message_ids": [m.message_id for m in messages],
+        "media": media
+    }
+
+
+async def _show_preview(bot: Bot, chat_id: int, content: Dict[str, Any], state: FSMContext) -> None:
+    """Показывает админу ровно то, что получат пользователи (копия сообщения), и выбор аудитории."""
+    await state.update_data(broadcast_content=content, broadcast_segment=None)
+
+    if len(content["source_message_ids"]) > 1:
+        await bot.copy_messages(chat_id, content["source_chat_id"], content["source_message_ids"])
+    else:
+        await bot.copy_message(chat_id, content["source_chat_id"], content["source_message_ids"][0])
+
+    recipients = await count_broadcast_recipients()
+    await bot.send_message(
+        chat_id,
+        "📋 <b>Предпросмотр рассылки</b> — выше.\n\n"
+        f"Получателей: <b>{recipients}</b>. Выберите аудиторию и подтвердите отправку.",
+        reply_markup=get_broadcast_confirm_keyboard(BROADCAST_SEGMENTS)
+    )
+    await state.set_state(BroadcastStates.confirm_send)
+
+
 @admin_broadcast_router.message(F.text == "Общая рассылка", IsAdmin(admin_ids))
 async def start_broadcast(message: Message, state: FSMContext):
     await state.clear()
     await message.answer(
         "📢 <b>Рассылка пользователям</b>\n\n"
-        "Отправьте текст сообщения для рассылки.\n"
+        "Отправьте сообщение для рассылки: текст, фото, видео, документ или альбом.\n"
         "Для отмены напишите: <code>Отмена</code>",
         reply_markup=cancel_keyboard
     )
     await state.set_state(BroadcastStates.waiting_for_text)
 
 
+@admin_broadcast_router.message(BroadcastStates.waiting_for_text, F.media_group_id)
+async def process_broadcast_album(message: Message, state: FSMContext, bot: Bot):
+    """Собирает альбом: первое сообщение запускает отложенную обработку, остальные дописываются в буфер."""
+    buffer = _album_buffers.setdefault(message.media_group_id, [])
+    buffer.append(message)
+    if len(buffer) > 1:
+        return
+
+    async def finish_album():
+        await sleep(ALBUM_COLLECT_DELAY)
+        messages = sorted(_album_buffers.pop(message.media_group_id, []), key=lambda m: m.message_id)
+        try:
+            await _show_preview(bot, message.chat.id, _build_content(messages), state)
+        except Exception as e:
+            logger.error("Ошибка подготовки альбома для рассылки: %s", e, exc_info=True)
+            await bot.send_message(message.chat.id, "Не удалось обработать альбом. Попробуйте ещё раз.")
+
+    # Не ждём в хендлере: иначе остальные сообщения альбома того же чата встанут в очередь за ним
+    task = create_task(finish_album())
+    _album_tasks.add(task)
+    task.add_done_callback(_album_tasks.discard)
+
+
 @admin_broadcast_router.message(BroadcastStates.waiting_for_text)
-async def process_broadcast_text(message: Message, state: FSMContext):
+async def process_broadcast_text(message: Message, state: FSMContext, bot: Bot):
     if message.text and message.text.lower() == "отмена":
         await state.clear()
         await message.answer("Рассылка отменена.", reply_markup=admin_keyboard)
         return
 
-    if not message.text:
-        await message.answer("Пожалуйста, отправьте текстовое сообщение.", reply_markup=cancel_keyboard)
+    if not (message.text or "").strip() and not _extract_media(message):
+        await message.answer(
+            "Пожалуйста, отправьте текст, фото, видео, документ или альбом.", reply_markup=cancel_keyboard
+        )
         return
 
-    broadcast_text = message.text.strip()
+    await _show_preview(bot, message.chat.id, _build_content([message]), state)
 
-    if not broadcast_text:
-        await message.answer("Сообщение не должно быть пустым.", reply_markup=cancel_keyboard)
-        return
 
-    await state.update_data(broadcast_text=broadcast_text)
+@admin_broadcast_router.callback_query(BroadcastStates.confirm_send, F.data.startswith("broadcast_segment:"))
+async def choose_broadcast_segment(callback: CallbackQuery, state: FSMContext):
+    key = callback.data.split(":", 1)[1]
+    segment = None if key == "all" else key
+    if segment not in BROADCAST_SEGMENTS:
+        await callback.answer()
+        return
 
-    preview_text = (
-        "📋 <b>Предпросмотр рассылки</b>\n\n"
-        f"{broadcast_text}\n\n"
-        "<b>Отправить это сообщение всем пользователям?</b>"
-    )
+    await state.update_data(broadcast_segment=segment)
+    recipients = await count_broadcast_recipients(segment)
+    await callback.answer(f"Получателей: {recipients}")
 
-    await message.answer(
-        preview_text,
-        reply_markup=get_broadcast_confirm_keyboard()
+    await callback.message.edit_text(
+        "📋 <b>Предпросмотр рассылки</b> — выше.\n\n"
+        f"Аудитория: {BROADCAST_SEGMENTS[segment]}. Получателей: <b>{recipients}</b>.",
+        reply_markup=get_broadcast_confirm_keyboard(BROADCAST_SEGMENTS, segment)
     )
-    await state.set_state(BroadcastStates.confirm_send)
 
 
 @admin_broadcast_router.callback_query(BroadcastStates.confirm_send, F.data == "broadcast_cancel")
@@ -83,91 +166,37 @@ async def execute_broadcast(callback: CallbackQuery, state: FSMContext, bot: Bot
     await callback.answer()
 
     data = await state.get_data()
-    broadcast_text = data.get("broadcast_text")
+    content = data.get("broadcast_content")
+    segment = data.get("broadcast_segment")
+    await state.clear()
 
-    if not broadcast_text:
-        await state.clear()
-        await callback.message.answer("Текст рассылки не найден. Начните заново.", reply_markup=admin_keyboard)
+    if not content:
+        await callback.message.answer("Сообщение для рассылки не найдено. Начните заново.", reply_markup=admin_keyboard)
         return
 
-    user_ids = await get_all_user_tg_ids()
-
-    total = len(user_ids)
-    sent_count = 0
-    blocked_count = 0
-    error_count = 0
+    user_ids = await get_broadcast_recipients(segment)
 
     await callback.message.edit_text(
-        f"📤 Начинаю рассылку...\nВсего получателей: <b>{total}</b>"
-    )
-
-    logger.info(
-        "Админ %s запустил рассылку. Получателей: %s",
-        callback.from_user.id,
-        total
+        f"📤 Начинаю рассылку...\nВсего получателей: <b>{len(user_ids)}</b>"
     )
 
-    for tg_id in user_ids:
-        try:
-            await bot.send_message(chat_id=tg_id, text=broadcast_text)
-            sent_count += 1
-            await sleep(0.05)
-
-        except TelegramForbiddenError:
-            blocked_count += 1
-            logger.info("Пользователь %s заблокировал бота. Пропускаю.", tg_id)
-
-        except TelegramRetryAfter as e:
-            logger.warning("Flood control при рассылке. Жду %s сек.", e.retry_after)
-            await sleep(e.retry_after)
-            try:
-                await bot.send_message(chat_id=tg_id, text=broadcast_text)
-                sent_count += 1
-            except TelegramForbiddenError:
-                blocked_count += 1
-            except Exception as retry_error:
-                error_count += 1
-                logger.error(
-                    "Ошибка повторной отправки пользователю %s: %s",
-                    tg_id,
-                    retry_error,
-                    exc_info=True
-                )
-
-        except TelegramBadRequest as e:
-            error_count += 1
-            logger.warning(
-                "TelegramBadRequest при отправке пользователю %s: %s",
-                tg_id,
-                e
-            )
-
-        except Exception as e:
-            error_count += 1
-            logger.error(
-                "Ошибка рассылки пользователю %s: %s",
-                tg_id,
-                e,
-                exc_info=True
-            )
-
-    await state.clear()
-
-    report = (
-        "✅ <b>Рассылка завершена</b>\n\n"
-        f"👥 Всего в базе: <b>{total}</b>\n"
-        f"📨 Отправлено: <b>{sent_count}</b>\n"
-        f"🚫 Заблокировали бота: <b>{blocked_count}</b>\n"
-        f"⚠️ Другие ошибки: <b>{error_count}</b>"
+    job_id = await create_broadcast_job(
+        admin_chat_id=callback.message.chat.id,
+        progress_message_id=callback.message.message_id,
+        content=content,
+        recipients=user_ids,
+        segment=segment
     )
 
-    await callback.message.answer(report, reply_markup=admin_keyboard)
-
     logger.info(
-        "Рассылка завершена. admin=%s total=%s sent=%s blocked=%s errors=%s",
+        "Админ %s запустил рассылку %s (%s, сегмент=%s). Получателей: %s",
         callback.from_user.id,
-        total,
-        sent_count,
-        blocked_count,
-        error_count
+        job_id,
+        content["content_type"],
+        segment,
+        len(user_ids)
     )
+
+    # Рассылка идёт в фоне (в воркере её заберёт входной процесс); прогресс обновляется в этом же
+    # сообщении, по окончании придёт отчёт
+    broadcast_engine.launch(bot, job_id)
@@ -0,0 +1,117 @@
+from asyncio import get_running_loop
+from concurrent.futures import Executor
+from gzip import open as gzip_open
+from logging import getLogger
+from os import close, remove, path
+from tempfile import mkstemp
+from typing import List, Dict, Optional
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment
+
+from database.db_track_codes import iter_track_codes_pages
+
+logger = getLogger(__name__)
+
+REPORT_HEADERS = ["ID", "Track Code", "Status", "User TG_ID"]
+
+
+def _make_temp_path(suffix: str) -> str:
+    """Создаёт уникальный временный файл, чтобы параллельные выгрузки не перетирали друг друга."""
+    fd, file_path = mkstemp(prefix="track_codes_", suffix=suffix)
+    close(fd)
+    return file_path
+
+
+class TrackCodesReportWriter:
+    """
+    Потоковая запись отчёта по трек-кодам: Excel в write-only режиме openpyxl и текстовый файл
+    (по желанию сжатый gzip). Методы синхронные — вызываются в executor, не блокируя event loop.
+    """
+
+    def __init__(self, gzip_text: bool = False):
+        self.gzip_text = gzip_text
+        self.rows_written = 0
+        self.excel_path = _make_temp_path(".xlsx")
+        self.text_path = _make_temp_path(".txt.gz" if gzip_text else ".txt")
+
+        self._workbook = Workbook(write_only=True)
+        self._sheet = self._workbook.create_sheet("Track Codes")
+
+        header_cells = []
+        for title in REPORT_HEADERS:
+            cell = WriteOnlyCell(self._sheet, value=title)
+            cell.alignment = Alignment(horizontal="center", vertical="center")
+            header_cells.append(cell)
+        self._sheet.append(header_cells)
+
+        opener = gzip_open if gzip_text else open
+        self._text_file = opener(self.text_path, "wt", encoding="utf-8")
+        self._text_file.write("Список трек-кодов\n" + "=" * 40 + "\n")
+
+    def write_rows(self, rows: List[Dict]) -> None:
+        """Дописывает страницу строк в оба файла."""
+        lines = []
+        for row in rows:
+            user_info = f"TG_ID: {row['tg_id']}" if row["tg_id"] else "Не привязан"
+            self._sheet.append([row["id"], row["track_code"], row["status"], user_info])
+            lines.append(
+                f"{row['id']:03d}. Track Code: {row['track_code']}, Status: {row['status']}, User: {user_info}\n")
+
+        self._text_file.writelines(lines)
+        self.rows_written += len(rows)
+
+    def close(self) -> None:
+        """Сохраняет Excel и закрывает текстовый файл."""
+        self._text_file.close()
+        self._workbook.save(self.excel_path)
+
+    def cleanup(self) -> None:
+        """Удаляет временные файлы отчёта."""
+        if not self._text_file.closed:
+            self._text_file.close()
+
+        for file_path in (self.excel_path, self.text_path):
+            try:
+                if path.exists(file_path):
+                    remove(file_path)
+            except OSError as e:
+                logger.error("Не удалось удалить временный файл отчёта %s: %s", file_path, e)
+
+
+async def export_track_codes_report(
+    gzip_text: bool = False,
+    page_size: int = 5000,
+    executor: Optional[Executor] = None
+) -> Optional[TrackCodesReportWriter]:
+    """
+    Выгружает все трек-коды в Excel и текстовый файл.
+    Чтение следующей страницы из БД идёт параллельно с записью предыдущей в executor
+    (None — executor по умолчанию).
+    Возвращает writer с путями к файлам или None, если база пуста. Файлы удаляет вызывающий (cleanup).
+    """
+    loop = get_running_loop()
+    writer = await loop.run_in_executor(executor, TrackCodesReportWriter, gzip_text)
+
+    try:
+        pending_write = None
+        async for page in iter_track_codes_pages(page_size):
+            if pending_write:
+                await pending_write
+            pending_write = loop.run_in_executor(executor, writer.write_rows, page)
+
+        if pending_write:
+            await pending_write
+
+        await loop.run_in_executor(executor, writer.close)
+    except Exception:
+        writer.cleanup()
+        raise
+
+    if not writer.rows_written:
+        writer.cleanup()
+        return None
+
+    logger.info("Отчёт по трек-кодам сформирован. rows=%s gzip=%s", writer.rows_written, gzip_text)
+    return writer
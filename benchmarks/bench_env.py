@@ -0,0 +1,9 @@
+"""
+Окружение для бенчмарков. Импортируется ДО модулей бота: подставляет тестовые BOT_TOKEN/ADMIN_IDS
+и отдельную базу (BENCH_DATABASE_URL, по умолчанию локальный SQLite), чтобы не трогать рабочую БД.
+"""
+from os import environ
+
+environ.setdefault("BOT_TOKEN", "123456:BENCHMARK")
+environ.setdefault("ADMIN_IDS", "1,2")
+environ["DATABASE_URL"] = environ.get("BENCH_DATABASE_URL", "sqlite+aiosqlite:///bench.db")
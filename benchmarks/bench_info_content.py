@@ -0,0 +1,67 @@
+"""
+Бенчмарк загрузки контента экрана: по ключу на запрос (как было), один IN-запрос и прогретый кэш.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_info_content [--iterations 200]
+"""
+from argparse import ArgumentParser
+from asyncio import run
+from json import dumps
+from statistics import mean, quantiles
+from time import perf_counter
+
+import benchmarks.bench_env  # noqa: F401  (должен идти до модулей бота)
+
+from database.db_base import setup_database
+from database.db_info_content import (
+    CONTENT_BUNDLES, info_content_cache, _load_info_contents, get_content_bundle, update_info_content
+)
+
+
+def _summary(samples: list) -> dict:
+    p95 = quantiles(samples, n=20)[-1] if len(samples) > 1 else samples[0]
+    return {"mean_ms": round(mean(samples) * 1000, 3), "p95_ms": round(p95 * 1000, 3)}
+
+
+async def _measure(coro_factory, iterations: int) -> dict:
+    samples = []
+    for _ in range(iterations):
+        started = perf_counter()
+        await coro_factory()
+        samples.append(perf_counter() - started)
+    return _summary(samples)
+
+
+async def main(iterations: int):
+    await setup_database()
+
+    for bundle in CONTENT_BUNDLES.values():
+        for key in bundle.keys:
+            await update_info_content(key, f"value-of-{key}")
+
+    results = {}
+    for name, bundle in CONTENT_BUNDLES.items():
+        async def per_key():
+            for key in bundle.keys:
+                await _load_info_contents([key])
+
+        async def batched():
+            await _load_info_contents(bundle.keys)
+
+        info_content_cache.invalidate()
+        await get_content_bundle(name)
+
+        results[name] = {
+            "keys": len(bundle.keys),
+            "per_key_queries": await _measure(per_key, iterations),
+            "single_in_query": await _measure(batched, iterations),
+            "cached": await _measure(lambda: get_content_bundle(name), iterations),
+        }
+
+    print(dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=200)
+    run(main(parser.parse_args().iterations))
@@ -0,0 +1,78 @@
+"""
+Пиковая память и время чтения файла со списком кодов: прежний путь (весь файл в bytes, decode,
+splitlines, список кодов) против потокового utils.file_intake (SpooledTemporaryFile, декодирование
+кусками, коды пачками по UPLOAD_BATCH_SIZE). Память — пик tracemalloc, без самого скачивания.
+
+Файл — --lines строк из benchmarks.fixtures в кодировке --encoding (cp1251 — как у склада).
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_intake [--lines 2000000] [--encoding cp1251]
+"""
+from argparse import ArgumentParser
+from asyncio import run
+from json import dumps
+from tempfile import SpooledTemporaryFile
+from time import perf_counter
+from tracemalloc import start, stop, get_traced_memory, reset_peak
+from typing import Any, Dict
+
+import benchmarks.bench_env  # noqa: F401  (должен идти до модулей бота)
+
+from benchmarks.bench_tokenizer import build_input
+from filters_and_config import UPLOAD_SPOOL_MAX_MB
+from utils.file_intake import Upload, iter_token_batches
+from utils.track_code_tokenizer import TrackCodeTokenizer, extract_track_codes
+
+
+def write_spool(data: bytes) -> SpooledTemporaryFile:
+    buffer = SpooledTemporaryFile(max_size=int(UPLOAD_SPOOL_MAX_MB * 1024 * 1024))
+    buffer.write(data)
+    buffer.seek(0)
+    return buffer
+
+
+def legacy(buffer: SpooledTemporaryFile, encoding: str) -> int:
+    # Как раньше: read() целиком, decode, strip и список всех кодов
+    content = buffer.read().decode(encoding).strip()
+    return len(extract_track_codes(content, per_line=True))
+
+
+async def streaming(buffer: SpooledTemporaryFile) -> int:
+    found = 0
+    async with Upload.from_file(buffer, "codes.txt") as upload:
+        async for batch in iter_token_batches(upload, TrackCodeTokenizer(per_line=True)):
+            found += len(batch)
+    return found
+
+
+def measure(func, *args) -> Dict[str, Any]:
+    reset_peak()
+    before = get_traced_memory()[0]
+    started = perf_counter()
+    found = func(*args)
+    seconds = perf_counter() - started
+    return {
+        "seconds": round(seconds, 3),
+        "peak_mb": round((get_traced_memory()[1] - before) / 2 ** 20, 1),
+        "codes": found,
+    }
+
+
+def main(lines: int, encoding: str) -> None:
+    data = build_input(lines).encode(encoding)
+    start()
+    results = {
+        "legacy_read_decode": measure(legacy, write_spool(data), encoding),
+        "streaming_intake": measure(lambda buffer: run(streaming(buffer)), write_spool(data)),
+    }
+    stop()
+    print(dumps({"lines": lines, "size_mb": round(len(data) / 2 ** 20, 1), "encoding": encoding,
+                 "results": results}, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--lines", type=int, default=2_000_000)
+    parser.add_argument("--encoding", default="cp1251")
+    args = parser.parse_args()
+    main(args.lines, args.encoding)
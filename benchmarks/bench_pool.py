@@ -0,0 +1,210 @@
+"""
+Подбор размера пула соединений с БД (DB_POOL_SIZE / DB_MAX_OVERFLOW).
+
+Для каждого размера из --sizes запускается отдельный процесс с DB_POOL_SIZE=N и DB_MAX_OVERFLOW=0
+(предел соединений ровно N), который выполняет одну и ту же смешанную нагрузку:
+    readers   — поиск и просмотр кодов пользователями (как MAX_CONCURRENT_UPDATES апдейтов сразу)
+    uploads   — загрузки админом файлов со статусами (add_or_update_track_codes_list)
+    broadcast — выборка и запись результатов доставок рассылки пачками (как BroadcastRun без Telegram)
+В отчёте для каждого размера — время прогона, задержки операций, ожидание соединения из пула
+(p95/p99), таймауты и пик занятых соединений. Рекомендация — наименьший размер, который не медленнее
+лучшего больше чем на 10% и у которого p95 ожидания ниже DB_POOL_WAIT_WARNING.
+
+Данные генерирует benchmarks.fixtures (загружаются один раз перед прогонами). Замеры на SQLite
+показывают лишь порядок величин: он сериализует запись, решающие цифры — на MySQL
+(BENCH_DATABASE_URL=mysql+aiomysql://...).
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_pool [--sizes 2,5,10,20,40] [--readers 64] [--operations 20000]
+        [--uploads 4] [--upload-lines 5000] [--recipients 20000] [--output pool.json]
+"""
+from argparse import ArgumentParser, SUPPRESS
+from asyncio import gather, run
+from json import dumps, loads
+from os import environ
+from statistics import quantiles
+from subprocess import run as run_process
+from sys import executable
+from time import perf_counter
+from typing import Any, Dict, List
+
+import benchmarks.bench_env  # noqa: F401  (должен идти до модулей бота)
+
+from benchmarks.fixtures import DatasetSpec, iter_status_upload, iter_workload, load_dataset, user_tg_id
+from database.db_base import engine
+from database.db_broadcasts import create_broadcast_job, get_pending_deliveries, save_delivery_results
+from database.db_pool import instrument_pool
+from database.db_track_admin import add_or_update_track_codes_list
+from database.db_track_codes import get_track_code, get_track_codes_info, get_user_track_codes
+from filters_and_config import DB_POOL_WAIT_WARNING
+from utils.metrics import metrics
+
+READ_MIX = {"lookup": 0.6, "search": 0.3, "user_codes": 0.1}
+
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {}
+    samples.sort()
+    cuts = quantiles(samples, n=100, method="inclusive") if len(samples) > 1 else samples * 99
+    return {"p50_ms": round(cuts[49] * 1000, 2), "p95_ms": round(cuts[94] * 1000, 2), "p99_ms": round(cuts[98] * 1000, 2)}
+
+
+# --- ОДИН ПРОГОН (дочерний процесс) ---
+
+async def run_load(spec: DatasetSpec, args) -> Dict[str, Any]:
+    instrument_pool(engine)
+    samples: Dict[str, List[float]] = {"read": [], "upload": [], "broadcast_batch": []}
+    errors: Dict[str, int] = {name: 0 for name in samples}
+
+    async def timed(kind: str, coro) -> None:
+        started = perf_counter()
+        try:
+            await coro
+        except Exception:
+            errors[kind] += 1
+        samples[kind].append(perf_counter() - started)
+
+    operations = list(iter_workload(spec, args.operations, READ_MIX))
+
+    async def reader(index: int) -> None:
+        handlers = {
+            "lookup": lambda op: get_track_code(op["code"]),
+            "search": lambda op: get_track_codes_info(op["codes"]),
+            "user_codes": lambda op: get_user_track_codes(op["tg_id"]),
+        }
+        for op in operations[index::args.readers]:
+            await timed("read", handlers[op["op"]](op))
+
+    async def uploader(index: int) -> None:
+        status = ("in_stock", "shipped")[index % 2]
+        lines = list(iter_status_upload(spec, status, args.upload_lines, seed=index))
+        await timed("upload", add_or_update_track_codes_list([(code, None) for code in lines], status))
+
+    async def broadcast() -> None:
+        job_id = await create_broadcast_job(
+            admin_chat_id=1, progress_message_id=None, content={"content_type": "text", "text": "bench"},
+            recipients=[user_tg_id(index) for index in range(min(args.recipients, spec.users))]
+        )
+        last_id = 0
+        while True:
+            started = perf_counter()
+            batch = await get_pending_deliveries(job_id, last_id, 500)
+            if not batch:
+                return
+            last_id = batch[-1]["id"]
+            await save_delivery_results(job_id, [
+                {"id": item["id"], "status": "sent", "attempts": item["attempts"] + 1} for item in batch
+            ])
+            samples["broadcast_batch"].append(perf_counter() - started)
+
+    started = perf_counter()
+    await gather(
+        *(reader(index) for index in range(args.readers)),
+        *(uploader(index) for index in range(args.uploads)),
+        broadcast() if args.recipients else gather(),
+    )
+    seconds = perf_counter() - started
+
+    wait = next((h for _, h in metrics.series("bot_db_pool_wait_seconds")), None)
+    return {
+        "seconds": round(seconds, 3),
+        "reads_per_sec": round(len(samples["read"]) / seconds, 1),
+        "operations": {kind: _percentiles(values) for kind, values in samples.items()},
+        "errors": errors,
+        "pool": {
+            "checkouts": wait.count if wait else 0,
+            "wait_p95_ms": round(wait.quantile(0.95) * 1000, 2) if wait else 0.0,
+            "wait_p99_ms": round(wait.quantile(0.99) * 1000, 2) if wait else 0.0,
+            "wait_total_sec": round(wait.total, 3) if wait else 0.0,
+            "slow_checkouts": metrics.counter_value("bot_db_pool_slow_checkouts_total"),
+            "timeouts": metrics.counter_value("bot_db_pool_timeouts_total"),
+            "peak_in_use": metrics.gauge_value("bot_db_pool_in_use_peak"),
+        },
+    }
+
+
+# --- ПОДБОР РАЗМЕРА ---
+
+def recommend(results: Dict[int, Dict[str, Any]]) -> Dict[str, Any]:
+    """Наименьший размер, который почти не медленнее лучшего и не ждёт соединений дольше порога."""
+    finished = {size: result for size, result in results.items() if "seconds" in result}
+    if not finished:
+        return {"text": "Ни один прогон не завершился, см. ошибки."}
+
+    best = min(result["seconds"] for result in finished.values())
+    for size in sorted(finished):
+        result = finished[size]
+        if (result["seconds"] <= best * 1.1 and not result["pool"]["timeouts"]
+                and result["pool"]["wait_p95_ms"] < DB_POOL_WAIT_WARNING * 1000):
+            overflow = max(size // 2, 5)
+            return {
+                "pool_size": size,
+                "max_overflow": overflow,
+                "text": (
+                    f"DB_POOL_SIZE={size} DB_MAX_OVERFLOW={overflow}: прогон {result['seconds']} сек "
+                    f"(лучший {best}), p95 ожидания соединения {result['pool']['wait_p95_ms']} мс, "
+                    f"пик занятых {result['pool']['peak_in_use']:g}. Запас overflow покрывает всплески "
+                    f"сверх замеренной нагрузки; max_connections сервера БД должен быть не меньше "
+                    f"(BOT_WORKERS + 1) * {size + overflow}."
+                ),
+            }
+
+    largest = max(finished)
+    return {"text": f"Даже {largest} соединений мало для этой нагрузки: проверьте --sizes больше или тяжёлые запросы."}
+
+
+def run_size(size: int, argv: List[str]) -> Dict[str, Any]:
+    env = dict(environ, DB_POOL_SIZE=str(size), DB_MAX_OVERFLOW="0")
+    process = run_process(
+        [executable, "-m", "benchmarks.bench_pool", "--child", *argv],
+        env=env, capture_output=True, text=True
+    )
+    if process.returncode:
+        return {"error": process.stderr.strip().splitlines()[-1:] or [f"exit code {process.returncode}"]}
+    return loads(process.stdout.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="2,5,10,20,40")
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--track-codes", type=int, default=200_000)
+    parser.add_argument("--readers", type=int, default=64, help="Одновременных читателей (как MAX_CONCURRENT_UPDATES)")
+    parser.add_argument("--operations", type=int, default=20_000, help="Операций чтения на прогон")
+    parser.add_argument("--uploads", type=int, default=4, help="Одновременных загрузок статусов")
+    parser.add_argument("--upload-lines", type=int, default=5_000)
+    parser.add_argument("--recipients", type=int, default=20_000, help="Получателей рассылки (0 — без рассылки)")
+    parser.add_argument("--skip-load", action="store_true", help="Данные уже загружены benchmarks.fixtures")
+    parser.add_argument("--output")
+    parser.add_argument("--child", action="store_true", help=SUPPRESS)
+    args = parser.parse_args()
+
+    dataset = DatasetSpec(users=args.users, track_codes=args.track_codes)
+    if args.child:
+        print(dumps(run(run_load(dataset, args))))
+    else:
+        if not args.skip_load:
+            print(dumps(run(load_dataset(dataset)), ensure_ascii=False))
+
+        child_argv = [
+            "--users", str(args.users), "--track-codes", str(args.track_codes), "--readers", str(args.readers),
+            "--operations", str(args.operations), "--uploads", str(args.uploads),
+            "--upload-lines", str(args.upload_lines), "--recipients", str(args.recipients),
+        ]
+        results = {}
+        for pool_size in sorted(int(size) for size in args.sizes.split(",")):
+            results[pool_size] = run_size(pool_size, child_argv)
+            print(f"pool_size={pool_size}: {dumps(results[pool_size], ensure_ascii=False)}")
+
+        report = {
+            "database": engine.dialect.name,
+            "load": {key: value for key, value in vars(args).items() if key not in ("output", "child", "skip_load")},
+            "results": results,
+            "recommendation": recommend(results),
+        }
+        text = dumps(report, ensure_ascii=False, indent=2)
+        print(text)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                f.write(text)
@@ -0,0 +1,123 @@
+"""
+Микробенчмарк разбора трек-кодов: прежние способы (findall по всему тексту, два re.search на строку
+для прибывших, splitlines для списков) против utils.track_code_tokenizer — целиком и кусками по 64 КБ.
+
+Вход — --lines строк из benchmarks.fixtures: коды маркетплейсов и FS-коды с хвостом («\\t2.5 кг»),
+немного пустых и мусорных строк.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_tokenizer [--lines 1000000] [--repeat 3]
+"""
+from argparse import ArgumentParser
+from json import dumps
+from random import Random
+from re import findall, search, IGNORECASE
+from time import perf_counter
+from typing import Callable, Dict, List
+
+import benchmarks.bench_env  # noqa: F401  (должен идти до модулей бота)
+
+from benchmarks.fixtures import DatasetSpec, iter_track_codes
+from utils.track_code_tokenizer import FS, TrackCodeTokenizer, tokenize
+
+CHUNK_SIZE = 64 * 1024
+
+
+def build_input(lines: int) -> str:
+    rng = Random(lines)
+    rows: List[str] = []
+    for row in iter_track_codes(DatasetSpec(users=5000, track_codes=lines)):
+        roll = rng.random()
+        if roll < 0.01:
+            rows.append("")
+        elif roll < 0.02:
+            rows.append("итого за день")
+        elif row["track_code"].startswith("FS"):
+            rows.append(f"{row['track_code']}\t{rng.randint(1, 300) / 10} кг")
+        else:
+            rows.append(row["track_code"].lower() if roll < 0.1 else row["track_code"])
+    return "\n".join(rows)
+
+
+# --- ПРЕЖНИЙ РАЗБОР ---
+
+def legacy_findall(text: str) -> int:
+    return len(set(findall(r"[A-Z0-9]{8,}", text.upper(), flags=IGNORECASE)))
+
+
+def legacy_arrived(text: str) -> int:
+    codes = []
+    for line in filter(None, map(str.strip, text.splitlines())):
+        match = search(r"(FS\d{4}-\d{4}-\d+)", line)
+        if match:
+            internal_id = search(r"FS(\d{4})", match.group(1))
+            if internal_id:
+                codes.append((match.group(1), int(internal_id.group(1))))
+    return len(codes)
+
+
+def legacy_lines(text: str) -> int:
+    return len([line.strip() for line in text.splitlines() if line.strip()])
+
+
+# --- ТОКЕНИЗАТОР ---
+
+def tokenizer_text(text: str) -> int:
+    return len(tokenize(text)[0])
+
+
+def tokenizer_arrived(text: str) -> int:
+    return len(tokenize(text, kinds=[FS], per_line=True)[0])
+
+
+def tokenizer_lines(text: str) -> int:
+    return len(tokenize(text, per_line=True)[0])
+
+
+def tokenizer_chunks(text: str) -> int:
+    tokenizer = TrackCodeTokenizer(per_line=True)
+    found = 0
+    for start in range(0, len(text), CHUNK_SIZE):
+        found += len(tokenizer.feed(text[start:start + CHUNK_SIZE]))
+    return found + len(tokenizer.close())
+
+
+CASES: Dict[str, Callable[[str], int]] = {
+    "legacy_findall": legacy_findall,
+    "legacy_arrived_two_searches": legacy_arrived,
+    "legacy_splitlines": legacy_lines,
+    "tokenizer_text": tokenizer_text,
+    "tokenizer_arrived": tokenizer_arrived,
+    "tokenizer_per_line": tokenizer_lines,
+    "tokenizer_chunks_64k": tokenizer_chunks,
+}
+
+
+def main(lines: int, repeat: int) -> None:
+    text = build_input(lines)
+    size_mb = len(text.encode()) / 2 ** 20
+
+    results = {}
+    for name, case in CASES.items():
+        best = None
+        for _ in range(repeat):
+            started = perf_counter()
+            found = case(text)
+            elapsed = perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        results[name] = {
+            "seconds": round(best, 3),
+            "lines_per_sec": round(lines / best),
+            "mb_per_sec": round(size_mb / best, 1),
+            "codes": found,
+        }
+
+    print(dumps({"lines": lines, "size_mb": round(size_mb, 1), "results": results}, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--lines", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    main(args.lines, args.repeat)
@@ -0,0 +1,273 @@
+"""
+Аудит планов запросов: вызывает функции модулей database/ на наборе benchmarks.fixtures, перехватывает
+их SELECT/UPDATE/DELETE и выполняет для каждого EXPLAIN (SQLite — EXPLAIN QUERY PLAN, MySQL — EXPLAIN).
+Полный проход по таблице или индексу (SQLite: SCAN, MySQL: type ALL/index) — находка, кроме запросов
+из EXPECTED_SCANS, которым по смыслу нужны все строки. Код выхода 1, если есть неожиданные находки.
+
+MySQL не строит планов по индексу для крошечных таблиц — там находкой считается проход по таблице
+от SMALL_TABLE_ROWS строк (оценка rows из EXPLAIN). Решающий прогон — на MySQL
+(BENCH_DATABASE_URL=mysql+aiomysql://...). Аудит пишет в базу бенчмарков (создаёт и удаляет строки).
+
+Запуск из корня репозитория:
+    python -m benchmarks.explain_audit [--users 20000] [--track-codes 200000] [--skip-load] [--output plans.json]
+"""
+from argparse import ArgumentParser
+from asyncio import run
+from dataclasses import asdict
+from datetime import datetime
+from json import dumps
+from sys import exit as sys_exit
+from typing import Any, Dict, List, Optional, Tuple
+
+import benchmarks.bench_env  # noqa: F401  (должен идти до модулей бота)
+
+from sqlalchemy import event, text
+
+from benchmarks.fixtures import DatasetSpec, load_dataset
+from database import db_broadcasts, db_fsm, db_info_content, db_jobs, db_notifications
+from database import db_track_admin, db_track_codes, db_track_events, db_users
+from database.db_base import Base, engine, setup_database
+
+# Запросы, которым нужны все строки таблицы: полный проход для них ожидаем
+EXPECTED_SCANS = {
+    "db_users.get_all_user_tg_ids",
+    "db_users.get_users_tg_info",
+    "db_broadcasts.get_broadcast_recipients",  # все пользователи (без сегмента)
+    "db_jobs.get_job_stats",
+}
+SMALL_TABLE_ROWS = 1000
+PLANNED_PREFIXES = ("SELECT", "UPDATE", "DELETE")
+
+
+class StatementRecorder:
+    """Собирает SQL, выполненный движком, с меткой вызванной функции (без executemany и повторов)."""
+
+    def __init__(self):
+        self.label: Optional[str] = None
+        self.statements: Dict[Tuple[str, str], Any] = {}
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if self.label is None or executemany:
+            return
+        if statement.lstrip().upper().startswith(PLANNED_PREFIXES):
+            self.statements.setdefault((self.label, statement), parameters)
+
+
+recorder = StatementRecorder()
+
+
+async def call(label: str, coro) -> Any:
+    recorder.label = label
+    try:
+        return await coro
+    finally:
+        recorder.label = None
+
+
+async def first_page(label: str) -> None:
+    recorder.label = label
+    try:
+        async for _ in db_track_codes.iter_track_codes_pages(page_size=100):
+            break
+    finally:
+        recorder.label = None
+
+
+# --- ВЫЗОВЫ ---
+
+async def sample_values() -> Dict[str, Any]:
+    """Существующие значения из набора: владелец с кодами, его коды, внутренние ID пользователей."""
+    async with engine.connect() as conn:
+        tg_id = (await conn.execute(text(
+            "SELECT tg_id FROM track_codes WHERE tg_id IS NOT NULL ORDER BY id LIMIT 1"
+        ))).scalar_one()
+        codes = list((await conn.execute(text(
+            "SELECT track_code FROM track_codes ORDER BY id LIMIT 50"
+        ))).scalars())
+        user_ids = list((await conn.execute(text("SELECT id FROM users ORDER BY id LIMIT 50"))).scalars())
+    return {"tg_id": tg_id, "codes": codes, "user_ids": user_ids}
+
+
+async def exercise(values: Dict[str, Any]) -> None:
+    tg_id, codes, user_ids = values["tg_id"], values["codes"], values["user_ids"]
+    code = codes[0]
+    new_codes = [f"AUDIT{datetime.now():%H%M%S%f}{index:02d}" for index in range(3)]
+
+    # users
+    await call("db_users.get_user_by_tg_id", db_users.get_user_by_tg_id(tg_id))
+    await call("db_users.get_all_user_tg_ids", db_users.get_all_user_tg_ids())
+    await call("db_users.get_users_tg_info", db_users.get_users_tg_info())
+    profile = await call("db_users.get_info_profile", db_users.get_info_profile(tg_id))
+    await call("db_users.update_user_info", db_users.update_user_info(tg_id, "username", profile["username"]))
+    await call("db_users.get_user_by_id", db_users.get_user_by_id(user_ids[0]))
+    await call("db_users.get_users_by_tg_ids", db_users.get_users_by_tg_ids([tg_id]))
+    await call("db_users.get_tg_ids_by_internal_ids", db_users.get_tg_ids_by_internal_ids(user_ids))
+    await call("db_users.update_user_by_internal_id",
+               db_users.update_user_by_internal_id(user_ids[0], username=profile["username"]))
+
+    # track_codes
+    await call("db_track_codes.get_track_code", db_track_codes.get_track_code(code))
+    await call("db_track_codes.get_track_codes_info", db_track_codes.get_track_codes_info(codes))
+    await call("db_track_codes.get_user_track_codes", db_track_codes.get_user_track_codes(tg_id))
+    await first_page("db_track_codes.iter_track_codes_pages")
+    await call("db_track_codes.check_track_codes_existence",
+               db_track_codes.check_track_codes_existence(codes + new_codes))
+    await call("db_track_codes.create_track_code", db_track_codes.create_track_code(new_codes[0], "in_stock"))
+    await call("db_track_codes.update_track_code", db_track_codes.update_track_code(new_codes[0], status="shipped"))
+    await call("db_track_codes.check_or_add_track_code", db_track_codes.check_or_add_track_code(new_codes[1], tg_id))
+    await call("db_track_codes.bulk_assign_track_codes",
+               db_track_codes.bulk_assign_track_codes(new_codes[:2], tg_id))
+    await call("db_track_codes.add_multiple_track_codes", db_track_codes.add_multiple_track_codes(new_codes, tg_id))
+
+    # track_codes (админ)
+    await call("db_track_admin.add_or_update_track_codes_list",
+               db_track_admin.add_or_update_track_codes_list([(c, None) for c in new_codes], "arrived"))
+    await call("db_track_admin.unbind_track_codes", db_track_admin.unbind_track_codes(new_codes))
+    await call("db_track_codes.update_track_code", db_track_codes.update_track_code(new_codes[2], status="shipped"))
+    await call("db_track_admin.delete_shipped_track_codes", db_track_admin.delete_shipped_track_codes())
+    await call("db_track_codes.delete_multiple_track_codes", db_track_codes.delete_multiple_track_codes(new_codes))
+
+    # track_code_events
+    await call("db_track_events.get_track_code_timelines", db_track_events.get_track_code_timelines(codes))
+    await call("db_track_events.get_status_event_stats", db_track_events.get_status_event_stats(30))
+    await call("db_track_events.purge_track_code_events", db_track_events.purge_track_code_events(3650))
+
+    # рассылки
+    await call("db_broadcasts.get_broadcast_recipients", db_broadcasts.get_broadcast_recipients())
+    await call("db_broadcasts.get_broadcast_recipients[segment]", db_broadcasts.get_broadcast_recipients("arrived"))
+    job_id = await call("db_broadcasts.create_broadcast_job", db_broadcasts.create_broadcast_job(
+        1, None, {"content_type": "text", "text": "audit"}, [tg_id]
+    ))
+    await call("db_broadcasts.get_broadcast_job", db_broadcasts.get_broadcast_job(job_id))
+    await call("db_broadcasts.get_running_broadcast_jobs", db_broadcasts.get_running_broadcast_jobs())
+    deliveries = await call("db_broadcasts.get_pending_deliveries", db_broadcasts.get_pending_deliveries(job_id, 0, 100))
+    await call("db_broadcasts.save_delivery_results", db_broadcasts.save_delivery_results(
+        job_id, [{"id": row["id"], "status": "sent", "attempts": 1} for row in deliveries]
+    ))
+    await call("db_broadcasts.finish_broadcast_job", db_broadcasts.finish_broadcast_job(job_id))
+    await call("db_broadcasts.mark_users_blocked", db_broadcasts.mark_users_blocked([tg_id]))
+    await call("db_broadcasts.unblock_user", db_broadcasts.unblock_user(tg_id))
+
+    # уведомления
+    pending = await call("db_notifications.get_pending_notifications",
+                         db_notifications.get_pending_notifications(0, 100))
+    await call("db_notifications.count_pending_notifications", db_notifications.count_pending_notifications())
+    await call("db_notifications.mark_notification_failed", db_notifications.mark_notification_failed(0, "failed", 1))
+    await call("db_notifications.delete_sent_notifications",
+               db_notifications.delete_sent_notifications([row["id"] for row in pending] or [0]))
+
+    # фоновые задачи
+    audit_job = await call("db_jobs.create_job", db_jobs.create_job("audit", 0, tg_id, {}))
+    await call("db_jobs.has_active_job", db_jobs.has_active_job("audit", tg_id))
+    await call("db_jobs.get_pending_jobs", db_jobs.get_pending_jobs(["audit"], 10))
+    await call("db_jobs.mark_jobs_running", db_jobs.mark_jobs_running([audit_job]))
+    await call("db_jobs.requeue_interrupted_jobs", db_jobs.requeue_interrupted_jobs(0))
+    await call("db_jobs.finish_job", db_jobs.finish_job(audit_job, "done"))
+    await call("db_jobs.purge_finished_jobs", db_jobs.purge_finished_jobs(0))
+    await call("db_jobs.get_job_stats", db_jobs.get_job_stats())
+
+    # FSM и тексты
+    key = f"audit:{tg_id}"
+    await call("db_fsm.save_fsm_state", db_fsm.save_fsm_state(key, "audit", 60))
+    await call("db_fsm.save_fsm_data", db_fsm.save_fsm_data(key, "{}", 60))
+    await call("db_fsm.get_fsm_record", db_fsm.get_fsm_record(key))
+    await call("db_fsm.purge_expired_fsm_records", db_fsm.purge_expired_fsm_records())
+    await call("db_info_content.get_info_contents", db_info_content.get_info_contents(["audit"]))
+    await call("db_info_content.update_info_content", db_info_content.update_info_content("audit", "audit"))
+
+
+# --- ПЛАНЫ ---
+
+async def analyze_tables(conn) -> None:
+    """Свежая статистика для планировщика, иначе на только что загруженных данных планы случайны."""
+    if engine.dialect.name == "sqlite":
+        await conn.exec_driver_sql("ANALYZE")
+    else:
+        tables = ", ".join(table.name for table in Base.metadata.sorted_tables)
+        await conn.exec_driver_sql(f"ANALYZE TABLE {tables}")
+
+
+def sqlite_scans(plan: List[Dict[str, Any]]) -> List[str]:
+    return [
+        row["detail"] for row in plan
+        if row["detail"].startswith("SCAN ") and not row["detail"].startswith("SCAN CONSTANT ROW")
+    ]
+
+
+def mysql_scans(plan: List[Dict[str, Any]]) -> List[str]:
+    return [
+        f"{row.get('table')}: type={row.get('type')}, key={row.get('key')}, rows={row.get('rows')}"
+        for row in plan
+        if row.get("type") in ("ALL", "index") and (row.get("rows") or 0) >= SMALL_TABLE_ROWS
+    ]
+
+
+async def explain(conn, statement: str, parameters: Any) -> List[Dict[str, Any]]:
+    prefix = "EXPLAIN QUERY PLAN " if engine.dialect.name == "sqlite" else "EXPLAIN "
+    result = await conn.exec_driver_sql(prefix + statement, parameters or ())
+    return [dict(row._mapping) for row in result]
+
+
+async def audit(spec: DatasetSpec, skip_load: bool) -> Dict[str, Any]:
+    if skip_load:
+        await setup_database()
+    else:
+        await load_dataset(spec)
+
+    async with engine.connect() as conn:
+        await analyze_tables(conn)
+        await conn.commit()
+
+    event.listen(engine.sync_engine, "before_cursor_execute", recorder)
+    try:
+        await exercise(await sample_values())
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", recorder)
+
+    find_scans = sqlite_scans if engine.dialect.name == "sqlite" else mysql_scans
+    report: List[Dict[str, Any]] = []
+    async with engine.connect() as conn:
+        for (label, statement), parameters in recorder.statements.items():
+            plan = await explain(conn, statement, parameters)
+            scans = find_scans(plan)
+            report.append({
+                "function": label,
+                "sql": " ".join(statement.split()),
+                "plan": plan,
+                "full_scans": scans,
+                "expected": bool(scans) and label in EXPECTED_SCANS,
+            })
+
+    unexpected = [item for item in report if item["full_scans"] and not item["expected"]]
+    return {
+        "database": engine.dialect.name,
+        "spec": None if skip_load else asdict(spec),
+        "statements": len(report),
+        "functions": len({item["function"] for item in report}),
+        "unexpected_scans": [
+            {"function": item["function"], "sql": item["sql"], "full_scans": item["full_scans"]} for item in unexpected
+        ],
+        "expected_scans": sorted({item["function"] for item in report if item["expected"]}),
+        "report": report,
+    }
+
+
+def main(spec: DatasetSpec, skip_load: bool, output: Optional[str]) -> int:
+    result = run(audit(spec, skip_load))
+    if output:
+        with open(output, "w", encoding="utf-8") as out:
+            out.write(dumps(result, ensure_ascii=False, indent=2, default=str))
+
+    summary = {key: value for key, value in result.items() if key != "report"}
+    print(dumps(summary, ensure_ascii=False, indent=2, default=str))
+    return 1 if result["unexpected_scans"] else 0
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--track-codes", type=int, default=200_000)
+    parser.add_argument("--skip-load", action="store_true", help="Не загружать набор (база уже заполнена)")
+    parser.add_argument("--output", help="Полный отчёт с планами в JSON")
+    args = parser.parse_args()
+    sys_exit(main(DatasetSpec(users=args.users, track_codes=args.track_codes), args.skip_load, args.output))
@@ -0,0 +1,341 @@
+"""
+Генератор синтетических данных для нагрузочных замеров users/track_codes.
+
+Данные детерминированы сидом: одна и та же спецификация даёт те же строки и те же нагрузки,
+поэтому прогоны можно сравнивать между коммитами. Владельцы кодов распределены по Zipf
+(немногие клиенты владеют большей частью кодов), коды бывают двух форматов:
+    маркетплейсы   — [A-Z0-9]{8,} (как TRACK_CODE_PATTERN), например YT2503123456789012
+    прибывшие (FS) — FSXXXX-YYMM-Z, где XXXX — внутренний id пользователя (как разбор статуса «Прибыл»)
+
+Загрузка идёт многострочными INSERT ... VALUES (...), (...) пачками.
+
+Запуск из корня репозитория:
+    python -m benchmarks.fixtures load [--users 20000] [--track-codes 500000] [--skew 1.1] [--seed 42]
+    python -m benchmarks.fixtures workload --lookups 1000000 --output lookups.jsonl
+    python -m benchmarks.fixtures replay --workload lookups.jsonl [--concurrency 50]
+    python -m benchmarks.fixtures upload-file --status arrived --lines 10000 --output arrived.txt
+"""
+from argparse import ArgumentParser
+from asyncio import Semaphore, create_task, gather, run
+from bisect import bisect_left
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+from itertools import accumulate, islice
+from json import dumps, loads
+from random import Random
+from re import fullmatch
+from statistics import quantiles
+from time import perf_counter
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import benchmarks.bench_env  # noqa: F401  (должен идти до модулей бота)
+
+from sqlalchemy import insert
+
+from database.db_base import Base, engine, setup_database
+from database.db_track_codes import TrackCode, get_track_code, get_track_codes_info, get_user_track_codes
+from database.db_users import User
+from utils.track_code_tokenizer import FS_CODE_PATTERN, TRACK_CODE_PATTERN
+
+# В FS-коде под id пользователя 4 цифры: клиенты с большим id получают только коды маркетплейсов
+MAX_FS_USER_ID = 9999
+
+TRACK_STATUSES = (("out_of_stock", 30), ("in_stock", 30), ("shipped", 25), ("arrived", 15))
+MARKETPLACE_FORMATS = (
+    # (префикс, число случайных цифр) — длины и префиксы как у типичных отправлений
+    ("YT", 10), ("LP", 8), ("SF", 6), ("JT", 7), ("", 6), ("CN", 5),
+)
+FS_MONTHS = ("2501", "2502", "2503", "2504", "2505", "2506", "2507", "2508", "2509", "2510", "2511", "2512")
+TG_ID_BASE = 700_000_000
+
+# Сколько строк в одном многострочном INSERT (у SQLite лимит на число параметров запроса)
+INSERT_CHUNK_ROWS = 1000
+
+
+@dataclass(frozen=True)
+class DatasetSpec:
+    users: int = 20_000
+    track_codes: int = 500_000
+    owned_share: float = 0.7  # доля кодов, привязанных к пользователю
+    fs_share: float = 0.2  # доля привязанных кодов в формате FS
+    skew: float = 1.1  # показатель Zipf для владельцев: больше — сильнее перекос
+    seed: int = 42
+
+
+def user_tg_id(index: int) -> int:
+    return TG_ID_BASE + index * 7
+
+
+class OwnerPicker:
+    """Выбор владельца по Zipf: ранги перемешаны, чтобы «крупные» клиенты не шли подряд по id."""
+
+    def __init__(self, users: int, skew: float, rng: Random):
+        self._indexes = list(range(users))
+        rng.shuffle(self._indexes)
+        self._cumulative = list(accumulate(1 / (rank ** skew) for rank in range(1, users + 1)))
+
+    def pick(self, rng: Random) -> int:
+        position = bisect_left(self._cumulative, rng.random() * self._cumulative[-1])
+        return self._indexes[min(position, len(self._indexes) - 1)]
+
+
+def iter_users(spec: DatasetSpec) -> Iterator[Dict[str, Any]]:
+    """Строки таблицы users: id = index + 1 (на него ссылаются FS-коды)."""
+    rng = Random(f"users-{spec.seed}")
+    for index in range(spec.users):
+        yield {
+            "id": index + 1,
+            "tg_id": user_tg_id(index),
+            "name": f"Client {index + 1}",
+            "username": f"client{index + 1}" if rng.random() < 0.8 else None,
+            "phone": f"+7900{rng.randrange(10 ** 7):07d}" if rng.random() < 0.6 else None,
+            "email": f"client{index + 1}@example.com" if rng.random() < 0.5 else None,
+        }
+
+
+def marketplace_code(rng: Random, index: int) -> str:
+    """Код маркетплейса; номер строки в конце гарантирует уникальность."""
+    prefix, digits = rng.choice(MARKETPLACE_FORMATS)
+    return f"{prefix}{rng.randrange(10 ** digits):0{digits}d}{index:07d}"
+
+
+def iter_track_codes(spec: DatasetSpec) -> Iterator[Dict[str, Any]]:
+    """Строки таблицы track_codes. FS-коды всегда привязаны к владельцу из своего номера."""
+    rng = Random(f"track-codes-{spec.seed}")
+    owners = OwnerPicker(spec.users, spec.skew, Random(f"owners-{spec.seed}")) if spec.users else None
+    statuses = [status for status, _ in TRACK_STATUSES]
+    weights = [weight for _, weight in TRACK_STATUSES]
+    fs_counters: Dict[Tuple[int, str], int] = defaultdict(int)
+
+    for index in range(spec.track_codes):
+        owner = owners.pick(rng) if owners and rng.random() < spec.owned_share else None
+
+        if owner is not None and owner + 1 <= MAX_FS_USER_ID and rng.random() < spec.fs_share:
+            month = rng.choice(FS_MONTHS)
+            fs_counters[(owner, month)] += 1
+            code = f"FS{owner + 1:04d}-{month}-{fs_counters[(owner, month)]}"
+            status = "arrived"
+        else:
+            code = marketplace_code(rng, index)
+            status = rng.choices(statuses, weights)[0]
+
+        yield {
+            "track_code": code,
+            "status": status,
+            "tg_id": user_tg_id(owner) if owner is not None else None,
+        }
+
+
+def check_code_format(code: str) -> bool:
+    """Код подходит под разбор бота: FS-формат или TRACK_CODE_PATTERN целиком."""
+    return bool(fullmatch(FS_CODE_PATTERN, code) or fullmatch(TRACK_CODE_PATTERN, code))
+
+
+def _batches(rows: Iterator[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+async def load_dataset(spec: DatasetSpec, reset: bool = True) -> Dict[str, Any]:
+    """Загружает пользователей и трек-коды многострочными INSERT. reset — пересоздать обе таблицы."""
+    await setup_database()
+    tables = [User.__table__, TrackCode.__table__]
+    if reset:
+        async with engine.begin() as conn:
+            await conn.run_sync(lambda sync_conn: Base.metadata.drop_all(sync_conn, tables=tables))
+            await conn.run_sync(lambda sync_conn: Base.metadata.create_all(sync_conn, tables=tables))
+
+    started = perf_counter()
+    bad_codes = 0
+    async with engine.begin() as conn:
+        for batch in _batches(iter_users(spec), INSERT_CHUNK_ROWS):
+            await conn.execute(insert(User).values(batch))
+        users_seconds = perf_counter() - started
+
+        for batch in _batches(iter_track_codes(spec), INSERT_CHUNK_ROWS):
+            bad_codes += sum(not check_code_format(row["track_code"]) for row in batch)
+            await conn.execute(insert(TrackCode).values(batch))
+
+    seconds = perf_counter() - started
+    return {
+        "spec": asdict(spec),
+        "database": engine.dialect.name,
+        "users_seconds": round(users_seconds, 3),
+        "seconds": round(seconds, 3),
+        "rows_per_sec": round((spec.users + spec.track_codes) / seconds, 1) if seconds else None,
+        "bad_codes": bad_codes,
+    }
+
+
+# --- НАГРУЗКИ ---
+
+def iter_workload(
+        spec: DatasetSpec,
+        lookups: int,
+        mix: Dict[str, float],
+        miss_share: float = 0.2,
+        batch_size: Tuple[int, int] = (5, 50),
+        seed: int = 1
+) -> Iterator[Dict[str, Any]]:
+    """
+    Операции чтения для replay: lookup (один код), search (пачка кодов, как поиск по списку)
+    и user_codes (коды владельца). Горячие коды и владельцы выбираются с тем же перекосом,
+    miss_share — доля кодов, которых нет в базе (правильного формата).
+    """
+    rng = Random(f"workload-{spec.seed}-{seed}")
+    codes = [row["track_code"] for row in iter_track_codes(spec)]
+    code_picker = OwnerPicker(len(codes), spec.skew, Random(f"hot-codes-{spec.seed}-{seed}")) if codes else None
+    owners = OwnerPicker(spec.users, spec.skew, Random(f"owners-{spec.seed}")) if spec.users else None
+    operations = list(mix)
+    weights = [mix[name] for name in operations]
+
+    def pick_code() -> str:
+        if not code_picker or rng.random() < miss_share:
+            return marketplace_code(rng, spec.track_codes + rng.randrange(10 ** 7))
+        return codes[code_picker.pick(rng)]
+
+    for _ in range(lookups):
+        operation = rng.choices(operations, weights)[0]
+        if operation == "lookup":
+            yield {"op": "lookup", "code": pick_code()}
+        elif operation == "search":
+            yield {"op": "search", "codes": [pick_code() for _ in range(rng.randint(*batch_size))]}
+        elif operation == "user_codes" and owners:
+            yield {"op": "user_codes", "tg_id": user_tg_id(owners.pick(rng))}
+
+
+def iter_status_upload(spec: DatasetSpec, status: str, lines: int, seed: int = 1) -> Iterator[str]:
+    """
+    Строки файла, который админ загружает для смены статуса: для arrived — только FS-коды
+    с произвольным хвостом (вес, примечание), для остальных статусов — коды по одному в строке.
+    """
+    rng = Random(f"upload-{spec.seed}-{status}-{seed}")
+    if status == "arrived":
+        codes = [row["track_code"] for row in iter_track_codes(spec) if row["track_code"].startswith("FS")]
+    else:
+        codes = [row["track_code"] for row in iter_track_codes(spec) if not row["track_code"].startswith("FS")]
+    if not codes:
+        return
+
+    for _ in range(lines):
+        code = rng.choice(codes)
+        yield f"{code}\t{rng.randint(1, 300) / 10} кг" if status == "arrived" else code
+
+
+async def replay_workload(path: str, concurrency: int = 50, limit: Optional[int] = None) -> Dict[str, Any]:
+    """Выполняет операции из файла нагрузки и возвращает задержки по типам операций."""
+    samples: Dict[str, List[float]] = defaultdict(list)
+    handlers = {
+        "lookup": lambda op: get_track_code(op["code"]),
+        "search": lambda op: get_track_codes_info(op["codes"]),
+        "user_codes": lambda op: get_user_track_codes(op["tg_id"]),
+    }
+
+    with open(path, encoding="utf-8") as f:
+        operations = (loads(line) for line in islice(f, limit) if line.strip())
+        slots = Semaphore(concurrency)
+        tasks = set()
+
+        async def execute(op: Dict[str, Any]) -> None:
+            try:
+                started = perf_counter()
+                await handlers[op["op"]](op)
+                samples[op["op"]].append(perf_counter() - started)
+            finally:
+                slots.release()
+
+        started = perf_counter()
+        # Файл читается потоком: в памяти не больше concurrency операций
+        for op in operations:
+            await slots.acquire()
+            task = create_task(execute(op))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        await gather(*tasks)
+        seconds = perf_counter() - started
+
+    report = {}
+    for name, values in samples.items():
+        values.sort()
+        cuts = quantiles(values, n=100, method="inclusive") if len(values) > 1 else values * 99
+        report[name] = {
+            "count": len(values),
+            "p50_ms": round(cuts[49] * 1000, 3),
+            "p95_ms": round(cuts[94] * 1000, 3),
+            "p99_ms": round(cuts[98] * 1000, 3),
+            "max_ms": round(values[-1] * 1000, 3),
+        }
+
+    total = sum(len(values) for values in samples.values())
+    return {
+        "database": engine.dialect.name,
+        "operations": total,
+        "seconds": round(seconds, 3),
+        "ops_per_sec": round(total / seconds, 1) if seconds else None,
+        "by_operation": report,
+    }
+
+
+def _parse_mix(raw: str) -> Dict[str, float]:
+    mix = {}
+    for part in raw.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_spec_arguments(command):
+        command.add_argument("--users", type=int, default=DatasetSpec.users)
+        command.add_argument("--track-codes", type=int, default=DatasetSpec.track_codes)
+        command.add_argument("--owned-share", type=float, default=DatasetSpec.owned_share)
+        command.add_argument("--fs-share", type=float, default=DatasetSpec.fs_share)
+        command.add_argument("--skew", type=float, default=DatasetSpec.skew)
+        command.add_argument("--seed", type=int, default=DatasetSpec.seed)
+
+    load_command = commands.add_parser("load", help="Загрузить пользователей и трек-коды в BENCH_DATABASE_URL")
+    add_spec_arguments(load_command)
+    load_command.add_argument("--append", action="store_true", help="Не пересоздавать таблицы")
+
+    workload_command = commands.add_parser("workload", help="Записать нагрузку чтения в JSON Lines")
+    add_spec_arguments(workload_command)
+    workload_command.add_argument("--lookups", type=int, default=1_000_000)
+    workload_command.add_argument("--mix", default="lookup=0.6,search=0.3,user_codes=0.1")
+    workload_command.add_argument("--miss-share", type=float, default=0.2)
+    workload_command.add_argument("--workload-seed", type=int, default=1)
+    workload_command.add_argument("--output", required=True)
+
+    replay_command = commands.add_parser("replay", help="Выполнить нагрузку против BENCH_DATABASE_URL")
+    replay_command.add_argument("--workload", required=True)
+    replay_command.add_argument("--concurrency", type=int, default=50)
+    replay_command.add_argument("--limit", type=int)
+
+    upload_command = commands.add_parser("upload-file", help="Записать файл загрузки статусов для админки")
+    add_spec_arguments(upload_command)
+    upload_command.add_argument("--status", choices=[status for status, _ in TRACK_STATUSES], default="arrived")
+    upload_command.add_argument("--lines", type=int, default=10_000)
+    upload_command.add_argument("--output", required=True)
+
+    args = parser.parse_args()
+    if args.command == "replay":
+        print(dumps(run(replay_workload(args.workload, args.concurrency, args.limit)), ensure_ascii=False, indent=2))
+    else:
+        dataset = DatasetSpec(
+            users=args.users, track_codes=args.track_codes, owned_share=args.owned_share,
+            fs_share=args.fs_share, skew=args.skew, seed=args.seed
+        )
+        if args.command == "load":
+            print(dumps(run(load_dataset(dataset, reset=not args.append)), ensure_ascii=False, indent=2))
+        elif args.command == "workload":
+            with open(args.output, "w", encoding="utf-8") as out:
+                for operation in iter_workload(
+                        dataset, args.lookups, _parse_mix(args.mix), args.miss_share, seed=args.workload_seed
+                ):
+                    out.write(dumps(operation) + "\n")
+        else:
+            with open(args.output, "w", encoding="utf-8") as out:
+                for line in iter_status_upload(dataset, args.status, args.lines):
+                    out.write(line + "\n")
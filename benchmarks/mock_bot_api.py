@@ -0,0 +1,117 @@
+"""
+Локальная имитация Telegram Bot API для бенчмарков: отвечает на методы правдоподобными объектами,
+отдаёт зарегистрированные файлы (getFile + /file/...) и считает вызовы по методам.
+Задержка ответа (latency) имитирует сетевой RTT до api.telegram.org.
+"""
+from asyncio import Condition, sleep, wait_for
+from collections import Counter
+from itertools import count
+from time import time
+from typing import Any, Dict, Optional
+
+from aiohttp import web
+from aiogram.client.telegram import TelegramAPIServer
+
+_TRUE_METHODS = {
+    "answercallbackquery", "deletemessage", "deletemessages", "setwebhook", "deletewebhook",
+    "setmycommands", "sendchataction", "setmessagereaction",
+}
+
+
+class MockBotAPI:
+    def __init__(self, host: str = "127.0.0.1", port: int = 8081, latency: float = 0.0):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self.files: Dict[str, bytes] = {}
+        self._message_ids = count(1)
+        self._changed = Condition()
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def server(self) -> TelegramAPIServer:
+        return TelegramAPIServer.from_base(f"http://{self.host}:{self.port}")
+
+    def add_file(self, file_id: str, content: bytes) -> None:
+        self.files[file_id] = content
+
+    async def start(self) -> None:
+        app = web.Application(client_max_size=64 * 2 ** 20)
+        app.router.add_post("/bot{token}/{method}", self._handle_method)
+        app.router.add_get("/file/bot{token}/{path:.+}", self._handle_file)
+        self._runner = web.AppRunner(app, handle_signals=False, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+
+    async def stop(self) -> None:
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def wait_for(self, method: str, calls: int, timeout: float = 600.0) -> None:
+        """Ждёт, пока метод не будет вызван calls раз (например, sendDocument с готовым бланком)."""
+        async def reached():
+            async with self._changed:
+                await self._changed.wait_for(lambda: self.calls[method.lower()] >= calls)
+
+        await wait_for(reached(), timeout)
+
+    def reset(self) -> None:
+        self.calls.clear()
+
+    # --- ОТВЕТЫ ---
+
+    def _message(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        chat_id = params.get("chat_id", "1")
+        chat_id = int(chat_id) if str(chat_id).lstrip("-").isdigit() else 1
+        return {
+            "message_id": next(self._message_ids),
+            "date": int(time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "text": (params.get("text") or params.get("caption") or "")[:100],
+        }
+
+    def _result(self, method: str, params: Dict[str, Any]) -> Any:
+        if method in _TRUE_METHODS:
+            return True
+        if method == "getme":
+            return {"id": 123456, "is_bot": True, "first_name": "Benchmark", "username": "bench_bot"}
+        if method == "getfile":
+            file_id = params.get("file_id", "")
+            return {
+                "file_id": file_id,
+                "file_unique_id": file_id[-32:],
+                "file_size": len(self.files.get(file_id, b"")),
+                "file_path": file_id,
+            }
+        if method == "copymessage":
+            return {"message_id": next(self._message_ids)}
+        if method == "copymessages":
+            return [{"message_id": next(self._message_ids)}]
+        if method == "sendmediagroup":
+            return [self._message(params)]
+        if method == "getupdates":
+            return []
+        return self._message(params)
+
+    async def _handle_method(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"].lower()
+        params = {key: value for key, value in (await request.post()).items() if isinstance(value, str)}
+
+        if self.latency:
+            await sleep(self.latency)
+
+        result = self._result(method, params)
+        async with self._changed:
+            self.calls[method] += 1
+            self._changed.notify_all()
+        return web.json_response({"ok": True, "result": result})
+
+    async def _handle_file(self, request: web.Request) -> web.Response:
+        content = self.files.get(request.match_info["path"])
+        if content is None:
+            return web.Response(status=404)
+        if self.latency:
+            await sleep(self.latency)
+        return web.Response(body=content)
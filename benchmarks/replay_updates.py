@@ -0,0 +1,131 @@
+"""
+Нагрузочный прогон вебхука: отправляет записанные апдейты POST-запросами на локальный сервер
+(BOT_RUN_MODE=webhook) и печатает задержки ответа и коды статусов в JSON.
+
+Апдейты берутся из файла: JSON Lines (по апдейту в строке), JSON-массив или сохранённый
+ответ getUpdates ({"ok": true, "result": [...]}). Без файла генерируются синтетические
+текстовые сообщения от разных чатов.
+
+Запуск из корня репозитория:
+    python -m benchmarks.replay_updates --url http://127.0.0.1:8080/webhook [--file updates.jsonl]
+        [--count 1000] [--concurrency 50] [--rate 0] [--secret ...]
+"""
+from argparse import ArgumentParser
+from asyncio import Semaphore, gather, run, sleep
+from collections import Counter
+from itertools import cycle, islice
+from json import JSONDecodeError, dumps, loads
+from statistics import quantiles
+from time import perf_counter, time
+from typing import List, Dict, Any
+
+from aiohttp import ClientSession, ClientTimeout
+
+
+def load_updates(file_path: str) -> List[Dict[str, Any]]:
+    """Читает апдейты из JSON Lines, JSON-массива или ответа getUpdates."""
+    with open(file_path, encoding="utf-8") as f:
+        raw = f.read().strip()
+
+    try:
+        data = loads(raw)
+    except JSONDecodeError:
+        return [loads(line) for line in raw.splitlines() if line.strip()]
+
+    if isinstance(data, dict):
+        data = data.get("result", [data])
+    return data
+
+
+def synthetic_updates(count: int, chats: int = 200) -> List[Dict[str, Any]]:
+    """Текстовые сообщения из главного меню от `chats` разных пользователей."""
+    texts = ["/start", "Мой профиль", "Проверить трек-код", "Адрес склада", "Тарифы"]
+    updates = []
+    for i in range(count):
+        chat_id = 10_000 + i % chats
+        user = {"id": chat_id, "is_bot": False, "first_name": f"User{chat_id}"}
+        updates.append({
+            "update_id": i + 1,
+            "message": {
+                "message_id": i + 1,
+                "date": int(time()),
+                "chat": {"id": chat_id, "type": "private", "first_name": user["first_name"]},
+                "from": user,
+                "text": texts[i % len(texts)],
+            }
+        })
+    return updates
+
+
+def _percentile(sorted_samples: List[float], q: int) -> float:
+    if len(sorted_samples) == 1:
+        return sorted_samples[0]
+    return quantiles(sorted_samples, n=100)[q - 1]
+
+
+async def replay(url: str, updates: List[Dict[str, Any]], concurrency: int, rate: float, secret: str) -> dict:
+    headers = {"Content-Type": "application/json"}
+    if secret:
+        headers["X-Telegram-Bot-Api-Secret-Token"] = secret
+
+    slots = Semaphore(concurrency)
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+
+    async def send(session: ClientSession, update: Dict[str, Any]) -> None:
+        async with slots:
+            started = perf_counter()
+            try:
+                async with session.post(url, data=dumps(update), headers=headers) as response:
+                    await response.read()
+                    statuses[response.status] += 1
+            except Exception as e:
+                statuses[type(e).__name__] += 1
+            latencies.append(perf_counter() - started)
+
+    started = perf_counter()
+    async with ClientSession(timeout=ClientTimeout(total=60)) as session:
+        tasks = []
+        for update in updates:
+            tasks.append(send(session, update))
+            if rate:
+                await sleep(1 / rate)
+        await gather(*tasks)
+    elapsed = perf_counter() - started
+
+    latencies.sort()
+    return {
+        "updates": len(updates),
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "updates_per_sec": round(len(updates) / elapsed, 1) if elapsed else None,
+        "statuses": {str(status): n for status, n in statuses.items()},
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(_percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def _renumber(updates: List[Dict[str, Any]], count: int) -> List[Dict[str, Any]]:
+    """Повторяет апдейты до нужного количества с уникальными update_id."""
+    result = []
+    for i, update in enumerate(islice(cycle(updates), count)):
+        update = dict(update)
+        update["update_id"] = i + 1
+        result.append(update)
+    return result
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Replay Telegram-апдейтов на локальный вебхук")
+    parser.add_argument("--url", default="http://127.0.0.1:8080/webhook")
+    parser.add_argument("--file", help="файл с записанными апдейтами")
+    parser.add_argument("--count", type=int, default=1000, help="сколько апдейтов отправить")
+    parser.add_argument("--concurrency", type=int, default=50, help="одновременных запросов")
+    parser.add_argument("--rate", type=float, default=0, help="апдейтов в секунду (0 — без ограничения)")
+    parser.add_argument("--secret", default="", help="WEBHOOK_SECRET сервера")
+    args = parser.parse_args()
+
+    source = load_updates(args.file) if args.file else synthetic_updates(args.count)
+    report = run(replay(args.url, _renumber(source, args.count), args.concurrency, args.rate, args.secret))
+    print(dumps(report, ensure_ascii=False, indent=2))
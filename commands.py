@@ -6,6 +6,7 @@ from aiogram.fsm.context import FSMContext
 from aiogram.types import Message, BotCommand, BotCommandScopeAllPrivateChats
 from aiogram.exceptions import TelegramForbiddenError
 
+from database.db_broadcasts import unblock_user
 from database.db_info_content import get_info_content
 from database.db_users import get_user_by_tg_id
 from keyboards.user_keyboards import main_keyboard, get_main_inline_keyboard, reg_keyboard
@@ -25,16 +26,6 @@ async def set_default_commands(bot):
     logger.info("Стандартные команды бота установлены.")
 
 
-photo_cache = {}
-
-
-async def get_cached_content(key: str) -> str:
-    """Получает значение из кэша или базы данных, если его нет в кэше."""
-    if key not in photo_cache:
-        photo_cache[key] = await get_info_content(key)
-    return photo_cache[key]
-
-
 @commands_router.message(CommandStart())
 @commands_router.message(F.text == "Вернуться в главное меню")
 async def start_command(message: Message, state: FSMContext):
@@ -43,7 +34,10 @@ async def start_command(message: Message, state: FSMContext):
     if was_in_state:
         logger.info("FSM состояние сброшено через /start. tg_id=%s", message.from_user.id)
 
-    main_menu_photo = await get_cached_content("main_menu_photo")
+    # Пользователь снова пишет боту — возвращаем его в рассылки
+    await unblock_user(message.from_user.id)
+
+    main_menu_photo = await get_info_content("main_menu_photo")
 
     try:
         await message.answer_photo(
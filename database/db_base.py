@@ -1,33 +1,63 @@
+from typing import Any, Callable, Dict, Iterator, List, Sequence
+
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
+
 from filters_and_config import DATABASE_URL
+from .db_migrations import apply_migrations
+from .db_pool import pool_options
+
+# Движок с защитой от разрывов (pre_ping, recycle); размеры пула — из DB_POOL_*
+engine = create_async_engine(DATABASE_URL, echo=False, **pool_options(DATABASE_URL))
 
-engine = create_async_engine(DATABASE_URL, echo=False)
 async_session = async_sessionmaker(engine, expire_on_commit=False)
 
 class Base(DeclarativeBase):
     pass
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
-from sqlalchemy.orm import DeclarativeBase
-from filters_and_config import DATABASE_URL
 
-# Движок с защитой от разрывов
-engine = create_async_engine(
-    DATABASE_URL, 
-    echo=False,
-    pool_pre_ping=True,
-    pool_recycle=3600
-)
 
-async_session = async_sessionmaker(engine, expire_on_commit=False)
+# --- ПАКЕТНЫЕ ОПЕРАЦИИ ---
+
+# Размер пачки для многострочных INSERT и IN (...): держит число параметров в запросе ограниченным
+BULK_CHUNK_SIZE = 1000
+
+
+def chunked(items: Sequence, size: int = BULK_CHUNK_SIZE) -> Iterator[Sequence]:
+    """Делит последовательность на части не больше size элементов."""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def build_upsert(
+    model,
+    rows: List[Dict[str, Any]],
+    conflict_column: str,
+    update_values: Callable[[Any], Dict[str, Any]]
+):
+    """
+    Строит многострочный INSERT с обновлением при конфликте уникального ключа.
+    MySQL: INSERT ... ON DUPLICATE KEY UPDATE, SQLite/PostgreSQL: INSERT ... ON CONFLICT DO UPDATE.
+    update_values получает псевдо-таблицу новых значений (inserted/excluded) и возвращает SET-часть.
+    """
+    dialect = engine.dialect.name
+
+    if dialect in ("mysql", "mariadb"):
+        stmt = mysql_insert(model).values(rows)
+        return stmt.on_duplicate_key_update(**update_values(stmt.inserted))
+
+    insert_factory = postgresql_insert if dialect == "postgresql" else sqlite_insert
+    stmt = insert_factory(model).values(rows)
+    return stmt.on_conflict_do_update(index_elements=[conflict_column], set_=update_values(stmt.excluded))
 
-class Base(DeclarativeBase):
-    pass
 
 async def setup_database():
+    """
+    Инициализирует базу данных: создаёт таблицы моделей SQLAlchemy, затем применяет миграции
+    существующих таблиц и досоздаёт недостающие индексы (database/db_migrations.py).
+    """
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
-async def setup_database():
-    """Инициализирует базу данных, создавая все таблицы, определённые в моделях SQLAlchemy."""
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    await apply_migrations(engine, Base.metadata)
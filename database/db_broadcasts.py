@@ -0,0 +1,269 @@
+from datetime import datetime
+from json import dumps, loads
+from logging import getLogger
+from typing import Optional, List, Dict, Any, Iterable
+
+from sqlalchemy import BigInteger, VARCHAR, TEXT, DateTime, ForeignKey, Index, UniqueConstraint
+from sqlalchemy import select, update, insert, delete, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .db_base import Base, async_session, build_upsert, chunked
+from .db_track_codes import TrackCode
+from .db_users import User
+
+logger = getLogger(__name__)
+
+
+class BroadcastJob(Base):
+    """Задание рассылки. Счётчики обновляются по мере доставки, по ним строится прогресс."""
+    __tablename__ = "broadcast_jobs"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    admin_chat_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    progress_message_id: Mapped[Optional[int]] = mapped_column(nullable=True)
+    # Что рассылаем: сообщение админа копируется (copy_message/copy_messages) из source_chat_id.
+    # text (HTML) и media (file_id) — запасной вариант, если исходное сообщение удалено.
+    content_type: Mapped[str] = mapped_column(VARCHAR(16), default="text")
+    text: Mapped[str] = mapped_column(TEXT, nullable=False)
+    source_chat_id: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
+    source_message_ids: Mapped[Optional[str]] = mapped_column(VARCHAR(255), nullable=True)
+    media: Mapped[Optional[str]] = mapped_column(TEXT, nullable=True)
+    segment: Mapped[Optional[str]] = mapped_column(VARCHAR(32), nullable=True)
+    # running -> done; paused — результаты доставки не записались, автоматически не продолжается
+    status: Mapped[str] = mapped_column(VARCHAR(16), default="running", index=True)
+    total: Mapped[int] = mapped_column(default=0)
+    sent: Mapped[int] = mapped_column(default=0)
+    blocked: Mapped[int] = mapped_column(default=0)
+    failed: Mapped[int] = mapped_column(default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "admin_chat_id": self.admin_chat_id,
+            "progress_message_id": self.progress_message_id,
+            "content_type": self.content_type,
+            "text": self.text,
+            "source_chat_id": self.source_chat_id,
+            "source_message_ids": loads(self.source_message_ids) if self.source_message_ids else [],
+            "media": loads(self.media) if self.media else [],
+            "segment": self.segment,
+            "status": self.status,
+            "total": self.total,
+            "sent": self.sent,
+            "blocked": self.blocked,
+            "failed": self.failed
+        }
+
+
+class BroadcastDelivery(Base):
+    """Доставка рассылки одному получателю (pending -> sent / blocked / failed)."""
+    __tablename__ = "broadcast_deliveries"
+    __table_args__ = (
+        UniqueConstraint("job_id", "chat_id", name="uq_broadcast_delivery"),
+        Index("ix_broadcast_deliveries_job_status", "job_id", "status", "id"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    job_id: Mapped[int] = mapped_column(ForeignKey("broadcast_jobs.id", ondelete="CASCADE"), nullable=False)
+    chat_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    status: Mapped[str] = mapped_column(VARCHAR(16), default="pending")
+    attempts: Mapped[int] = mapped_column(default=0)
+
+
+class BlockedUser(Base):
+    """Пользователи, заблокировавшие бота. Исключаются из рассылок до следующего /start."""
+    __tablename__ = "blocked_users"
+
+    tg_id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=False)
+    blocked_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+
+
+# --- ЗАДАНИЯ ---
+
+def _recipients_query(segment: Optional[str]):
+    """tg_id получателей рассылки, кроме заблокировавших бота."""
+    if segment:
+        query = (
+            select(TrackCode.tg_id)
+            .where(TrackCode.status == segment, TrackCode.tg_id.is_not(None))
+            .distinct()
+        )
+        tg_id_column = TrackCode.tg_id
+    else:
+        query = select(User.tg_id)
+        tg_id_column = User.tg_id
+
+    return (
+        query
+        .outerjoin(BlockedUser, BlockedUser.tg_id == tg_id_column)
+        .where(BlockedUser.tg_id.is_(None))
+    )
+
+
+async def get_broadcast_recipients(segment: Optional[str] = None) -> List[int]:
+    """
+    Возвращает tg_id получателей рассылки, кроме заблокировавших бота.
+    segment — статус трек-кода: только пользователи, у которых есть коды в этом статусе.
+    """
+    async with async_session() as session:
+        result = await session.execute(_recipients_query(segment))
+        return list(result.scalars().all())
+
+
+async def count_broadcast_recipients(segment: Optional[str] = None) -> int:
+    """Число получателей рассылки (для предпросмотра) без загрузки самих tg_id."""
+    async with async_session() as session:
+        result = await session.execute(
+            select(func.count()).select_from(_recipients_query(segment).subquery())
+        )
+        return result.scalar_one()
+
+
+async def create_broadcast_job(
+    admin_chat_id: int,
+    progress_message_id: Optional[int],
+    content: Dict[str, Any],
+    recipients: List[int],
+    segment: Optional[str] = None
+) -> int:
+    """
+    Создаёт задание рассылки и строки доставки для всех получателей. Возвращает id задания.
+    content: {"content_type", "text", "source_chat_id", "source_message_ids", "media"}.
+    """
+    recipients = list(dict.fromkeys(recipients))
+
+    async with async_session() as session:
+        job = BroadcastJob(
+            admin_chat_id=admin_chat_id,
+            progress_message_id=progress_message_id,
+            content_type=content.get("content_type", "text"),
+            text=content.get("text") or "",
+            source_chat_id=content.get("source_chat_id"),
+            source_message_ids=dumps(content.get("source_message_ids") or []),
+            media=dumps(content.get("media") or []),
+            segment=segment,
+            status="running",
+            total=len(recipients)
+        )
+        session.add(job)
+        await session.flush()
+
+        for chunk in chunked(recipients):
+            await session.execute(
+                insert(BroadcastDelivery).values([{"job_id": job.id, "chat_id": chat_id} for chat_id in chunk])
+            )
+
+        await session.commit()
+        logger.info("Создано задание рассылки %s. Получателей: %s", job.id, len(recipients))
+        return job.id
+
+
+async def get_broadcast_job(job_id: int) -> Optional[dict]:
+    async with async_session() as session:
+        job = await session.get(BroadcastJob, job_id)
+        return job.to_dict() if job else None
+
+
+async def get_running_broadcast_jobs() -> List[int]:
+    """id незавершённых заданий (для продолжения после перезапуска)."""
+    async with async_session() as session:
+        result = await session.execute(
+            select(BroadcastJob.id).where(BroadcastJob.status == "running").order_by(BroadcastJob.id)
+        )
+        return list(result.scalars().all())
+
+
+async def finish_broadcast_job(job_id: int, status: str = "done") -> None:
+    """Завершает задание: done — разослано, paused — остановлено и само не продолжится."""
+    async with async_session() as session:
+        await session.execute(
+            update(BroadcastJob)
+            .where(BroadcastJob.id == job_id)
+            .values(status=status, finished_at=func.now())
+        )
+        await session.commit()
+
+
+# --- ДОСТАВКИ ---
+
+async def get_pending_deliveries(job_id: int, after_id: int, limit: int) -> List[Dict[str, Any]]:
+    """Пачка неотправленных доставок задания с id больше after_id."""
+    async with async_session() as session:
+        result = await session.execute(
+            select(BroadcastDelivery.id, BroadcastDelivery.chat_id, BroadcastDelivery.attempts)
+            .where(
+                BroadcastDelivery.job_id == job_id,
+                BroadcastDelivery.status == "pending",
+                BroadcastDelivery.id > after_id
+            )
+            .order_by(BroadcastDelivery.id)
+            .limit(limit)
+        )
+        return [dict(row._mapping) for row in result]
+
+
+async def save_delivery_results(job_id: int, results: List[Dict[str, Any]]) -> None:
+    """
+    Записывает результаты пачки доставок и увеличивает счётчики задания в одной транзакции.
+    Каждый элемент: {"id": int, "status": "sent" | "blocked" | "failed", "attempts": int}.
+    """
+    if not results: return
+
+    # Одинаковые (status, attempts) обновляются одним UPDATE ... WHERE id IN (...)
+    groups: Dict[tuple, List[int]] = {}
+    counts = {"sent": 0, "blocked": 0, "failed": 0}
+    for item in results:
+        groups.setdefault((item["status"], item["attempts"]), []).append(item["id"])
+        counts[item["status"]] += 1
+
+    async with async_session() as session:
+        for (status, attempts), ids in groups.items():
+            for chunk in chunked(ids):
+                await session.execute(
+                    update(BroadcastDelivery)
+                    .where(BroadcastDelivery.id.in_(chunk))
+                    .values(status=status, attempts=attempts)
+                )
+
+        await session.execute(
+            update(BroadcastJob)
+            .where(BroadcastJob.id == job_id)
+            .values(
+                sent=BroadcastJob.sent + counts["sent"],
+                blocked=BroadcastJob.blocked + counts["blocked"],
+                failed=BroadcastJob.failed + counts["failed"]
+            )
+        )
+        await session.commit()
+
+
+# --- ЗАБЛОКИРОВАВШИЕ БОТА ---
+
+async def mark_users_blocked(tg_ids: Iterable[int]) -> None:
+    """Отмечает пользователей, заблокировавших бота."""
+    rows = [{"tg_id": tg_id} for tg_id in dict.fromkeys(tg_ids)]
+    if not rows: return
+
+    async with async_session() as session:
+        for chunk in chunked(rows):
+            await session.execute(build_upsert(
+                BlockedUser, chunk, "tg_id", lambda new: {"blocked_at": func.now()}
+            ))
+        await session.commit()
+
+
+async def unblock_user(tg_id: int) -> bool:
+    """
+    Снимает отметку о блокировке (пользователь снова написал боту). Вызывается на каждый /start,
+    а отмечен почти никто: сначала дешёвый SELECT по ключу, DELETE и COMMIT — только если отметка есть.
+    Возвращает True, если отметка была.
+    """
+    async with async_session() as session:
+        blocked = await session.scalar(select(BlockedUser.tg_id).where(BlockedUser.tg_id == tg_id))
+        if blocked is None:
+            return False
+        await session.execute(delete(BlockedUser).where(BlockedUser.tg_id == tg_id))
+        await session.commit()
+        return True
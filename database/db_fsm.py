@@ -0,0 +1,96 @@
+from datetime import datetime, timedelta
+from logging import getLogger
+from typing import Optional, Tuple
+
+from sqlalchemy import VARCHAR, TEXT, DateTime, select, update, delete, or_
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .db_base import Base, async_session, build_upsert
+
+logger = getLogger(__name__)
+
+
+class FSMRecord(Base):
+    """Состояние и данные FSM одного ключа (чат/пользователь) для SQL-хранилища."""
+    __tablename__ = "fsm_storage"
+
+    key: Mapped[str] = mapped_column(VARCHAR(255), primary_key=True)
+    state: Mapped[Optional[str]] = mapped_column(VARCHAR(255), nullable=True)
+    data: Mapped[Optional[str]] = mapped_column(TEXT, nullable=True)
+    expires_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True, index=True)
+
+
+def _not_expired():
+    return or_(FSMRecord.expires_at.is_(None), FSMRecord.expires_at > datetime.utcnow())
+
+
+def _expires_at(ttl: Optional[int]) -> Optional[datetime]:
+    return datetime.utcnow() + timedelta(seconds=ttl) if ttl else None
+
+
+async def _delete_if_expired(session, key: str) -> None:
+    """Удаляет истёкшую запись ключа, чтобы новая запись не унаследовала старые state/data."""
+    await session.execute(
+        delete(FSMRecord).where(
+            FSMRecord.key == key,
+            FSMRecord.expires_at.is_not(None),
+            FSMRecord.expires_at <= datetime.utcnow()
+        )
+    )
+
+
+async def get_fsm_record(key: str) -> Tuple[Optional[str], Optional[str]]:
+    """Возвращает (state, data) по ключу или (None, None), если записи нет или она истекла."""
+    async with async_session() as session:
+        result = await session.execute(
+            select(FSMRecord.state, FSMRecord.data).where(FSMRecord.key == key, _not_expired())
+        )
+        row = result.one_or_none()
+        return (row.state, row.data) if row else (None, None)
+
+
+async def save_fsm_state(key: str, state: Optional[str], ttl: Optional[int]) -> None:
+    """Сохраняет состояние и продлевает срок жизни записи. state=None сбрасывает состояние."""
+    async with async_session() as session:
+        if state is None:
+            await session.execute(delete(FSMRecord).where(FSMRecord.key == key, FSMRecord.data.is_(None)))
+            await session.execute(update(FSMRecord).where(FSMRecord.key == key).values(state=None))
+        else:
+            await _delete_if_expired(session, key)
+            await session.execute(build_upsert(
+                FSMRecord,
+                [{"key": key, "state": state, "expires_at": _expires_at(ttl)}],
+                "key",
+                lambda new: {"state": new.state, "expires_at": new.expires_at}
+            ))
+        await session.commit()
+
+
+async def save_fsm_data(key: str, data: Optional[str], ttl: Optional[int]) -> None:
+    """
+    Сохраняет сериализованные данные FSM. data=None очищает данные.
+    ttl применяется только к новой записи: срок существующей продлевает смена состояния.
+    """
+    async with async_session() as session:
+        if data is None:
+            await session.execute(delete(FSMRecord).where(FSMRecord.key == key, FSMRecord.state.is_(None)))
+            await session.execute(update(FSMRecord).where(FSMRecord.key == key).values(data=None))
+        else:
+            await _delete_if_expired(session, key)
+            await session.execute(build_upsert(
+                FSMRecord,
+                [{"key": key, "data": data, "expires_at": _expires_at(ttl)}],
+                "key",
+                lambda new: {"data": new.data}
+            ))
+        await session.commit()
+
+
+async def purge_expired_fsm_records() -> int:
+    """Удаляет истёкшие записи FSM (брошенные анкеты и бланки)."""
+    async with async_session() as session:
+        result = await session.execute(
+            delete(FSMRecord).where(FSMRecord.expires_at.is_not(None), FSMRecord.expires_at <= datetime.utcnow())
+        )
+        await session.commit()
+        return result.rowcount
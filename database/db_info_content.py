@@ -1,9 +1,14 @@
+from dataclasses import dataclass
 from logging import getLogger
+from time import monotonic
+from typing import Optional, Dict, Iterable, Tuple
+
 from sqlalchemy import VARCHAR, UniqueConstraint, TEXT
 from sqlalchemy.future import select
 from sqlalchemy.orm import Mapped, mapped_column
 
-from .db_base import Base, async_session, engine
+from filters_and_config import CONTENT_CACHE_TTL
+from .db_base import Base, async_session, engine, chunked
 
 logger = getLogger(__name__)
 
@@ -13,12 +18,141 @@ class InfoContent(Base):
     key: Mapped[str] = mapped_column(VARCHAR(255), unique=True, nullable=False)
     value: Mapped[str] = mapped_column(TEXT, nullable=False)
 
-async def get_info_content(key: str):
-    """Получает значение по ключу из таблицы info_content."""
+
+class InfoContentCache:
+    """
+    Локальный для процесса кэш info_content. Хранит и отсутствующие ключи (None),
+    чтобы не ходить в БД за пустыми значениями. Записи живут ttl секунд или до invalidate().
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._values: Dict[str, Tuple[Optional[str], float]] = {}
+
+    def get(self, key: str) -> Tuple[bool, Optional[str]]:
+        """Возвращает (найдено_в_кэше, значение)."""
+        entry = self._values.get(key)
+        if entry and entry[1] > monotonic():
+            self.hits += 1
+            return True, entry[0]
+
+        self.misses += 1
+        return False, None
+
+    def set_many(self, values: Dict[str, Optional[str]]) -> None:
+        expires_at = monotonic() + self.ttl
+        self._values.update({key: (value, expires_at) for key, value in values.items()})
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        """Сбрасывает один ключ или весь кэш."""
+        self.invalidations += 1
+        if key is None:
+            self._values.clear()
+        else:
+            self._values.pop(key, None)
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "keys": len(self._values),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+
+info_content_cache = InfoContentCache(CONTENT_CACHE_TTL)
+
+
+@dataclass(frozen=True)
+class ContentBundle:
+    """Набор ключей info_content, которые один экран показывает вместе."""
+    name: str
+    keys: Tuple[str, ...]
+
+
+CONTENT_BUNDLES: Dict[str, ContentBundle] = {bundle.name: bundle for bundle in (
+    ContentBundle("goods_check", (
+        "goods_check_video1", "goods_check_photo1", "goods_check_video2",
+        "goods_check_photo2", "goods_check_photo3", "goods_check_text"
+    )),
+    ContentBundle("order_form", ("blank_text", "order_form")),
+    ContentBundle("customs_form", ("customs_form_text", "customs_form_document")),
+    ContentBundle("tariffs", ("tariffs_text", "tariffs_document")),
+    ContentBundle("consolidation", ("consolidation_photo", "consolidation_text")),
+    ContentBundle("packing", ("packing_photo", "packing_text")),
+    ContentBundle("prices", ("prices_document", "prices_text")),
+)}
+
+
+async def _load_info_contents(keys: Iterable[str]) -> Dict[str, Optional[str]]:
+    """Загружает значения ключей из БД пачками WHERE key IN (...). Отсутствующие ключи -> None."""
+    unique_keys = list(dict.fromkeys(keys))
+    values: Dict[str, Optional[str]] = dict.fromkeys(unique_keys)
+
     async with async_session() as session:
-        result = await session.execute(select(InfoContent).where(InfoContent.key == key))
-        content = result.scalar_one_or_none()
-        return content.value if content else None
+        for chunk in chunked(unique_keys):
+            result = await session.execute(
+                select(InfoContent.key, InfoContent.value).where(InfoContent.key.in_(chunk))
+            )
+            values.update({row.key: row.value for row in result})
+
+    return values
+
+
+async def preload_info_content() -> int:
+    """Загружает весь info_content в кэш одним запросом (при старте бота)."""
+    async with async_session() as session:
+        result = await session.execute(select(InfoContent.key, InfoContent.value))
+        values = {row.key: row.value for row in result}
+
+    info_content_cache.set_many(values)
+    logger.info("Кэш info_content прогрет. keys=%s", len(values))
+    return len(values)
+
+
+async def get_info_content(key: str):
+    """Получает значение по ключу из таблицы info_content (через кэш)."""
+    found, value = info_content_cache.get(key)
+    if found:
+        return value
+
+    values = await _load_info_contents([key])
+    info_content_cache.set_many(values)
+    return values[key]
+
+
+async def get_info_contents(keys: Iterable[str]) -> Dict[str, Optional[str]]:
+    """
+    Получает несколько ключей сразу: что есть в кэше — из кэша,
+    остальное одним запросом WHERE key IN (...). Отсутствующие ключи -> None.
+    Порядок ключей в результате совпадает с порядком запроса.
+    """
+    unique_keys = list(dict.fromkeys(keys))
+    values: Dict[str, Optional[str]] = {}
+    missing = []
+
+    for key in unique_keys:
+        found, value = info_content_cache.get(key)
+        if found:
+            values[key] = value
+        else:
+            missing.append(key)
+
+    if missing:
+        loaded = await _load_info_contents(missing)
+        info_content_cache.set_many(loaded)
+        values.update(loaded)
+
+    return {key: values[key] for key in unique_keys}
+
+
+async def get_content_bundle(name: str) -> Dict[str, Optional[str]]:
+    """Получает все ключи бандла экрана (см. CONTENT_BUNDLES) за один проход."""
+    return await get_info_contents(CONTENT_BUNDLES[name].keys)
 
 
 async def update_info_content(key: str, value: str) -> None:
@@ -35,9 +169,11 @@ async def update_info_content(key: str, value: str) -> None:
                 session.add(new_content)
             await session.commit()
 
+    info_content_cache.invalidate(key)
+
 
 async def drop_info_content_table():
     """Удаляет таблицу info_content из базы данных."""
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.drop_all, tables=[InfoContent.__table__])
-
+    info_content_cache.invalidate()
@@ -0,0 +1,168 @@
+from datetime import datetime, timedelta
+from json import dumps, loads
+from logging import getLogger
+from typing import Optional, List, Dict, Any, Iterable, Tuple
+
+from sqlalchemy import BigInteger, VARCHAR, TEXT, DateTime, Index, select, update, insert, delete, func
+from sqlalchemy.dialects.mysql import MEDIUMTEXT
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .db_base import Base, async_session, chunked
+
+logger = getLogger(__name__)
+
+
+class BackgroundJob(Base):
+    """
+    Фоновая задача (бланк заказа, выгрузка отчёта и т.п.): pending -> running -> done / failed.
+    Очередь выбирает задачи по (priority, id): меньший priority — раньше.
+    """
+    __tablename__ = "background_jobs"
+    __table_args__ = (
+        Index("ix_background_jobs_queue", "status", "priority", "id"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    job_type: Mapped[str] = mapped_column(VARCHAR(32), nullable=False)
+    priority: Mapped[int] = mapped_column(default=0)
+    chat_id: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
+    # Бланк на сотню товаров не помещается в TEXT MySQL (64 КБ)
+    payload: Mapped[str] = mapped_column(TEXT().with_variant(MEDIUMTEXT(), "mysql"), nullable=False)
+    status: Mapped[str] = mapped_column(VARCHAR(16), default="pending")
+    attempts: Mapped[int] = mapped_column(default=0)
+    error: Mapped[Optional[str]] = mapped_column(VARCHAR(255), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+    started_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+
+async def create_job(job_type: str, priority: int, chat_id: Optional[int], payload: Dict[str, Any]) -> int:
+    """Ставит задачу в очередь. Возвращает id задачи."""
+    async with async_session() as session:
+        result = await session.execute(
+            insert(BackgroundJob).values(
+                job_type=job_type,
+                priority=priority,
+                chat_id=chat_id,
+                payload=dumps(payload, ensure_ascii=False, separators=(",", ":"))
+            )
+        )
+        await session.commit()
+        return result.inserted_primary_key[0]
+
+
+async def has_active_job(job_type: str, chat_id: int) -> bool:
+    """Есть ли у чата невыполненная задача этого типа (чтобы не ставить дубликаты)."""
+    async with async_session() as session:
+        result = await session.execute(
+            select(BackgroundJob.id)
+            .where(
+                BackgroundJob.status.in_(("pending", "running")),
+                BackgroundJob.job_type == job_type,
+                BackgroundJob.chat_id == chat_id
+            )
+            .limit(1)
+        )
+        return result.scalar_one_or_none() is not None
+
+
+async def get_pending_jobs(job_types: Iterable[str], limit: int) -> List[Dict[str, Any]]:
+    """Ожидающие задачи указанных типов в порядке приоритета."""
+    job_types = list(job_types)
+    if not job_types or limit <= 0:
+        return []
+
+    async with async_session() as session:
+        result = await session.execute(
+            select(
+                BackgroundJob.id,
+                BackgroundJob.job_type,
+                BackgroundJob.chat_id,
+                BackgroundJob.payload,
+                BackgroundJob.attempts
+            )
+            .where(BackgroundJob.status == "pending", BackgroundJob.job_type.in_(job_types))
+            .order_by(BackgroundJob.priority, BackgroundJob.id)
+            .limit(limit)
+        )
+        return [{**row._mapping, "payload": loads(row.payload)} for row in result]
+
+
+async def mark_jobs_running(job_ids: List[int]) -> None:
+    if not job_ids: return
+    async with async_session() as session:
+        for chunk in chunked(job_ids):
+            await session.execute(
+                update(BackgroundJob)
+                .where(BackgroundJob.id.in_(chunk))
+                .values(status="running", attempts=BackgroundJob.attempts + 1, started_at=func.now())
+            )
+        await session.commit()
+
+
+async def finish_job(job_id: int, status: str, error: Optional[str] = None) -> None:
+    """Помечает задачу выполненной ('done') или неудачной ('failed')."""
+    async with async_session() as session:
+        await session.execute(
+            update(BackgroundJob)
+            .where(BackgroundJob.id == job_id)
+            .values(status=status, error=error[:255] if error else None, finished_at=func.now())
+        )
+        await session.commit()
+
+
+async def requeue_interrupted_jobs(max_attempts: int) -> Tuple[int, List[Dict[str, Any]]]:
+    """
+    Возвращает в очередь задачи, прерванные перезапуском (остались running).
+    Задачи, исчерпавшие max_attempts, помечаются failed и возвращаются списком {id, job_type, chat_id}.
+    """
+    async with async_session() as session:
+        result = await session.execute(
+            select(BackgroundJob.id, BackgroundJob.job_type, BackgroundJob.chat_id, BackgroundJob.attempts)
+            .where(BackgroundJob.status == "running")
+        )
+        rows = result.all()
+
+        retry_ids = [row.id for row in rows if row.attempts < max_attempts]
+        failed = [
+            {"id": row.id, "job_type": row.job_type, "chat_id": row.chat_id}
+            for row in rows if row.attempts >= max_attempts
+        ]
+
+        for chunk in chunked(retry_ids):
+            await session.execute(
+                update(BackgroundJob).where(BackgroundJob.id.in_(chunk)).values(status="pending")
+            )
+        for chunk in chunked([job["id"] for job in failed]):
+            await session.execute(
+                update(BackgroundJob)
+                .where(BackgroundJob.id.in_(chunk))
+                .values(status="failed", error="interrupted", finished_at=func.now())
+            )
+        await session.commit()
+        return len(retry_ids), failed
+
+
+async def purge_finished_jobs(older_than_days: int) -> int:
+    """Удаляет завершённые задачи старше older_than_days дней (вместе с их данными)."""
+    threshold = datetime.now() - timedelta(days=older_than_days)
+    async with async_session() as session:
+        result = await session.execute(
+            delete(BackgroundJob)
+            .where(BackgroundJob.status.in_(("done", "failed")), BackgroundJob.finished_at < threshold)
+        )
+        await session.commit()
+        return result.rowcount
+
+
+async def get_job_stats() -> Dict[str, Dict[str, int]]:
+    """{job_type: {status: количество}} по всем задачам в таблице."""
+    async with async_session() as session:
+        result = await session.execute(
+            select(BackgroundJob.job_type, BackgroundJob.status, func.count())
+            .group_by(BackgroundJob.job_type, BackgroundJob.status)
+        )
+        stats: Dict[str, Dict[str, int]] = {}
+        for job_type, status, count in result:
+            stats.setdefault(job_type, {})[status] = count
+        return stats
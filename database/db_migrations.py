@@ -0,0 +1,142 @@
+from datetime import datetime
+from logging import getLogger
+from typing import Callable, Dict, List, Tuple
+
+from sqlalchemy import Column, DateTime, MetaData, Table, VARCHAR, insert, inspect, select, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+logger = getLogger(__name__)
+
+# Служебная таблица применённых миграций. Своя MetaData: модели бота о ней не знают
+_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations",
+    _metadata,
+    Column("name", VARCHAR(64), primary_key=True),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+def _is_mysql(conn: Connection) -> bool:
+    return conn.dialect.name in ("mysql", "mariadb")
+
+
+def _add_columns(conn: Connection, table: str, columns: Dict[str, str]) -> None:
+    """ALTER TABLE ... ADD COLUMN для колонок, которых ещё нет (create_all существующие таблицы не меняет)."""
+    existing = {column["name"] for column in inspect(conn).get_columns(table)}
+    for name, ddl in columns.items():
+        if name not in existing:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+            logger.info("Миграция: %s.%s добавлена", table, name)
+
+
+# --- МИГРАЦИИ (по порядку; имя не меняется после выпуска) ---
+
+def _broadcast_content_columns(conn: Connection) -> None:
+    _add_columns(conn, "broadcast_jobs", {
+        "content_type": "VARCHAR(16) NOT NULL DEFAULT 'text'",
+        "source_chat_id": "BIGINT NULL",
+        "source_message_ids": "VARCHAR(255) NULL",
+        "media": "TEXT NULL",
+        "segment": "VARCHAR(32) NULL",
+    })
+
+
+def _track_code_manifest_columns(conn: Connection) -> None:
+    _add_columns(conn, "track_codes", {
+        "weight": "FLOAT NULL",
+        "status_at": "DATETIME NULL",
+    })
+
+
+def _track_code_bounded_varchar(conn: Connection) -> None:
+    """
+    track_code/status: VARCHAR(64)/VARCHAR(16) вместо строк без длины — короче ключи индексов.
+    Нужна только MySQL: в SQLite длина VARCHAR не влияет на хранение. MODIFY перестраивает таблицу,
+    поэтому сначала сверяем текущие типы колонок.
+    """
+    if not _is_mysql(conn):
+        return
+    columns = {column["name"]: column for column in inspect(conn).get_columns("track_codes")}
+    if all(
+        isinstance(columns[name]["type"], VARCHAR) and columns[name]["type"].length == length
+        and not columns[name]["nullable"]
+        for name, length in (("track_code", 64), ("status", 16))
+    ):
+        return
+    longest = conn.execute(text(
+        "SELECT MAX(CHAR_LENGTH(track_code)), MAX(CHAR_LENGTH(status)) FROM track_codes"
+    )).one()
+    if (longest[0] or 0) > 64 or (longest[1] or 0) > 16:
+        # Без этой миграции бот работает, просто индексы шире; данные не обрезаем
+        raise RuntimeError(f"В track_codes есть значения длиннее VARCHAR(64)/VARCHAR(16): {tuple(longest)}")
+    conn.execute(text(
+        "ALTER TABLE track_codes MODIFY track_code VARCHAR(64) NOT NULL, MODIFY status VARCHAR(16) NOT NULL"
+    ))
+
+
+MIGRATIONS: List[Tuple[str, Callable[[Connection], None]]] = [
+    ("0001_broadcast_content_columns", _broadcast_content_columns),
+    ("0002_track_code_manifest_columns", _track_code_manifest_columns),
+    ("0003_track_code_bounded_varchar", _track_code_bounded_varchar),
+]
+
+
+def ensure_indexes(conn: Connection, metadata: MetaData) -> int:
+    """
+    Создаёт индексы моделей, которых нет в базе (create_all создаёт индексы только вместе с таблицей).
+    Проверка по именам через inspect — дёшево, выполняется при каждом запуске. Индекс, который
+    создать не удалось, пишется в лог: бот работает и без него, попытка повторится при следующем запуске.
+    """
+    inspector = inspect(conn)
+    created = 0
+    for table in metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        existing |= {constraint["name"] for constraint in inspector.get_unique_constraints(table.name)}
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            try:
+                index.create(conn)
+            except Exception as e:
+                logger.error("Миграция: индекс %s не создан: %s", index.name, e)
+                continue
+            created += 1
+            logger.info("Миграция: создан индекс %s", index.name)
+    return created
+
+
+async def apply_migrations(engine: AsyncEngine, metadata: MetaData) -> None:
+    """
+    Применяет ещё не применённые миграции, затем досоздаёт недостающие индексы.
+    Вызывается после create_all в setup_database.
+
+    Каждая миграция идёт в своей транзакции, без savepoint: MySQL фиксирует DDL неявно
+    (и теряет savepoint). Строка в schema_migrations пишется отдельной транзакцией только после
+    успешной миграции. Миграции идемпотентны, поэтому упавшая (или не записанная) миграция
+    пишется в лог и просто повторяется при следующем запуске.
+    """
+    async with engine.begin() as conn:
+        await conn.run_sync(schema_migrations.create, checkfirst=True)
+        applied = set((await conn.execute(select(schema_migrations.c.name))).scalars())
+
+    for name, migration in MIGRATIONS:
+        if name in applied:
+            continue
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(migration)
+            async with engine.begin() as conn:
+                await conn.execute(insert(schema_migrations).values(name=name, applied_at=datetime.now()))
+            logger.info("Миграция %s применена", name)
+        except Exception as e:
+            logger.error("Миграция %s не применена: %s", name, e)
+
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(ensure_indexes, metadata)
+    except Exception as e:
+        logger.error("Миграция: проверка индексов не выполнена: %s", e)
@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta
+from logging import getLogger
+from typing import Optional, List, Dict, Any
+
+from sqlalchemy import BigInteger, VARCHAR, TEXT, DateTime, select, delete, update, insert, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .db_base import Base, async_session, chunked
+
+logger = getLogger(__name__)
+
+
+class NotificationOutbox(Base):
+    """Очередь исходящих уведомлений. Строка живёт, пока сообщение не доставлено."""
+    __tablename__ = "notification_outbox"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    chat_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    text: Mapped[str] = mapped_column(TEXT, nullable=False)
+    track_code: Mapped[Optional[str]] = mapped_column(VARCHAR(255), nullable=True)
+    status: Mapped[str] = mapped_column(VARCHAR(16), default="pending", index=True)
+    attempts: Mapped[int] = mapped_column(default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+
+
+async def add_outbox_notifications(session, notifications: List[Dict[str, Any]]) -> int:
+    """
+    Добавляет уведомления в outbox в рамках переданной сессии (вместе с изменением данных).
+    Каждый элемент: {"chat_id": int, "text": str, "track_code": Optional[str]}.
+    """
+    for chunk in chunked(notifications):
+        await session.execute(insert(NotificationOutbox).values(list(chunk)))
+    return len(notifications)
+
+
+async def get_pending_notifications(after_id: int, limit: int) -> List[Dict[str, Any]]:
+    """Возвращает пачку ожидающих отправки уведомлений с id больше after_id."""
+    async with async_session() as session:
+        result = await session.execute(
+            select(
+                NotificationOutbox.id,
+                NotificationOutbox.chat_id,
+                NotificationOutbox.text,
+                NotificationOutbox.track_code,
+                NotificationOutbox.attempts
+            )
+            .where(NotificationOutbox.status == "pending", NotificationOutbox.id > after_id)
+            .order_by(NotificationOutbox.id)
+            .limit(limit)
+        )
+        return [dict(row._mapping) for row in result]
+
+
+async def delete_sent_notifications(ids: List[int]) -> None:
+    """Удаляет доставленные уведомления из outbox."""
+    if not ids: return
+    async with async_session() as session:
+        for chunk in chunked(ids):
+            await session.execute(delete(NotificationOutbox).where(NotificationOutbox.id.in_(chunk)))
+        await session.commit()
+
+
+async def mark_notification_failed(notification_id: int, status: str, attempts: int) -> None:
+    """Помечает уведомление как недоставленное ('failed' или 'unreachable')."""
+    async with async_session() as session:
+        await session.execute(
+            update(NotificationOutbox)
+            .where(NotificationOutbox.id == notification_id)
+            .values(status=status, attempts=attempts)
+        )
+        await session.commit()
+
+
+async def purge_failed_notifications(older_than_days: int) -> int:
+    """Удаляет недоставленные уведомления ('failed', 'unreachable') старше older_than_days дней."""
+    threshold = datetime.now() - timedelta(days=older_than_days)
+    async with async_session() as session:
+        result = await session.execute(
+            delete(NotificationOutbox)
+            .where(NotificationOutbox.status.in_(("failed", "unreachable")), NotificationOutbox.created_at < threshold)
+        )
+        await session.commit()
+        return result.rowcount
+
+
+async def count_pending_notifications() -> int:
+    """Возвращает количество уведомлений, ожидающих отправки."""
+    async with async_session() as session:
+        result = await session.execute(
+            select(func.count()).select_from(NotificationOutbox).where(NotificationOutbox.status == "pending")
+        )
+        return result.scalar_one()
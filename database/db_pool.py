@@ -0,0 +1,108 @@
+from logging import getLogger
+from time import monotonic, perf_counter
+from typing import Any, Dict
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from filters_and_config import (
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_WAIT_WARNING
+)
+from utils.metrics import metrics
+
+logger = getLogger(__name__)
+
+# Не чаще раза в столько секунд предупреждать о долгом ожидании: при нехватке пула их будут сотни
+WAIT_WARNING_INTERVAL = 10.0
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Пул соединений, который замеряет ожидание свободного соединения (в том числе открытие
+    нового сверх pool_size). Событий SQLAlchemy на ожидание нет (checkout приходит уже после него),
+    поэтому замер — вокруг публичного Pool.connect(), через который соединение берут engine и сессии.
+    """
+
+    wait_warning = DB_POOL_WAIT_WARNING
+    _last_warning = 0.0
+    _suppressed_warnings = 0
+
+    def connect(self):
+        started = perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            metrics.inc("bot_db_pool_timeouts_total")
+            logger.error("Нет свободного соединения с БД за %.0f сек. %s", DB_POOL_TIMEOUT, self.status())
+            raise
+        finally:
+            self._record_wait(perf_counter() - started)
+
+    def _record_wait(self, waited: float) -> None:
+        metrics.observe("bot_db_pool_wait_seconds", waited)
+        if waited < self.wait_warning:
+            return
+
+        metrics.inc("bot_db_pool_slow_checkouts_total")
+        now = monotonic()
+        if now - InstrumentedQueuePool._last_warning < WAIT_WARNING_INTERVAL:
+            InstrumentedQueuePool._suppressed_warnings += 1
+            return
+
+        logger.warning(
+            "Ожидание соединения с БД %.2f сек (порог %.2f). %s%s",
+            waited, self.wait_warning, self.status(),
+            f" Ещё долгих ожиданий с прошлого сообщения: {self._suppressed_warnings}." if self._suppressed_warnings else ""
+        )
+        InstrumentedQueuePool._last_warning = now
+        InstrumentedQueuePool._suppressed_warnings = 0
+
+
+def pool_options(database_url: str) -> Dict[str, Any]:
+    """
+    Параметры пула для create_async_engine из настроек DB_POOL_*.
+    SQLite в памяти живёт в одном соединении (StaticPool) — для него пул не настраивается.
+    """
+    url = make_url(database_url)
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        return {}
+
+    return {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+
+def instrument_pool(engine: AsyncEngine) -> None:
+    """Считает выданные соединения по событиям checkout/checkin пула (текущее значение и пик)."""
+    pool = engine.sync_engine.pool
+    if not isinstance(pool, InstrumentedQueuePool) or event.contains(pool, "checkout", _on_checkout):
+        return
+
+    # Предел — из своих настроек: у пула SQLAlchemy он хранится только в закрытом атрибуте
+    metrics.set("bot_db_pool_capacity", DB_POOL_SIZE + max(DB_MAX_OVERFLOW, 0))
+    event.listen(pool, "checkout", _on_checkout)
+    event.listen(pool, "checkin", _on_checkin)
+
+
+_in_use = 0
+
+
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    global _in_use
+    _in_use += 1
+    metrics.set("bot_db_pool_in_use", _in_use)
+    if _in_use > metrics.gauge_value("bot_db_pool_in_use_peak"):
+        metrics.set("bot_db_pool_in_use_peak", _in_use)
+
+
+def _on_checkin(dbapi_connection, connection_record):
+    global _in_use
+    _in_use = max(_in_use - 1, 0)
+    metrics.set("bot_db_pool_in_use", _in_use)
@@ -1,79 +1,179 @@
+from datetime import datetime
 from logging import getLogger
-from typing import Optional, List, Tuple
+from time import perf_counter
+from typing import Optional, List, Sequence, Tuple, Dict, Any, Union
 
-from aiogram import Bot
-from aiogram.exceptions import TelegramBadRequest
-from sqlalchemy import update, select, delete
+from sqlalchemy import update, select, delete, func
 
-from .db_base import async_session
-from .db_users import get_user_by_id
+from .db_base import async_session, build_upsert, chunked
+from .db_notifications import add_outbox_notifications
+from .db_track_events import add_track_code_events
+from .db_users import get_tg_ids_by_internal_ids
 from .db_track_codes import TrackCode
 
 logger = getLogger(__name__)
 
+# (код, внутренний ID пользователя) или из манифеста склада (код, ID, вес, дата статуса)
+TrackCodeRow = Union[
+    Tuple[str, Optional[int]],
+    Tuple[str, Optional[int], Optional[float], Optional[datetime]]
+]
+
 
 # --- УВЕДОМЛЕНИЯ ---
 
-async def safe_send_notification(bot: Bot, track_code: str, chat_id: int, status: str, session) -> bool:
-    """Безопасно отправляет уведомление и сбрасывает tg_id при блокировке."""
+def build_status_notification_text(track_code: str, status: str) -> Optional[str]:
+    """Возвращает текст уведомления о смене статуса или None, если статус не уведомляется."""
     texts = {
         "in_stock": f"Ваш товар <code>{track_code}</code> <b>прибыл на склад</b>.",
         "shipped": f"Ваш товар <code>{track_code}</code> <b>отправлен</b>.",
         "arrived": f"Ваш товар <code>{track_code}</code> <b>прибыл в пункт выдачи</b>! (@fir2201)"
     }
-
-    text = texts.get(status)
-    if not text: return False
-
-    try:
-        await bot.send_message(chat_id, text)
-        return True
-    except TelegramBadRequest as e:
-        if "chat not found" in str(e).lower() or "blocked" in str(e).lower():
-            logger.warning(f"Чат {chat_id} недоступен. Сбрасываем привязку для {track_code}.")
-            await session.execute(
-                update(TrackCode).where(TrackCode.track_code == track_code).values(tg_id=None)
-            )
-        return False
-    except Exception as e:
-        logger.error(f"Ошибка отправки {track_code} -> {chat_id}: {e}")
-        return False
+    return texts.get(status)
 
 
-async def add_or_update_track_codes_list(codes_data: List[Tuple[str, Optional[int]]], status: str, bot: Bot) -> None:
-    """
-    Массовое обновление статусов/привязок с уведомлениями.
-    """
+async def unbind_track_codes(track_codes: List[str]) -> int:
+    """Сбрасывает привязку (tg_id) у списка трек-кодов."""
+    if not track_codes: return 0
 
+    unbound = 0
     async with async_session() as session:
-        for track_code, internal_id in codes_data:
-
-            actual_tg_id = None
-            if internal_id:
-                user_info = await get_user_by_id(internal_id)
-                if user_info: actual_tg_id = user_info.get('tg_id')
-
-            track = (await session.execute(
-                select(TrackCode).where(TrackCode.track_code == track_code)
-            )).scalar_one_or_none()
+        for chunk in chunked(track_codes):
+            result = await session.execute(
+                update(TrackCode).where(TrackCode.track_code.in_(chunk)).values(tg_id=None)
+            )
+            unbound += result.rowcount
+        await session.commit()
+    return unbound
 
-            target_tg_id = None
 
-            if track:
-                track.status = status
-                if actual_tg_id: track.tg_id = actual_tg_id
+# --- МАССОВОЕ ОБНОВЛЕНИЕ СТАТУСОВ ---
 
-                target_tg_id = track.tg_id
-            else:
-                new_track = TrackCode(track_code=track_code, status=status, tg_id=actual_tg_id)
-                session.add(new_track)
-                target_tg_id = actual_tg_id
+async def add_or_update_track_codes_list(
+    codes_data: Sequence[TrackCodeRow],
+    status: str
+) -> Dict[str, Any]:
+    """
+    Массовое обновление статусов/привязок с постановкой уведомлений в очередь.
+
+    1. Все внутренние FS-ID разрешаются в tg_id одним запросом.
+    2. Коды вставляются/обновляются пачками (INSERT ... ON DUPLICATE KEY UPDATE).
+       Вес из манифеста перезаписывает старый, только если указан; дата статуса — из манифеста,
+       а при смене статуса без даты — текущая.
+    3. Кодам, у которых статус сменился, пишется событие в track_code_events, а владельцам этих кодов
+       (и кодов, получивших нового владельца) — уведомления в notification_outbox, всё в той же
+       транзакции. Повтор уже выставленного статуса уведомлений не даёт (раньше повторная загрузка
+       того же файла уведомляла всех владельцев ещё раз; теперь на этом держится загрузка файла
+       пачками — код, повторённый в следующей пачке, не уведомляется дважды). Уведомления отправляет
+       диспетчер (utils.notification_dispatcher).
+
+    Возвращает статистику: {"rows", "seconds", "rows_per_sec", "notified", "unknown_ids", "unchanged"},
+    unknown_ids — строки с внутренним ID, которого нет среди пользователей, unchanged — коды, уже
+    имевшие этот статус (владельцы не уведомлялись, если владелец не сменился).
+    """
+    started = perf_counter()
+
+    # Дубликаты схлопываем: при повторе кода побеждает строка с ID пользователя
+    latest: Dict[str, TrackCodeRow] = {}
+    for row in codes_data:
+        if row[1] or row[0] not in latest:
+            latest[row[0]] = row
+
+    tg_ids = await get_tg_ids_by_internal_ids(row[1] for row in latest.values() if row[1])
+
+    rows = [
+        {
+            "track_code": code,
+            "status": status,
+            "tg_id": tg_ids.get(internal_id) if internal_id else None,
+            "weight": extra[0] if extra else None,
+            "status_at": extra[1] if len(extra) > 1 else None,
+        }
+        for code, internal_id, *extra in latest.values()
+    ]
+    unknown_ids = sum(1 for row in latest.values() if row[1] and row[1] not in tg_ids)
+
+    notify = build_status_notification_text("", status) is not None
+    notifications: List[Dict[str, Any]] = []
+    events: List[Dict[str, Any]] = []
+    unchanged = 0
+    now = datetime.now()
 
-            if target_tg_id:
-                await safe_send_notification(bot, track_code, target_tg_id, status, session)
+    async with async_session() as session:
+        for chunk in chunked(rows):
+            # Прежние статусы и владельцы: история пишется только при смене статуса, уведомление —
+            # при смене статуса или новом владельце
+            previous = {
+                row.track_code: (row.status, row.tg_id)
+                for row in await session.execute(
+                    select(TrackCode.track_code, TrackCode.status, TrackCode.tg_id)
+                    .where(TrackCode.track_code.in_([row["track_code"] for row in chunk]))
+                )
+            }
+            changed: List[str] = []
+            for row in chunk:
+                old_status, old_tg_id = previous.get(row["track_code"], (None, None))
+                if old_status != status:
+                    row["status_at"] = row["status_at"] or now
+                    events.append({"track_code": row["track_code"], "status": status, "ts": row["status_at"]})
+                    changed.append(row["track_code"])
+                else:
+                    unchanged += 1
+                    if row["tg_id"] and row["tg_id"] != old_tg_id:
+                        changed.append(row["track_code"])
+
+            await session.execute(build_upsert(
+                TrackCode,
+                chunk,
+                "track_code",
+                # Новая привязка перезаписывает старую, но отсутствие ID старую не стирает
+                lambda new: {
+                    "status": new.status,
+                    "tg_id": func.coalesce(new.tg_id, TrackCode.tg_id),
+                    "weight": func.coalesce(new.weight, TrackCode.weight),
+                    "status_at": func.coalesce(new.status_at, TrackCode.status_at),
+                }
+            ))
+
+            # Повторная загрузка того же статуса (или повтор кода в следующей пачке файла) не уведомляет снова
+            if not notify or not changed:
+                continue
+
+            owners = await session.execute(
+                select(TrackCode.track_code, TrackCode.tg_id)
+                .where(TrackCode.track_code.in_(changed))
+                .where(TrackCode.tg_id.is_not(None))
+            )
+            notifications.extend(
+                {
+                    "chat_id": row.tg_id,
+                    "text": build_status_notification_text(row.track_code, status),
+                    "track_code": row.track_code
+                }
+                for row in owners
+            )
 
+        await add_track_code_events(session, events)
+        await add_outbox_notifications(session, notifications)
         await session.commit()
 
+    ingest_seconds = perf_counter() - started
+    rows_per_sec = len(rows) / ingest_seconds if ingest_seconds else float(len(rows))
+
+    logger.info(
+        "Массовое обновление статусов: status=%s rows=%s changed=%s seconds=%.3f rows_per_sec=%.0f owners=%s",
+        status, len(rows), len(events), ingest_seconds, rows_per_sec, len(notifications)
+    )
+
+    return {
+        "rows": len(rows),
+        "seconds": ingest_seconds,
+        "rows_per_sec": rows_per_sec,
+        "notified": len(notifications),
+        "unknown_ids": unknown_ids,
+        "unchanged": unchanged
+    }
+
 
 # --- АДМИН-УДАЛЕНИЕ ---
 
@@ -1,10 +1,12 @@
 from logging import getLogger
-from typing import Optional, List, Tuple, Dict
+from datetime import datetime
+from typing import Optional, List, Tuple, Dict, AsyncIterator
 
-from sqlalchemy import select, delete, update, String, BigInteger
+from sqlalchemy import select, delete, update, VARCHAR, BigInteger, Float, DateTime, Index
 from sqlalchemy.orm import Mapped, mapped_column
 
-from .db_base import async_session, Base, engine
+from .db_base import async_session, Base, engine, chunked
+from .db_track_events import add_track_code_events, status_events
 
 logger = getLogger(__name__)
 
@@ -13,11 +15,22 @@ DEFAULT_TRACK_STATUS = "out_of_stock"
 
 class TrackCode(Base):
     __tablename__ = 'track_codes'
+    # Индексы покрывают частые запросы целиком (без чтения строк таблицы):
+    # коды пользователя (tg_id[, status]) -> track_code, status; статус (удаление отправленных,
+    # сегменты рассылок) -> tg_id; поиск по коду -> status, tg_id. Проверка: benchmarks/explain_audit.py
+    __table_args__ = (
+        Index("ix_track_codes_tg_id_status", "tg_id", "status", "track_code"),
+        Index("ix_track_codes_status", "status", "tg_id"),
+        Index("ix_track_codes_search", "track_code", "status", "tg_id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
-    track_code: Mapped[str] = mapped_column(String, unique=True, index=True)
-    status: Mapped[str] = mapped_column(String, default=DEFAULT_TRACK_STATUS)
+    track_code: Mapped[str] = mapped_column(VARCHAR(64), unique=True, index=True)
+    status: Mapped[str] = mapped_column(VARCHAR(16), default=DEFAULT_TRACK_STATUS)
     tg_id: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
+    # Из манифестов склада: вес (кг) и когда выставлен текущий статус (дата из файла или время загрузки)
+    weight: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    status_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
 
     def __repr__(self):
         return f"<TrackCode(code={self.track_code}, status={self.status}, tg_id={self.tg_id})>"
@@ -37,6 +50,26 @@ async def get_track_code(track_code: str) -> Optional[dict]:
         return None
 
 
+async def get_track_codes_info(track_codes: List[str]) -> Dict[str, Optional[dict]]:
+    """
+    Пакетный вариант get_track_code: статус и владелец для N кодов за несколько запросов IN (...).
+    Ключи результата идут в порядке ввода (без повторов), для ненайденных кодов значение None.
+    """
+    found: Dict[str, dict] = {}
+    unique_codes = list(dict.fromkeys(track_codes))
+
+    async with async_session() as session:
+        for chunk in chunked(unique_codes):
+            result = await session.execute(
+                select(TrackCode.track_code, TrackCode.status, TrackCode.tg_id)
+                .where(TrackCode.track_code.in_(chunk))
+            )
+            for row in result:
+                found[row.track_code] = {'track_code': row.track_code, 'status': row.status, 'tg_id': row.tg_id}
+
+    return {code: found.get(code) for code in unique_codes}
+
+
 async def get_user_track_codes(tg_id: int) -> List[Tuple[str, str]]:
     """Получает все треки пользователя."""
     async with async_session() as session:
@@ -47,16 +80,30 @@ async def get_user_track_codes(tg_id: int) -> List[Tuple[str, str]]:
         return result.all()
 
 
-async def get_all_track_codes() -> List[Dict]:
-    """Получает все трек-коды для отчета."""
-    async with async_session() as session:
-        result = await session.execute(select(TrackCode))
-        return [{
-            "id": tc.id,
-            "track_code": tc.track_code,
-            "status": tc.status,
-            "tg_id": tc.tg_id
-        } for tc in result.scalars()]
+async def iter_track_codes_pages(page_size: int = 5000) -> AsyncIterator[List[Dict]]:
+    """
+    Отдаёт все трек-коды страницами для отчёта (keyset-пагинация по id).
+    Каждая страница читается отдельным коротким запросом, память ограничена размером страницы.
+    """
+    last_id = 0
+    while True:
+        async with async_session() as session:
+            result = await session.execute(
+                select(TrackCode.id, TrackCode.track_code, TrackCode.status, TrackCode.tg_id)
+                .where(TrackCode.id > last_id)
+                .order_by(TrackCode.id)
+                .limit(page_size)
+            )
+            page = [dict(row._mapping) for row in result]
+
+        if not page:
+            return
+
+        yield page
+        last_id = page[-1]["id"]
+
+        if len(page) < page_size:
+            return
 
 
 async def check_track_codes_existence(track_codes: List[str]) -> Tuple[List[Dict], List[str]]:
@@ -88,9 +135,11 @@ async def check_track_codes_existence(track_codes: List[str]) -> Tuple[List[Dict
 
 async def create_track_code(track_code: str, status: str, tg_id: Optional[int] = None) -> None:
     """Создает новый трек-код."""
+    now = datetime.now()
     async with async_session() as session:
-        new_track = TrackCode(track_code=track_code, status=status, tg_id=tg_id)
+        new_track = TrackCode(track_code=track_code, status=status, tg_id=tg_id, status_at=now)
         session.add(new_track)
+        await add_track_code_events(session, status_events([track_code], status, now))
         await session.commit()
 
 
@@ -102,10 +151,15 @@ async def update_track_code(track_code: str, status: Optional[str] = None, tg_id
 
     if not update_data: return False
 
+    now = datetime.now()
+    if status is not None: update_data['status_at'] = now
+
     async with async_session() as session:
         result = await session.execute(
             update(TrackCode).where(TrackCode.track_code == track_code).values(**update_data)
         )
+        if status is not None and result.rowcount:
+            await add_track_code_events(session, status_events([track_code], status, now))
         await session.commit()
         return result.rowcount > 0
 
@@ -133,9 +187,11 @@ async def check_or_add_track_code(track_code: str, tg_id: int) -> str:
                 new_tc = TrackCode(
                     track_code=track_code,
                     status=DEFAULT_TRACK_STATUS,
-                    tg_id=tg_id
+                    tg_id=tg_id,
+                    status_at=datetime.now()
                 )
                 session.add(new_tc)
+                await add_track_code_events(session, status_events([track_code], DEFAULT_TRACK_STATUS, new_tc.status_at))
                 # Возвращаем статус по умолчанию
                 return DEFAULT_TRACK_STATUS
 
@@ -166,13 +222,17 @@ async def bulk_assign_track_codes(track_codes_list: List[str], user_tg_id: int)
         )
         existing_set = {row[0] for row in existing_res.all()}
 
+        now = datetime.now()
         to_create = [
-            TrackCode(track_code=c, status=DEFAULT_TRACK_STATUS, tg_id=user_tg_id)
+            TrackCode(track_code=c, status=DEFAULT_TRACK_STATUS, tg_id=user_tg_id, status_at=now)
             for c in unique_codes if c not in existing_set
         ]
 
         if to_create:
             session.add_all(to_create)
+            await add_track_code_events(
+                session, status_events([tc.track_code for tc in to_create], DEFAULT_TRACK_STATUS, now)
+            )
 
         await session.commit()
         return {"assigned": assigned, "created": len(to_create)}
@@ -198,13 +258,15 @@ async def add_multiple_track_codes(track_codes: List[str], tg_id: int) -> Tuple[
         existing_set = {row[0] for row in existing_res.all()}
 
         # 2. Формируем список новых объектов для добавления
+        now = datetime.now()
         to_create = []
         for code in unique_codes:
             if code not in existing_set:
                 new_track = TrackCode(
                     track_code=code,
                     status=DEFAULT_TRACK_STATUS,
-                    tg_id=tg_id
+                    tg_id=tg_id,
+                    status_at=now
                 )
                 to_create.append(new_track)
                 added_codes.append(code)
@@ -212,6 +274,7 @@ async def add_multiple_track_codes(track_codes: List[str], tg_id: int) -> Tuple[
         # 3. Массовая вставка
         if to_create:
             session.add_all(to_create)
+            await add_track_code_events(session, status_events(added_codes, DEFAULT_TRACK_STATUS, now))
             new_codes_added_count = len(to_create)
             await session.commit()
 
@@ -0,0 +1,107 @@
+from datetime import date, datetime, timedelta
+from logging import getLogger
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import DateTime, Index, VARCHAR, delete, func, insert, select
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .db_base import Base, async_session, chunked
+
+logger = getLogger(__name__)
+
+
+class TrackCodeEvent(Base):
+    """
+    История статусов трек-кода: строка на каждую смену статуса (в том числе появление кода в базе).
+    Только добавление — строки не обновляются, старые удаляет purge_track_code_events.
+    Индекс (track_code, ts) отдаёт историю кодов одним диапазоном, индекс по ts — для аналитики и очистки.
+    """
+    __tablename__ = "track_code_events"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    track_code: Mapped[str] = mapped_column(VARCHAR(64), nullable=False)
+    status: Mapped[str] = mapped_column(VARCHAR(16), nullable=False)
+    ts: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_track_code_events_code_ts", "track_code", "ts"),
+        Index("ix_track_code_events_ts", "ts"),
+    )
+
+
+# --- ЗАПИСЬ ---
+
+async def add_track_code_events(session, events: Sequence[Dict[str, Any]]) -> int:
+    """
+    Добавляет события в рамках переданной сессии (вместе со сменой статуса), многострочными INSERT.
+    Каждый элемент: {"track_code": str, "status": str, "ts": datetime}.
+    """
+    for chunk in chunked(events):
+        await session.execute(insert(TrackCodeEvent).values(list(chunk)))
+    return len(events)
+
+
+def status_events(track_codes: Sequence[str], status: str, ts: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """События одного статуса для списка кодов (по умолчанию — с текущим временем)."""
+    ts = ts or datetime.now()
+    return [{"track_code": code, "status": status, "ts": ts} for code in track_codes]
+
+
+# --- ЧТЕНИЕ ---
+
+async def get_track_code_timelines(track_codes: Sequence[str]) -> Dict[str, List[Tuple[str, datetime]]]:
+    """История кодов: {код: [(статус, время), ...] по времени}. Коды без событий в ответ не попадают."""
+    timelines: Dict[str, List[Tuple[str, datetime]]] = {}
+    async with async_session() as session:
+        for chunk in chunked(list(dict.fromkeys(track_codes))):
+            result = await session.execute(
+                select(TrackCodeEvent.track_code, TrackCodeEvent.status, TrackCodeEvent.ts)
+                .where(TrackCodeEvent.track_code.in_(chunk))
+                .order_by(TrackCodeEvent.track_code, TrackCodeEvent.ts, TrackCodeEvent.id)
+            )
+            for row in result:
+                timelines.setdefault(row.track_code, []).append((row.status, row.ts))
+    return timelines
+
+
+async def get_status_event_stats(days: int) -> Dict[date, Dict[str, int]]:
+    """Сколько кодов получили каждый статус по дням за последние days дней: {день: {статус: количество}}."""
+    since = datetime.combine(date.today() - timedelta(days=days - 1), datetime.min.time())
+    day = func.date(TrackCodeEvent.ts)
+    stats: Dict[date, Dict[str, int]] = {}
+    async with async_session() as session:
+        result = await session.execute(
+            select(day, TrackCodeEvent.status, func.count())
+            .where(TrackCodeEvent.ts >= since)
+            .group_by(day, TrackCodeEvent.status)
+        )
+        for event_day, status, count in result:
+            # SQLite отдаёт date() строкой
+            if isinstance(event_day, str):
+                event_day = date.fromisoformat(event_day)
+            stats.setdefault(event_day, {})[status] = count
+    return dict(sorted(stats.items()))
+
+
+# --- ХРАНЕНИЕ ---
+
+async def purge_track_code_events(older_than_days: int, batch_size: int = 10_000) -> int:
+    """
+    Удаляет одну пачку событий старше older_than_days дней (по индексу ts, самые старые первыми).
+    Короткие пачки не держат долгих блокировок; вызывающий повторяет, пока удалено batch_size.
+    """
+    threshold = datetime.now() - timedelta(days=older_than_days)
+    async with async_session() as session:
+        ids = (await session.execute(
+            select(TrackCodeEvent.id)
+            .where(TrackCodeEvent.ts < threshold)
+            .order_by(TrackCodeEvent.ts)
+            .limit(batch_size)
+        )).scalars().all()
+        if not ids:
+            return 0
+
+        for chunk in chunked(ids):
+            await session.execute(delete(TrackCodeEvent).where(TrackCodeEvent.id.in_(chunk)))
+        await session.commit()
+        return len(ids)
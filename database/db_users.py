@@ -1,9 +1,10 @@
 from logging import getLogger
+from typing import Dict, Iterable
 
 from sqlalchemy import select, update, BigInteger, VARCHAR
 from sqlalchemy.orm import Mapped, mapped_column
 
-from .db_base import async_session, Base, engine
+from .db_base import async_session, Base, engine, chunked
 
 logger = getLogger(__name__)
 
@@ -107,6 +108,34 @@ async def get_user_by_id(user_id: int):
         return user.to_dict() if user else None
 
 
+async def get_users_by_tg_ids(tg_ids: Iterable[int]) -> Dict[int, dict]:
+    """Возвращает словарь {Telegram ID: профиль} для списка Telegram ID одним запросом на пачку."""
+    unique_ids = list(set(tg_ids))
+    if not unique_ids:
+        return {}
+
+    users: Dict[int, dict] = {}
+    async with async_session() as session:
+        for chunk in chunked(unique_ids):
+            result = await session.execute(select(User).where(User.tg_id.in_(chunk)))
+            users.update({user.tg_id: user.to_dict() for user in result.scalars()})
+    return users
+
+
+async def get_tg_ids_by_internal_ids(user_ids: Iterable[int]) -> Dict[int, int]:
+    """Возвращает словарь {внутренний ID: Telegram ID} для списка ID одним запросом на пачку."""
+    unique_ids = list(set(user_ids))
+    if not unique_ids:
+        return {}
+
+    tg_ids: Dict[int, int] = {}
+    async with async_session() as session:
+        for chunk in chunked(unique_ids):
+            result = await session.execute(select(User.id, User.tg_id).where(User.id.in_(chunk)))
+            tg_ids.update({row.id: row.tg_id for row in result})
+    return tg_ids
+
+
 async def update_user_by_internal_id(internal_id: int, **kwargs) -> bool:
     """
     Обновляет данные пользователя по его внутреннему ID (primary key).
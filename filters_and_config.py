@@ -35,6 +35,69 @@ except ValueError as e:
     logger.critical(f"Ошибка загрузки конфигурации: {e}")
     raise
 
+# Необязательные параметры (со значениями по умолчанию)
+REPORT_GZIP_TEXT = getenv('REPORT_GZIP_TEXT', '0') == '1'
+CONTENT_CACHE_TTL = float(getenv('CONTENT_CACHE_TTL', '300'))
+FSM_STORAGE = getenv('FSM_STORAGE', 'memory').lower()
+FSM_REDIS_URL = getenv('FSM_REDIS_URL', 'redis://localhost:6379/0')
+FSM_STATE_TTL = int(getenv('FSM_STATE_TTL', str(7 * 24 * 3600)))
+
+# Режим запуска: polling (long polling) или webhook (aiohttp-сервер, можно ставить за балансировщик)
+BOT_RUN_MODE = getenv('BOT_RUN_MODE', 'polling').lower()
+MAX_CONCURRENT_UPDATES = int(getenv('MAX_CONCURRENT_UPDATES', '64'))
+WEBHOOK_URL = getenv('WEBHOOK_URL', '')
+WEBHOOK_PATH = getenv('WEBHOOK_PATH', '/webhook')
+WEBHOOK_SECRET = getenv('WEBHOOK_SECRET') or None
+WEBHOOK_HOST = getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(getenv('WEBHOOK_PORT', '8080'))
+WEBHOOK_DRAIN_TIMEOUT = float(getenv('WEBHOOK_DRAIN_TIMEOUT', '30'))
+
+# Горизонтальное масштабирование: 0 — один процесс, N > 0 — входной процесс раздаёт апдейты N воркерам
+BOT_WORKERS = int(getenv('BOT_WORKERS', '0'))
+WORKER_QUEUE_SIZE = int(getenv('WORKER_QUEUE_SIZE', '1000'))
+WORKER_HEARTBEAT_INTERVAL = float(getenv('WORKER_HEARTBEAT_INTERVAL', '5'))
+
+# Рассылки: число параллельных отправителей и как часто обновлять сообщение с прогрессом (секунды)
+BROADCAST_SENDERS = int(getenv('BROADCAST_SENDERS', '8'))
+BROADCAST_PROGRESS_INTERVAL = float(getenv('BROADCAST_PROGRESS_INTERVAL', '5'))
+
+# Бланк заказа: одновременных скачиваний фото и процессов для миниатюр
+ORDER_PHOTO_DOWNLOADS = int(getenv('ORDER_PHOTO_DOWNLOADS', '5'))
+THUMBNAIL_PROCESSES = int(getenv('THUMBNAIL_PROCESSES', '2'))
+THUMBNAIL_CACHE_DIR = getenv('THUMBNAIL_CACHE_DIR', 'thumbnail_cache')
+THUMBNAIL_CACHE_MAX_MB = float(getenv('THUMBNAIL_CACHE_MAX_MB', '100'))
+
+# Фоновая очередь задач: всего одновременно, по типам, как часто опрашивать БД и сколько дней хранить выполненные
+JOB_WORKERS = int(getenv('JOB_WORKERS', '4'))
+JOB_POLL_INTERVAL = float(getenv('JOB_POLL_INTERVAL', '2'))
+JOB_RETENTION_DAYS = int(getenv('JOB_RETENTION_DAYS', '7'))
+ORDER_FORM_JOBS = int(getenv('ORDER_FORM_JOBS', '3'))
+EXPORT_JOBS = int(getenv('EXPORT_JOBS', '1'))
+
+# Пул соединений с БД: постоянных соединений, сверх них при пиках, сколько ждать свободного (сек),
+# через сколько секунд переподключаться и с какого ожидания (сек) писать предупреждение
+DB_POOL_SIZE = int(getenv('DB_POOL_SIZE', '10'))
+DB_MAX_OVERFLOW = int(getenv('DB_MAX_OVERFLOW', '20'))
+DB_POOL_TIMEOUT = float(getenv('DB_POOL_TIMEOUT', '30'))
+DB_POOL_RECYCLE = int(getenv('DB_POOL_RECYCLE', '3600'))
+DB_POOL_WAIT_WARNING = float(getenv('DB_POOL_WAIT_WARNING', '0.5'))
+
+# Файлы админки: сколько МБ держать в памяти до сброса на диск и по сколько кодов писать в БД за раз
+UPLOAD_SPOOL_MAX_MB = float(getenv('UPLOAD_SPOOL_MAX_MB', '4'))
+UPLOAD_BATCH_SIZE = int(getenv('UPLOAD_BATCH_SIZE', '20000'))
+
+# История статусов трек-кодов (track_code_events): сколько дней хранить, 0 — хранить всегда
+TRACK_EVENTS_RETENTION_DAYS = int(getenv('TRACK_EVENTS_RETENTION_DAYS', '365'))
+
+# Сколько дней хранить недоставленные уведомления (failed / unreachable) в notification_outbox
+NOTIFICATION_RETENTION_DAYS = int(getenv('NOTIFICATION_RETENTION_DAYS', '30'))
+
+# Метрики Prometheus: локальный эндпоинт /metrics (0 — выключен). Воркеры слушают METRICS_PORT + 1 + номер
+METRICS_HOST = getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(getenv('METRICS_PORT', '0'))
+# SQL-профайлер (/sql_profile): сколько одинаковых запросов за апдейт считать N+1
+SQL_N1_THRESHOLD = int(getenv('SQL_N1_THRESHOLD', '5'))
+
 class IsAdmin(BaseFilter):
     """Фильтр для проверки администратора (совместимый вариант)."""
 
@@ -3,7 +3,7 @@ from aiogram.exceptions import TelegramBadRequest
 from aiogram.types import CallbackQuery, Message, InputMediaPhoto, InputMediaVideo
 from aiogram import F, Router
 
-from database.db_info_content import get_info_content
+from database.db_info_content import get_info_content, get_info_contents, get_content_bundle
 from database.db_users import get_info_profile, get_user_by_tg_id
 from keyboards.user_keyboards import main_keyboard, where_get_keyboard, reg_keyboard, create_samples_keyboard
 
@@ -62,8 +62,8 @@ async def handle_simple(callback: CallbackQuery):
 @get_info_router.message(F.text == "Бланк для Заказа")
 async def send_order_form(message: Message):
     """Отправляет бланк для заказа."""
-    blank_info_text = await get_info_content("blank_text")
-    order_form_doc = await get_info_content("order_form")
+    content = await get_content_bundle("order_form")
+    blank_info_text, order_form_doc = content["blank_text"], content["order_form"]
     if blank_info_text and order_form_doc:
         await message.answer(blank_info_text)
         await message.answer_document(document=order_form_doc, caption="Вот ваш бланк для заказа. Заполните его и отправьте нам!")
@@ -74,8 +74,8 @@ async def send_order_form(message: Message):
 @get_info_router.message(F.text == "Бланк Таможни")
 async def send_customs_form(message: Message):
     """Отправляет текст и файл-образец 'Бланка Таможни'."""
-    customs_text = await get_info_content("customs_form_text")
-    customs_doc = await get_info_content("customs_form_document")
+    content = await get_content_bundle("customs_form")
+    customs_text, customs_doc = content["customs_form_text"], content["customs_form_document"]
     if customs_text and customs_doc:
         await message.answer(customs_text)
         await message.answer_document(
@@ -98,8 +98,8 @@ async def send_track_number_info(message: Message):
 async def handle_track_info(callback: CallbackQuery):
     """Отправляет фото с информацией о трек-номерах для выбранного сайта."""
     key = callback.data.split("_")[-1]
-    photo1 = await get_info_content(f"track_code_{key}_photo1")
-    photo2 = await get_info_content(f"track_code_{key}_photo2")
+    content = await get_info_contents([f"track_code_{key}_photo1", f"track_code_{key}_photo2"])
+    photo1, photo2 = content[f"track_code_{key}_photo1"], content[f"track_code_{key}_photo2"]
     if photo1 and photo2:
         media = [InputMediaPhoto(media=photo1, caption=key),
                  InputMediaPhoto(media=photo2)]
@@ -111,8 +111,8 @@ async def handle_track_info(callback: CallbackQuery):
 @get_info_router.message(F.text == "Тарифы")
 async def send_tariffs(message: Message):
     """Отправляет информацию о тарифах."""
-    tariffs_text = await get_info_content("tariffs_text")
-    tariffs_document = await get_info_content("tariffs_document")
+    content = await get_content_bundle("tariffs")
+    tariffs_text, tariffs_document = content["tariffs_text"], content["tariffs_document"]
     if tariffs_text:
         await message.answer(tariffs_text)
     if tariffs_document:
@@ -138,12 +138,10 @@ async def send_insurance_info(callback: CallbackQuery):
 @get_info_router.message(F.text == "Проверка товаров")
 async def send_goods_check(message: Message):
     """Отправляет медиа и текст о проверке товаров."""
-    video1 = await get_info_content("goods_check_video1")
-    photo1 = await get_info_content("goods_check_photo1")
-    video2 = await get_info_content("goods_check_video2")
-    photo2 = await get_info_content("goods_check_photo2")
-    photo3 = await get_info_content("goods_check_photo3")
-    goods_check_text = await get_info_content("goods_check_text")
+    content = await get_content_bundle("goods_check")
+    video1, photo1 = content["goods_check_video1"], content["goods_check_photo1"]
+    video2, photo2 = content["goods_check_video2"], content["goods_check_photo2"]
+    photo3, goods_check_text = content["goods_check_photo3"], content["goods_check_text"]
     if all([video1, photo1, video2, photo2, photo3, goods_check_text]):
         media = [InputMediaVideo(media=video1),
                  InputMediaPhoto(media=photo1),
@@ -170,8 +168,8 @@ async def send_consolidation(message: Message):
         await message.answer("Профиль не найден.")
         return
 
-    consolidation_photo_id = await get_info_content("consolidation_photo")
-    consolidation_text = await get_info_content("consolidation_text")
+    content = await get_content_bundle("consolidation")
+    consolidation_photo_id, consolidation_text = content["consolidation_photo"], content["consolidation_text"]
 
     client_code = f"<code>FS{inf.get('id'):04d}</code>"
 
@@ -189,8 +187,8 @@ async def send_consolidation(message: Message):
 async def send_packing(callback: CallbackQuery):
     """Отправляет фото и текст об упаковке."""
     await callback.message.delete()
-    packing_photo_id = await get_info_content("packing_photo")
-    packing_text = await get_info_content("packing_text")
+    content = await get_content_bundle("packing")
+    packing_photo_id, packing_text = content["packing_photo"], content["packing_text"]
     if packing_photo_id and packing_text:
         await callback.message.answer_photo(packing_photo_id, packing_text)
     else:
@@ -210,8 +208,8 @@ async def send_forbidden_goods(message: Message):
 @get_info_router.message(F.text == "️Цены")
 async def send_prices(message: Message):
     """Отправляет информацию о ценах."""
-    prices_document = await get_info_content("prices_document")
-    prices_text = await get_info_content("prices_text")
+    content = await get_content_bundle("prices")
+    prices_document, prices_text = content["prices_document"], content["prices_text"]
     if prices_document and prices_text:
         await message.answer_document(document=prices_document, caption=prices_text)
         await message.answer_photo(prices_document, prices_text)
@@ -36,10 +36,18 @@ no_btn = create_inline_button(text="❌ Нет", callback_data="danger_cancel")
 confirm_keyboard = create_inline_keyboard([[yes_btn, no_btn]])
 
 
-def get_broadcast_confirm_keyboard() -> InlineKeyboardMarkup:
+def get_broadcast_confirm_keyboard(segments: dict = None, selected: str = None) -> InlineKeyboardMarkup:
+    """Подтверждение рассылки; segments — {ключ: подпись} для выбора аудитории (None — все)."""
+    rows = []
+    for key, title in (segments or {}).items():
+        mark = "✅ " if key == selected else ""
+        rows.append([create_inline_button(
+            text=f"{mark}{title.capitalize()}", callback_data=f"broadcast_segment:{key or 'all'}"
+        )])
+
     send_btn = create_inline_button(text="📤 Отправить", callback_data="broadcast_send")
     cancel_btn = create_inline_button(text="❌ Отменить", callback_data="broadcast_cancel")
-    return create_inline_keyboard([[send_btn], [cancel_btn]])
+    return create_inline_keyboard(rows + [[send_btn], [cancel_btn]])
 
 
 def get_admin_edit_user_keyboard(
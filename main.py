@@ -9,45 +9,116 @@ from text_info import text
 from request import request_router
 from profile import profile_router
 from commands import commands_router
-from database.db_base import setup_database
+from database.db_base import setup_database, engine
+from database.db_pool import instrument_pool
+from database.db_info_content import preload_info_content
 from admin.admin_panel import admin_router
 from track_numbers import track_code_router
 from get_information import get_info_router
 from registration_process import states_router
 from order_maker.create_order import order_router
+from order_maker.order_photos import shutdown_thumbnail_pool
 from order_maker.user_collector import user_data_router
 from calculator.calc_volume import calc_volume_router
 from track_codes_search import track_code_search_router
 from calculator.calculate_insurance import calc_ins_router
 from calculator.calculate_shipping import calc_shipping_router
 from middlewares.middleware import ExceptionHandlingMiddleware
-from filters_and_config import TELEGRAM_BOT_TOKEN
+from middlewares.metrics import setup_metrics_middlewares
+from filters_and_config import (
+    TELEGRAM_BOT_TOKEN, BOT_RUN_MODE, MAX_CONCURRENT_UPDATES, BOT_WORKERS, METRICS_HOST, METRICS_PORT
+)
+from utils.fsm_storage import create_fsm_storage
+from utils.notification_dispatcher import notification_dispatcher
+from utils.broadcast_engine import broadcast_engine
+from utils.job_queue import job_queue
+from utils.track_event_retention import track_event_retention
+from utils.metrics import instrument_engine, metrics_server
+from utils.sql_profiler import install_sql_profiler
+from utils.webhook_server import run_webhook
+from utils.workers import run_ingress, run_worker_loop
 
 bot = Bot(
     token=TELEGRAM_BOT_TOKEN,
     default=DefaultBotProperties(parse_mode='HTML')
 )
-dp = Dispatcher()
+dp = Dispatcher(storage=create_fsm_storage())
 dp.include_routers(
     commands_router, admin_router, get_info_router, states_router, profile_router, text, track_code_router,
     track_code_search_router, user_data_router, order_router, request_router, calc_volume_router, calc_ins_router,
     calc_shipping_router
 )
 dp.update.outer_middleware(ExceptionHandlingMiddleware())
+setup_metrics_middlewares(dp, bot)
+instrument_engine(engine)
+instrument_pool(engine)
+install_sql_profiler(engine)
 
 basicConfig(level=WARNING, stream=stdout)
 logger = getLogger(__name__)
 
 
+async def on_startup(bot: Bot, role: str = "single", worker_index: int = 0):
+    """
+    Запускает фоновые подсистемы бота.
+    role: single — один процесс; ingress — входной процесс (только раздаёт апдейты); worker — воркер.
+    Эндпоинт метрик есть у каждого процесса: у воркера свой порт.
+    Диспетчер уведомлений, продолжение рассылок, очередь задач и очистка истории статусов работают
+    в одном экземпляре (не в воркерах), кэш контента нужен тем, кто обрабатывает апдейты.
+    """
+    if METRICS_PORT:
+        port = METRICS_PORT + 1 + worker_index if role == "worker" else METRICS_PORT
+        await metrics_server.start(METRICS_HOST, port)
+    if role != "ingress":
+        await preload_info_content()
+    if role != "worker":
+        await notification_dispatcher.start(bot)
+        await broadcast_engine.start(bot)
+        await job_queue.start(bot)
+        track_event_retention.start()
+
+
+async def on_shutdown():
+    """Останавливает фоновые подсистемы бота."""
+    await track_event_retention.stop()
+    await job_queue.stop()
+    await broadcast_engine.stop()
+    await notification_dispatcher.stop()
+    shutdown_thumbnail_pool()
+    await metrics_server.stop()
+
+
+dp.startup.register(on_startup)
+dp.shutdown.register(on_shutdown)
+
+
+def run_worker(index: int, queue, shared):
+    """Точка входа процесса-воркера (BOT_WORKERS > 0)."""
+    run(run_worker_loop(dp, bot, index, queue, shared))
+
+
 async def main():
-    """Основная функция для запуска Telegram-бота с использованием long polling."""
+    """Основная функция для запуска Telegram-бота: long polling или webhook (BOT_RUN_MODE)."""
     await setup_database()
     logger.info('База данных инициализирована')
 
-    await dp.start_polling(bot)
+    if BOT_WORKERS > 0:
+        await run_ingress(dp, bot, run_worker)
+        return
+
+    if BOT_RUN_MODE == "webhook":
+        await run_webhook(dp, bot)
+        return
+
+    if BOT_RUN_MODE != "polling":
+        logger.warning("Неизвестный BOT_RUN_MODE=%s, используется polling.", BOT_RUN_MODE)
+
+    # Polling не работает при установленном вебхуке (например, после запуска в режиме webhook)
+    await bot.delete_webhook()
+    await dp.start_polling(bot, tasks_concurrency_limit=MAX_CONCURRENT_UPDATES)
 
 if __name__ == "__main__":
     run(main())
 
 
-# В будущем нужно добавить возможность добавить имя трек-коду, даты поступления на склад, отправки из склада и поступлению в пункт выдачи
+# В будущем нужно добавить возможность добавить имя трек-коду (даты статусов — в track_code_events)
@@ -0,0 +1,129 @@
+from logging import getLogger
+from time import perf_counter
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.dispatcher.event.handler import HandlerObject
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import Response, TelegramType
+from aiogram.types import TelegramObject, Update
+
+from utils.metrics import metrics, current_update_stats, UpdateStats
+from utils.sql_profiler import sql_profiler
+
+logger = getLogger(__name__)
+
+
+def handler_name(handler: HandlerObject) -> str:
+    """Имя хендлера для меток: модуль.функция."""
+    callback = handler.callback
+    module = getattr(callback, "__module__", None) or "?"
+    name = getattr(callback, "__qualname__", None) or type(callback).__name__
+    return f"{module}.{name}"
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """
+    Внешний middleware апдейта: общее время обработки, а также число и время запросов
+    к БД и Bot API, сделанных за этот апдейт (их считают события движка и middleware сессии).
+    """
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: Update,
+            data: Dict[str, Any],
+    ) -> Any:
+        stats = UpdateStats()
+        token = current_update_stats.set(stats)
+        started = perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            elapsed = perf_counter() - started
+            current_update_stats.reset(token)
+
+            event_type = event.event_type if isinstance(event, Update) else type(event).__name__
+            metrics.observe("bot_update_seconds", elapsed, event_type=event_type)
+            metrics.observe("bot_update_db_queries", stats.db_queries)
+            metrics.observe("bot_update_db_seconds", stats.db_seconds)
+            metrics.observe("bot_update_api_seconds", stats.api_seconds)
+
+
+class SQLProfilingMiddleware(BaseMiddleware):
+    """Группирует SQL-запросы апдейта для поиска N+1, пока профайлер включён (/sql_profile on)."""
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: Update,
+            data: Dict[str, Any],
+    ) -> Any:
+        if not sql_profiler.enabled:
+            return await handler(event, data)
+
+        label = event.event_type if isinstance(event, Update) else type(event).__name__
+        with sql_profiler.track(label):
+            return await handler(event, data)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Внутренний middleware: время и ошибки каждого хендлера (модуль.функция)."""
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any],
+    ) -> Any:
+        handler_object = data.get("handler")
+        name = handler_name(handler_object) if handler_object else "unknown"
+        sql_profiler.label_current(name)
+        started = perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            metrics.inc("bot_handler_errors_total", handler=name)
+            raise
+        finally:
+            metrics.observe("bot_handler_seconds", perf_counter() - started, handler=name)
+
+
+class BotApiMetricsMiddleware(BaseRequestMiddleware):
+    """Middleware сессии бота: время каждого запроса к Bot API по методам."""
+
+    async def __call__(
+            self,
+            make_request: NextRequestMiddlewareType[TelegramType],
+            bot: Bot,
+            method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        name = type(method).__name__
+        started = perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception:
+            metrics.inc("bot_api_errors_total", method=name)
+            raise
+        finally:
+            elapsed = perf_counter() - started
+            metrics.observe("bot_api_request_seconds", elapsed, method=name)
+
+            stats = current_update_stats.get()
+            if stats is not None:
+                stats.api_calls += 1
+                stats.api_seconds += elapsed
+
+
+def setup_metrics_middlewares(dp: Dispatcher, bot: Bot) -> None:
+    """
+    Подключает сбор метрик. Внутренние middleware, зарегистрированные на диспетчере,
+    действуют на хендлеры всех вложенных роутеров.
+    """
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    dp.update.outer_middleware(SQLProfilingMiddleware())
+    for event_name, observer in dp.observers.items():
+        if event_name not in ("update", "error"):
+            observer.middleware(HandlerMetricsMiddleware())
+    bot.session.middleware(BotApiMetricsMiddleware())
@@ -1,21 +1,22 @@
-from asyncio import get_running_loop, sleep, TimeoutError
-from os import path, makedirs
-from shutil import rmtree
+from asyncio import TimeoutError
+from io import BytesIO
 from logging import getLogger
 from typing import List, Dict
-from uuid import uuid4
 
 from aiogram import Router, F, Bot
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
-from aiogram.types import Message, CallbackQuery, FSInputFile, ReplyKeyboardRemove
+from aiogram.types import Message, CallbackQuery, BufferedInputFile, ReplyKeyboardRemove
 
 from openpyxl import Workbook
 from openpyxl.drawing.image import Image as ExcelImage
 from openpyxl.styles import Alignment, Font, Border, Side
-from PIL import Image as PilImage
 
+from filters_and_config import ORDER_FORM_JOBS
 from keyboards.user_keyboards import main_keyboard, get_order_keyboard
+from utils.job_queue import job_queue, JobPriority
+from utils.progress import ThrottledProgress
+from .order_photos import prepare_order_thumbnails
 from .order_cancel_flow import (
     ask_order_cancel_confirmation,
     confirm_order_cancel,
@@ -25,8 +26,6 @@ from .order_cancel_flow import (
 order_router = Router()
 logger = getLogger(__name__)
 
-TEMP_FOLDER = "temp_orders"
-IMAGE_SIZE = (120, 120)
 CANCEL_TEXTS = {"/cancel", "/Cancel", "отмена", "Отмена", "ОТМЕНА"}
 
 
@@ -40,15 +39,14 @@ class OrderItemsStates(StatesGroup):
 
 
 def generate_excel_sync(
-    filename: str,
     form_title: str,
     client_data: Dict,
     items: List[Dict],
-    temp_paths: List[str]
-) -> None:
+    thumbnails: Dict[int, bytes]
+) -> bytes:
+    """Формирует Excel бланка в памяти. thumbnails — {номер товара: JPEG-байты миниатюры}."""
     logger.info(
-        "Начато формирование Excel. file=%s form_title=%s client_id=%s items_count=%s",
-        filename,
+        "Начато формирование Excel. form_title=%s client_id=%s items_count=%s",
         form_title,
         client_data.get("id"),
         len(items)
@@ -89,25 +87,13 @@ def generate_excel_sync(
         row = start_row + i
         ws.cell(row=row, column=1, value=i).alignment = Alignment(horizontal="center", vertical="center")
 
-        photo_path = item.get("local_path")
+        thumbnail = thumbnails.get(i)
 
-        if photo_path and path.exists(photo_path):
-            try:
-                resized_path = photo_path.replace("raw_", "res_")
-
-                with PilImage.open(photo_path) as img:
-                    img.thumbnail(IMAGE_SIZE)
-                    img.save(resized_path)
-
-                temp_paths.append(resized_path)
-
-                img_obj = ExcelImage(resized_path)
-                ws.add_image(img_obj, f"B{row}")
-                ws.row_dimensions[row].height = 90
-
-            except Exception as e:
-                logger.error("Ошибка обработки изображения для Excel: %s", e, exc_info=True)
-                ws.cell(row=row, column=2, value="Error")
+        if thumbnail:
+            ws.add_image(ExcelImage(BytesIO(thumbnail)), f"B{row}")
+            ws.row_dimensions[row].height = 90
+        elif item.get("photo_id"):
+            ws.cell(row=row, column=2, value="Error")
         else:
             ws.cell(row=row, column=2, value="Нет фото")
 
@@ -124,34 +110,10 @@ def generate_excel_sync(
             wrap_text=True
         )
 
-    wb.save(filename)
-    logger.info("Excel успешно сформирован: %s", filename)
-
-
-async def safe_download(bot: Bot, file_path: str, destination: str, retries: int = 3) -> None:
-    for attempt in range(1, retries + 1):
-        try:
-            logger.info(
-                "Попытка скачивания файла. file_path=%s destination=%s attempt=%s/%s",
-                file_path,
-                destination,
-                attempt,
-                retries
-            )
-            await bot.download_file(file_path, destination=destination)
-            logger.info("Файл успешно скачан: %s", destination)
-            return
-        except TimeoutError:
-            logger.warning(
-                "Timeout при скачивании файла. file_path=%s destination=%s attempt=%s/%s",
-                file_path,
-                destination,
-                attempt,
-                retries
-            )
-            if attempt == retries:
-                raise
-            await sleep(2)
+    buffer = BytesIO()
+    wb.save(buffer)
+    logger.info("Excel успешно сформирован. client_id=%s size=%s", client_data.get("id"), buffer.tell())
+    return buffer.getvalue()
 
 
 async def start_item_collection(message: Message, state: FSMContext):
@@ -219,7 +181,10 @@ async def process_photo(message: Message, state: FSMContext):
         await message.answer("Пожалуйста, отправьте <b>сжатое фото</b>, а не файл.")
         return
 
-    await state.update_data(current_photo=message.photo[-1].file_id)
+    await state.update_data(
+        current_photo=message.photo[-1].file_id,
+        current_photo_unique=message.photo[-1].file_unique_id
+    )
 
     logger.info(
         "Получено фото товара. tg_id=%s file_id=%s",
@@ -268,7 +233,8 @@ async def process_link(message: Message, state: FSMContext):
         "photo_id": data.get("current_photo"),
         "quantity": data.get("current_quantity"),
         "track": data.get("current_track"),
-        "link": message.text
+        "link": message.text,
+        "photo_unique_id": data.get("current_photo_unique")
     }
 
     items.append(new_item)
@@ -319,8 +285,54 @@ async def add_next_item(callback: CallbackQuery, state: FSMContext):
     await state.set_state(OrderItemsStates.waiting_for_photo)
 
 
+@job_queue.register(
+    "order_form",
+    JobPriority.INTERACTIVE,
+    concurrency=ORDER_FORM_JOBS,
+    failure_text="Произошла ошибка при создании файла."
+)
+async def build_order_form(bot: Bot, chat_id: int, payload: Dict):
+    """Фоновая задача: скачивает фото, формирует Excel бланка и отправляет его в чат."""
+    items = payload["items"]
+    client_data = payload["client"]
+    progress = ThrottledProgress(bot, chat_id, payload["progress_message_id"])
+
+    async def report_download(done: int, total: int):
+        await progress.update(f"⏳ Скачиваю фото {done}/{total}", force=done == total)
+
+    try:
+        thumbnails = await prepare_order_thumbnails(bot, items, on_progress=report_download)
+    except TimeoutError:
+        logger.error("Timeout при скачивании файлов заказа. chat_id=%s", chat_id, exc_info=True)
+        await bot.send_message(chat_id, "⚠️ Telegram долго отвечает. Попробуйте снова.")
+        return
+
+    await progress.update("⏳ Формирую Excel файл...", force=True)
+
+    excel_bytes = await job_queue.run_blocking(
+        generate_excel_sync,
+        payload["form_title"],
+        client_data,
+        items,
+        thumbnails
+    )
+
+    display_name = f"{payload['form_title']}_{client_data['id']}.xlsx"
+    logger.info("Отправка Excel пользователю. chat_id=%s file=%s", chat_id, display_name)
+
+    await bot.send_document(
+        chat_id,
+        BufferedInputFile(excel_bytes, filename=display_name),
+        caption=f"✅ <b>Готово!</b>\nКлиент: {client_data['id']}\nПозиций: {len(items)}",
+        reply_markup=main_keyboard
+    )
+
+    logger.info("Excel успешно отправлен пользователю. chat_id=%s", chat_id)
+
+
 @order_router.callback_query(OrderItemsStates.confirm_next_step, F.data == "order_finish")
-async def finish_order(callback: CallbackQuery, state: FSMContext, bot: Bot):
+async def finish_order(callback: CallbackQuery, state: FSMContext):
+    """Ставит формирование бланка в фоновую очередь и сразу освобождает FSM пользователя."""
     try:
         await callback.answer()
     except Exception:
@@ -341,120 +353,30 @@ async def finish_order(callback: CallbackQuery, state: FSMContext, bot: Bot):
         await state.clear()
         return
 
-    await callback.message.edit_text("⏳ Подготавливаю файлы...")
+    await callback.message.edit_text("⏳ Бланк принят, подготавливаю файлы...")
 
     client_id_str = data.get("client_excel_id", str(callback.from_user.id))
-    order_uid = uuid4().hex[:8]
-    order_temp_dir = path.join(TEMP_FOLDER, f"{client_id_str}_{order_uid}")
-
-    makedirs(order_temp_dir, exist_ok=True)
-
-    logger.info(
-        "Создана временная папка заказа. tg_id=%s order_temp_dir=%s",
-        callback.from_user.id,
-        order_temp_dir
-    )
-
-    excel_name = path.join(order_temp_dir, f"order_{client_id_str}.xlsx")
-    temp_files_to_clean = []
-
-    try:
-        for idx, item in enumerate(items, 1):
-            if not item.get("photo_id"):
-                logger.info(
-                    "У товара нет photo_id, скачивание пропущено. tg_id=%s item_num=%s",
-                    callback.from_user.id,
-                    idx
-                )
-                continue
-
-            await callback.message.edit_text(f"⏳ Скачиваю фото {idx}/{len(items)}")
-
-            file_path = path.join(order_temp_dir, f"raw_{idx}.jpg")
-            temp_files_to_clean.append(file_path)
-            item["local_path"] = file_path
-
-            logger.info(
-                "Запрошена информация о файле Telegram. tg_id=%s item_num=%s",
-                callback.from_user.id,
-                idx
-            )
-
-            file_info = await bot.get_file(item["photo_id"])
-
-            await safe_download(
-                bot=bot,
-                file_path=file_info.file_path,
-                destination=file_path
-            )
-
-        loop = get_running_loop()
-
-        client_data = {
+    payload = {
+        "form_title": data.get("form_title", "Заказ"),
+        "client": {
             "id": client_id_str,
             "name": data.get("client_name", "Unknown"),
             "email": data.get("client_email", "-")
-        }
-
-        await callback.message.edit_text("⏳ Формирую Excel файл...")
-
-        await loop.run_in_executor(
-            None,
-            generate_excel_sync,
-            excel_name,
-            data.get("form_title", "Заказ"),
-            client_data,
-            items,
-            temp_files_to_clean
-        )
-
-        display_name = f"{data.get('form_title', 'Order')}_{client_id_str}.xlsx"
-        file_doc = FSInputFile(excel_name, filename=display_name)
-
-        logger.info(
-            "Отправка Excel пользователю. tg_id=%s file=%s",
-            callback.from_user.id,
-            excel_name
-        )
-
-        await callback.message.answer_document(
-            file_doc,
-            caption=f"✅ <b>Готово!</b>\nКлиент: {client_id_str}\nПозиций: {len(items)}",
-            reply_markup=main_keyboard
-        )
-
-        logger.info("Excel успешно отправлен пользователю. tg_id=%s", callback.from_user.id)
-
-    except TimeoutError:
-        logger.error(
-            "Timeout при скачивании файлов заказа. tg_id=%s",
-            callback.from_user.id,
-            exc_info=True
-        )
-        await callback.message.answer("⚠️ Telegram долго отвечает. Попробуйте снова.")
+        },
+        "items": items,
+        "progress_message_id": callback.message.message_id
+    }
 
+    try:
+        await job_queue.enqueue("order_form", callback.message.chat.id, payload)
     except Exception as e:
         logger.error(
-            "Ошибка создания заказа. tg_id=%s error=%s",
+            "Ошибка постановки бланка в очередь. tg_id=%s error=%s",
             callback.from_user.id,
             e,
             exc_info=True
         )
         await callback.message.answer("Произошла ошибка при создании файла.")
-
     finally:
-        await sleep(1)
-
-        try:
-            if path.exists(order_temp_dir):
-                rmtree(order_temp_dir)
-                logger.info(
-                    "Временная папка заказа удалена. tg_id=%s order_temp_dir=%s",
-                    callback.from_user.id,
-                    order_temp_dir
-                )
-        except Exception as e:
-            logger.error("Ошибка очистки временной папки: %s", e, exc_info=True)
-
         await state.clear()
-        logger.info("FSM состояния заказа очищены. tg_id=%s", callback.from_user.id)
\ No newline at end of file
+        logger.info("FSM состояния заказа очищены. tg_id=%s", callback.from_user.id)
@@ -0,0 +1,130 @@
+from asyncio import Semaphore, TimeoutError, create_task, gather, get_running_loop, sleep
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from io import BytesIO
+from logging import getLogger
+from random import uniform
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramNetworkError, TelegramServerError
+from PIL import Image as PilImage
+
+from filters_and_config import ORDER_PHOTO_DOWNLOADS, THUMBNAIL_PROCESSES
+from .thumbnail_cache import thumbnail_cache
+
+logger = getLogger(__name__)
+
+IMAGE_SIZE = (120, 120)
+DOWNLOAD_RETRIES = 3
+# Ошибки, после которых скачивание имеет смысл повторить
+RETRYABLE_ERRORS = (TimeoutError, TelegramNetworkError, TelegramServerError)
+
+_thumbnail_pool: Optional[ProcessPoolExecutor] = None
+
+
+def make_thumbnail(photo: bytes, size=IMAGE_SIZE) -> bytes:
+    """Уменьшает фото до миниатюры для Excel и возвращает JPEG-байты (выполняется в пуле процессов)."""
+    with PilImage.open(BytesIO(photo)) as img:
+        img.thumbnail(size)
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        buffer = BytesIO()
+        img.save(buffer, format="JPEG", quality=85)
+        return buffer.getvalue()
+
+
+def get_thumbnail_pool() -> ProcessPoolExecutor:
+    """Общий пул процессов для миниатюр: PIL не держит event loop и не делит GIL с хендлерами."""
+    global _thumbnail_pool
+    if _thumbnail_pool is None:
+        # spawn, а не fork: форк процесса с работающим циклом событий и потоками может зависнуть
+        _thumbnail_pool = ProcessPoolExecutor(max_workers=THUMBNAIL_PROCESSES, mp_context=get_context("spawn"))
+    return _thumbnail_pool
+
+
+def shutdown_thumbnail_pool() -> None:
+    global _thumbnail_pool
+    if _thumbnail_pool is not None:
+        _thumbnail_pool.shutdown(wait=False, cancel_futures=True)
+        _thumbnail_pool = None
+
+
+async def download_photo(bot: Bot, file_id: str, retries: int = DOWNLOAD_RETRIES) -> bytes:
+    """Скачивает фото по file_id в память. Сетевые ошибки повторяются с экспоненциальной паузой и джиттером."""
+    for attempt in range(1, retries + 1):
+        try:
+            file_info = await bot.get_file(file_id)
+            buffer = BytesIO()
+            await bot.download_file(file_info.file_path, destination=buffer)
+            return buffer.getvalue()
+        except RETRYABLE_ERRORS as e:
+            if attempt == retries:
+                raise
+            delay = 2 ** (attempt - 1) + uniform(0, 1)
+            logger.warning(
+                "Ошибка скачивания фото (%s). file_id=%s attempt=%s/%s, повтор через %.1f сек.",
+                type(e).__name__, file_id, attempt, retries, delay
+            )
+            await sleep(delay)
+
+
+async def prepare_order_thumbnails(
+    bot: Bot,
+    items: List[Dict],
+    on_progress: Callable[[int, int], Awaitable[None]],
+) -> Dict[int, bytes]:
+    """
+    Скачивает фото товаров параллельно (не больше ORDER_PHOTO_DOWNLOADS одновременно)
+    и по мере готовности отдаёт их в пул процессов на миниатюры. Фото, чья миниатюра уже
+    есть в кэше (по photo_unique_id), не скачиваются и не обрабатываются повторно.
+
+    Возвращает {номер товара (с 1): JPEG-байты миниатюры}. Товары без фото пропускаются;
+    если фото не удалось обработать, товара нет в результате (в Excel будет "Error").
+    """
+    loop = get_running_loop()
+    downloads = Semaphore(ORDER_PHOTO_DOWNLOADS)
+    pool = get_thumbnail_pool()
+
+    # Одно и то же фото в бланке обрабатывается один раз: {ключ фото: (photo_id, unique_id, [номера товаров])}
+    photos: Dict[str, Tuple[str, Optional[str], List[int]]] = {}
+    for idx, item in enumerate(items, 1):
+        if item.get("photo_id"):
+            key = item.get("photo_unique_id") or item["photo_id"]
+            photos.setdefault(key, (item["photo_id"], item.get("photo_unique_id"), []))[2].append(idx)
+
+    total = sum(len(indexes) for _, _, indexes in photos.values())
+    thumbnails: Dict[int, bytes] = {}
+    done = 0
+
+    async def process(photo_id: str, unique_id: Optional[str], indexes: List[int]) -> None:
+        nonlocal done
+
+        thumbnail = await thumbnail_cache.get(unique_id)
+        if thumbnail is None:
+            try:
+                async with downloads:
+                    photo = await download_photo(bot, photo_id)
+                thumbnail = await loop.run_in_executor(pool, make_thumbnail, photo)
+                await thumbnail_cache.put(unique_id, thumbnail)
+            except Exception as e:
+                # Фото не скачалось (например, устарел file_id) или не обработалось — остальные не трогаем
+                logger.error("Ошибка обработки изображения товаров %s: %s", indexes, e, exc_info=True)
+
+        if thumbnail is not None:
+            thumbnails.update(dict.fromkeys(indexes, thumbnail))
+
+        done += len(indexes)
+        await on_progress(done, total)
+
+    tasks = [create_task(process(*entry)) for entry in photos.values()]
+    try:
+        await gather(*tasks)
+    except BaseException:
+        # Бланк отменён — незаконченные загрузки не нужны
+        for task in tasks:
+            task.cancel()
+        await gather(*tasks, return_exceptions=True)
+        raise
+
+    return thumbnails
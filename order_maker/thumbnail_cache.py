@@ -0,0 +1,151 @@
+from asyncio import Lock, to_thread
+from collections import OrderedDict
+from logging import getLogger
+from os import makedirs, path, remove, replace, scandir, utime
+from re import compile as re_compile
+from typing import Dict, Optional
+
+from filters_and_config import THUMBNAIL_CACHE_DIR, THUMBNAIL_CACHE_MAX_MB
+
+logger = getLogger(__name__)
+
+# file_unique_id состоит из base64url-символов; всё остальное в имя файла не пускаем
+_UNIQUE_ID_RE = re_compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+class ThumbnailCache:
+    """
+    Кэш JPEG-миниатюр на диске с ключом file_unique_id фото (одинаков для одного и того же
+    файла у всех пользователей и ботов). Индекс {ключ: размер} в памяти хранит порядок LRU;
+    при превышении max_bytes удаляются давно не использованные файлы.
+
+    Индекс у каждого процесса свой и строится по содержимому каталога при первом обращении.
+    Файл, удалённый другим процессом, считается промахом.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._size = 0
+        self._loaded = False
+        self._lock = Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _path(self, unique_id: str) -> str:
+        return path.join(self.directory, f"{unique_id}.jpg")
+
+    def _load_index(self) -> None:
+        """Строит индекс по каталогу: самые старые по mtime — первые кандидаты на удаление."""
+        makedirs(self.directory, exist_ok=True)
+        entries = []
+        with scandir(self.directory) as it:
+            for entry in it:
+                name, ext = path.splitext(entry.name)
+                if ext == ".jpg" and entry.is_file():
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, name, stat.st_size))
+
+        for _, name, size in sorted(entries):
+            self._index[name] = size
+            self._size += size
+
+        self._loaded = True
+        logger.info("Кэш миниатюр: %s файлов, %.1f МБ", len(self._index), self._size / 2 ** 20)
+
+    def _forget(self, unique_id: str) -> None:
+        self._size -= self._index.pop(unique_id, 0)
+
+    def _read(self, unique_id: str) -> Optional[bytes]:
+        file_path = self._path(unique_id)
+        try:
+            with open(file_path, "rb") as f:
+                data = f.read()
+            # mtime — порядок LRU для индекса после перезапуска
+            utime(file_path)
+            return data
+        except FileNotFoundError:
+            return None
+
+    def _write(self, unique_id: str, data: bytes) -> None:
+        file_path = self._path(unique_id)
+        tmp_path = f"{file_path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        replace(tmp_path, file_path)
+
+    def _evict(self) -> None:
+        while self._size > self.max_bytes and self._index:
+            unique_id, size = self._index.popitem(last=False)
+            self._size -= size
+            self.evictions += 1
+            try:
+                remove(self._path(unique_id))
+            except FileNotFoundError:
+                pass
+
+    async def get(self, unique_id: Optional[str]) -> Optional[bytes]:
+        """Миниатюра из кэша или None."""
+        if not self.enabled or not unique_id or not _UNIQUE_ID_RE.match(unique_id):
+            return None
+
+        async with self._lock:
+            if not self._loaded:
+                await to_thread(self._load_index)
+            cached = unique_id in self._index
+
+        data = await to_thread(self._read, unique_id) if cached else None
+
+        async with self._lock:
+            if data is None:
+                self.misses += 1
+                if cached:
+                    self._forget(unique_id)
+                return None
+
+            self.hits += 1
+            if unique_id in self._index:
+                self._index.move_to_end(unique_id)
+            return data
+
+    async def put(self, unique_id: Optional[str], data: bytes) -> None:
+        """Сохраняет миниатюру. Ошибки диска не мешают оформлению бланка."""
+        if not self.enabled or not unique_id or not _UNIQUE_ID_RE.match(unique_id):
+            return
+
+        try:
+            async with self._lock:
+                if not self._loaded:
+                    await to_thread(self._load_index)
+
+            await to_thread(self._write, unique_id, data)
+
+            async with self._lock:
+                self._forget(unique_id)
+                self._index[unique_id] = len(data)
+                self._size += len(data)
+                if self._size > self.max_bytes:
+                    await to_thread(self._evict)
+        except OSError as e:
+            logger.warning("Не удалось сохранить миниатюру %s в кэш: %s", unique_id, e)
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "keys": len(self._index),
+            "size_mb": self._size / 2 ** 20,
+            "max_mb": self.max_bytes / 2 ** 20,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+
+thumbnail_cache = ThumbnailCache(THUMBNAIL_CACHE_DIR, int(THUMBNAIL_CACHE_MAX_MB * 2 ** 20))
@@ -5,8 +5,11 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import CallbackQuery, Message
 
+from database.db_track_codes import get_track_codes_info
 from filters_and_config import admin_ids
 from keyboards.user_keyboards import get_main_inline_keyboard
+from track_codes_search import STATUS_MESSAGES
+from utils.track_code_tokenizer import extract_track_codes
 
 request_router = Router()
 logger = getLogger(__name__)
@@ -31,7 +34,7 @@ async def receive_track_codes(message: Message, state: FSMContext, bot: Bot):
         await message.answer("Пожалуйста, введите значение текстом.")
         return
 
-    track_code_list = message.text.strip().split()  # Получаем список трек-кодов
+    track_code_list = extract_track_codes(message.text)
 
     if not track_code_list:
         await message.answer("Вы не указали ни одного трек-кода. Пожалуйста, попробуйте снова.")
@@ -40,10 +43,21 @@ async def receive_track_codes(message: Message, state: FSMContext, bot: Bot):
     user_id = message.from_user.id
     username = message.from_user.username or "Без имени"
 
+    # Сразу подтягиваем статусы и владельцев, чтобы админу не искать каждый код вручную
+    codes_info = await get_track_codes_info(track_code_list)
+    code_lines = []
+    for code, info in codes_info.items():
+        if not info:
+            code_lines.append(f"{code} — нет в базе")
+            continue
+        status_text = STATUS_MESSAGES.get(info["status"], info["status"])
+        owner = "" if info["tg_id"] in (None, user_id) else " (привязан к другому пользователю)"
+        code_lines.append(f"{code} — {status_text}{owner}")
+
     admin_notification = (
         f"Пользователь <b>{username}</b> (ID: <code>{user_id}</code>) "
         "оставил заявку на проверку своих товаров.\n\n"
-        f"Трек-коды:\n{chr(10).join(track_code_list)}"
+        f"Трек-коды:\n{chr(10).join(code_lines)}"
     )
 
     try:
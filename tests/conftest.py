@@ -0,0 +1,31 @@
+"""
+Общая настройка тестов: конфигурация бота задаётся до импорта модулей проекта
+(filters_and_config читает окружение при импорте), БД — временный файл SQLite.
+"""
+from os import environ
+from pathlib import Path
+from sys import path
+from tempfile import mkdtemp
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in path:
+    path.insert(0, str(ROOT))
+
+_DB_DIR = Path(mkdtemp(prefix="cargo-bot-tests-"))
+environ["BOT_TOKEN"] = "123456:TEST"
+environ["ADMIN_IDS"] = "1"
+environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_DB_DIR / 'bot.db'}"
+environ["METRICS_PORT"] = "0"
+
+import pytest
+
+
+@pytest.fixture(scope="session")
+async def database():
+    """Создаёт таблицы всех моделей во временной БД (один раз на прогон)."""
+    from database import db_broadcasts, db_fsm, db_info_content, db_jobs, db_notifications, db_track_events  # noqa: F401
+    from database.db_base import engine, setup_database
+
+    await setup_database()
+    yield engine
+    await engine.dispose()
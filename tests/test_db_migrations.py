@@ -0,0 +1,77 @@
+from sqlalchemy import inspect, select, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from database import db_broadcasts, db_track_codes  # noqa: F401  (модели в Base.metadata)
+from database.db_base import Base
+from database.db_migrations import MIGRATIONS, apply_migrations, schema_migrations
+
+# Схема до миграций 0001-0002: таблицы, созданные старыми версиями бота
+OLD_SCHEMA = (
+    """CREATE TABLE broadcast_jobs (
+        id INTEGER PRIMARY KEY, admin_chat_id BIGINT NOT NULL, progress_message_id INTEGER,
+        text TEXT NOT NULL, status VARCHAR(16), total INTEGER, sent INTEGER, blocked INTEGER,
+        failed INTEGER, created_at DATETIME, finished_at DATETIME
+    )""",
+    """CREATE TABLE track_codes (
+        id INTEGER PRIMARY KEY, track_code VARCHAR NOT NULL, status VARCHAR NOT NULL, tg_id BIGINT
+    )""",
+    "INSERT INTO broadcast_jobs (id, admin_chat_id, text, status) VALUES (1, 10, 'старая рассылка', 'done')",
+    "INSERT INTO track_codes (id, track_code, status) VALUES (1, 'YT1234567890', 'in_stock')",
+)
+
+
+async def _columns(engine, table):
+    async with engine.connect() as conn:
+        return await conn.run_sync(lambda sync_conn: {c["name"] for c in inspect(sync_conn).get_columns(table)})
+
+
+async def _applied(engine):
+    async with engine.connect() as conn:
+        return list((await conn.execute(select(schema_migrations.c.name).order_by(schema_migrations.c.name))).scalars())
+
+
+async def test_migrations_upgrade_old_sqlite_schema(tmp_path):
+    # Свой файл БД: общая тестовая БД уже создана по текущим моделям
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'old.db'}")
+    try:
+        async with engine.begin() as conn:
+            for statement in OLD_SCHEMA:
+                await conn.execute(text(statement))
+
+        await apply_migrations(engine, Base.metadata)
+
+        assert {"content_type", "source_chat_id", "source_message_ids", "media", "segment"} <= await _columns(
+            engine, "broadcast_jobs"
+        )
+        assert {"weight", "status_at"} <= await _columns(engine, "track_codes")
+        # 0003 в SQLite ничего не меняет, но отмечается применённой
+        assert await _applied(engine) == [name for name, _ in MIGRATIONS]
+
+        async with engine.connect() as conn:
+            job = (await conn.execute(text("SELECT content_type, text FROM broadcast_jobs"))).one()
+            code = (await conn.execute(text("SELECT track_code, weight FROM track_codes"))).one()
+        assert tuple(job) == ("text", "старая рассылка")
+        assert tuple(code) == ("YT1234567890", None)
+
+        # Индексы моделей досоздаются и для таблиц, созданных до их появления
+        async with engine.connect() as conn:
+            indexes = await conn.run_sync(
+                lambda sync_conn: {index["name"] for index in inspect(sync_conn).get_indexes("track_codes")}
+            )
+        assert {"ix_track_codes_status", "ix_track_codes_search", "ix_track_codes_tg_id_status"} <= indexes
+    finally:
+        await engine.dispose()
+
+
+async def test_migrations_are_idempotent(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'new.db'}")
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+        await apply_migrations(engine, Base.metadata)
+        await apply_migrations(engine, Base.metadata)
+
+        assert await _applied(engine) == [name for name, _ in MIGRATIONS]
+    finally:
+        await engine.dispose()
@@ -0,0 +1,92 @@
+import pytest
+from aiogram.fsm.storage.base import StorageKey
+from fakeredis import FakeAsyncRedis
+
+from utils.fsm_storage import (
+    STATE_GROUP_TTLS, _create_redis_storage, dumps_fsm_data, loads_fsm_data
+)
+from filters_and_config import FSM_STATE_TTL
+
+KEY = StorageKey(bot_id=1, chat_id=10, user_id=10)
+
+
+@pytest.mark.parametrize("data", [
+    {},
+    {"client_id": 5, "items": []},
+    {"items": [{"photo_id": "p1", "quantity": 2, "track": "YT123", "link": "https://x", "photo_unique_id": "u1"}]},
+    # Старые записи без последних полей
+    {"items": [{"photo_id": "p1", "quantity": 1, "track": None, "link": "l"}, {"photo_id": None}]},
+    # Пропущено поле в середине и лишнее поле — товары не упаковываются
+    {"items": [{"photo_id": "p1", "track": "T"}]},
+    {"items": [{"photo_id": "p1", "quantity": 1, "note": "x"}]},
+    {"items": "not a list", "text": "Привет"},
+])
+def test_fsm_data_round_trip_is_exact(data):
+    assert loads_fsm_data(dumps_fsm_data(data)) == data
+
+
+def test_order_items_are_packed_without_field_names():
+    raw = dumps_fsm_data({"items": [{"photo_id": "p1", "quantity": 2}]})
+    assert "photo_id" not in raw
+    assert raw == '{"__items__":[["p1",2]]}'
+
+
+@pytest.fixture
+async def redis_storage():
+    redis = FakeAsyncRedis()
+    storage = _create_redis_storage(redis)
+    yield storage, redis
+    await redis.flushall()
+    await redis.aclose()
+
+
+async def test_redis_state_ttl_by_group(redis_storage):
+    storage, redis = redis_storage
+    await storage.set_state(KEY, "BroadcastStates:confirm_send")
+    await storage.set_data(KEY, {"broadcast_segment": "shipped"})
+
+    assert await storage.get_state(KEY) == "BroadcastStates:confirm_send"
+    assert await storage.get_data(KEY) == {"broadcast_segment": "shipped"}
+
+    state_ttl = await redis.ttl(storage.key_builder.build(KEY, "state"))
+    data_ttl = await redis.ttl(storage.key_builder.build(KEY, "data"))
+    assert 0 < state_ttl <= STATE_GROUP_TTLS["BroadcastStates"]
+    assert 0 < data_ttl <= STATE_GROUP_TTLS["BroadcastStates"]
+
+
+async def test_redis_new_state_extends_data_ttl(redis_storage):
+    storage, redis = redis_storage
+    await storage.set_data(KEY, {"a": 1})
+    assert await redis.ttl(storage.key_builder.build(KEY, "data")) > STATE_GROUP_TTLS["BroadcastStates"]
+
+    await storage.set_state(KEY, "BroadcastStates:waiting_for_text")
+    assert await redis.ttl(storage.key_builder.build(KEY, "data")) <= STATE_GROUP_TTLS["BroadcastStates"]
+
+
+async def test_redis_data_without_state_uses_default_ttl(redis_storage):
+    storage, redis = redis_storage
+    await storage.set_data(KEY, {"a": 1})
+    assert 0 < await redis.ttl(storage.key_builder.build(KEY, "data")) <= FSM_STATE_TTL
+
+
+async def test_redis_clear_removes_keys(redis_storage):
+    storage, redis = redis_storage
+    await storage.set_state(KEY, "OrderItemsStates:waiting_for_photo")
+    await storage.set_data(KEY, {"items": [{"photo_id": "p1", "quantity": 1}]})
+
+    await storage.set_state(KEY, None)
+    await storage.set_data(KEY, {})
+
+    assert await storage.get_state(KEY) is None
+    assert await storage.get_data(KEY) == {}
+    assert not await redis.keys("*")
+
+
+async def test_redis_items_round_trip(redis_storage):
+    storage, redis = redis_storage
+    data = {"items": [{"photo_id": "p1", "quantity": 3, "track": "YT1", "link": "l", "photo_unique_id": "u"}]}
+    await storage.set_data(KEY, data)
+
+    assert await storage.get_data(KEY) == data
+    raw = await redis.get(storage.key_builder.build(KEY, "data"))
+    assert b"photo_id" not in raw
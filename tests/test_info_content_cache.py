@@ -0,0 +1,89 @@
+import pytest
+
+import database.db_info_content as db_info_content
+from database.db_info_content import InfoContentCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(db_info_content, "monotonic", clock)
+    return clock
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = InfoContentCache(ttl=60)
+    cache.set_many({"prices_text": "Цены", "prices_document": None})
+
+    assert cache.get("prices_text") == (True, "Цены")
+    # Отсутствующий в БД ключ тоже кэшируется
+    assert cache.get("prices_document") == (True, None)
+
+    clock.now += 59.9
+    assert cache.get("prices_text") == (True, "Цены")
+    clock.now += 0.1
+    assert cache.get("prices_text") == (False, None)
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_invalidate_key_and_all(clock):
+    cache = InfoContentCache(ttl=60)
+    cache.set_many({"a": "1", "b": "2"})
+
+    cache.invalidate("a")
+    assert cache.get("a") == (False, None)
+    assert cache.get("b") == (True, "2")
+    cache.invalidate("missing")
+
+    cache.invalidate()
+    assert cache.get("b") == (False, None)
+    assert cache.invalidations == 3
+    assert cache.stats() == {"keys": 0, "hits": 1, "misses": 2, "hit_rate": 1 / 3}
+
+
+def test_stats_without_requests():
+    assert InfoContentCache(ttl=1).stats()["hit_rate"] == 0.0
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = InfoContentCache(ttl=3600)
+    monkeypatch.setattr(db_info_content, "info_content_cache", cache)
+    return cache
+
+
+async def test_update_invalidates_cached_value(database, cache):
+    await db_info_content.update_info_content("tariffs_text", "старый тариф")
+    assert await db_info_content.get_info_content("tariffs_text") == "старый тариф"
+    assert cache.get("tariffs_text") == (True, "старый тариф")
+
+    await db_info_content.update_info_content("tariffs_text", "новый тариф")
+    assert cache.get("tariffs_text") == (False, None)
+    assert await db_info_content.get_info_content("tariffs_text") == "новый тариф"
+
+
+async def test_get_info_contents_loads_only_missing_keys(database, cache, monkeypatch):
+    await db_info_content.update_info_content("packing_text", "Упаковка")
+    cache.set_many({"packing_photo": "photo-id"})
+
+    requested = []
+    load = db_info_content._load_info_contents
+
+    async def counting_load(keys):
+        keys = list(keys)
+        requested.append(keys)
+        return await load(keys)
+
+    monkeypatch.setattr(db_info_content, "_load_info_contents", counting_load)
+
+    assert await db_info_content.get_content_bundle("packing") == {"packing_photo": "photo-id", "packing_text": "Упаковка"}
+    assert await db_info_content.get_content_bundle("packing") == {"packing_photo": "photo-id", "packing_text": "Упаковка"}
+    assert requested == [["packing_text"]]
@@ -0,0 +1,87 @@
+from datetime import datetime
+
+import pytest
+
+from utils.file_intake import UploadError
+from utils.manifest_import import (
+    CODE, DATE, HEADER_SEARCH_ROWS, INTERNAL_ID, WEIGHT, ManifestParser, detect_header, parse_column_mapping
+)
+
+
+def parse(rows, status="in_stock", mapping=None):
+    parser = ManifestParser(status, mapping)
+    return parser.parse(rows) + parser.finish(), parser
+
+
+def test_detect_header_maps_aliases():
+    assert detect_header(["№", "Трек-код", "ID клиента", "Вес, кг", "Дата поступления"]) == {
+        CODE: 1, INTERNAL_ID: 2, WEIGHT: 3, DATE: 4
+    }
+    assert detect_header(["YT1234567890", 2.5]) == {}
+
+
+def test_title_rows_above_header_are_not_data():
+    rows, parser = parse([("Manifest", None), (20251017, None), ("Трек-код", "Вес"), ("YT1234567890", 2)])
+    assert rows == [("YT1234567890", None, 2.0, None)]
+    assert parser.rejected == 0
+
+
+def test_header_found_across_batches():
+    parser = ManifestParser("in_stock")
+    assert parser.parse([("Склад Иу", None)]) == []
+    assert parser.parse([("Код", "Вес"), ("YT1234567890", "1,5 кг")]) == [("YT1234567890", None, 1.5, None)]
+    assert parser.finish() == []
+
+
+def test_without_header_code_column_is_guessed_after_title_rows():
+    rows, parser = parse([
+        ("Manifest", None, None),
+        (20251017, None, None),
+        (1, "YT1234567890", 2),
+        (2, "YT1234567891", 3),
+        (3, "bad-code", 4),
+    ])
+    assert parser.mapping == {CODE: 1}
+    assert [row[0] for row in rows] == ["YT1234567890", "YT1234567891"]
+    assert parser.rejects == ["стр. 5: трек-код «BAD-CODE»"]
+
+
+def test_without_header_and_codes_fails_after_search_rows():
+    with pytest.raises(UploadError):
+        parse([("Manifest", None)] * (HEADER_SEARCH_ROWS + 1))
+
+
+def test_header_without_code_column_fails():
+    with pytest.raises(UploadError):
+        parse([("Вес", "Дата"), (1, 2)])
+
+
+def test_caption_mapping_skips_header_row():
+    mapping = parse_column_mapping("код=B id=A вес=3 дата=D")
+    assert mapping == {CODE: 1, INTERNAL_ID: 0, WEIGHT: 2, DATE: 3}
+    rows, parser = parse(
+        [("Клиент", "Трек", "Вес", "Дата"), ("FS0012", "YT1234567890", 1, "17.10.2025")],
+        status="arrived", mapping=mapping
+    )
+    assert rows == [("YT1234567890", 12, 1.0, datetime(2025, 10, 17))]
+    assert parser.rejected == 0
+
+
+def test_arrived_takes_client_id_from_fs_code_and_rejects_codes_without_it():
+    rows, parser = parse([("Трек-код",), ("FS0012-2503-4",), ("YT1234567890",)], status="arrived")
+    assert rows == [("FS0012-2503-4", 12, None, None)]
+    assert parser.rejects == ["стр. 3: YT1234567890 — нет ID клиента"]
+
+
+def test_invalid_values_reject_whole_row_with_line_number():
+    rows, parser = parse([("Трек-код", "Вес", "Дата"), ("YT1234567890", "-1", None), ("YT1234567891", 1, "вчера")])
+    assert rows == []
+    assert parser.rejects == ["стр. 2: YT1234567890 — вес «-1»", "стр. 3: YT1234567891 — дата «вчера»"]
+
+
+def test_caption_mapping_errors():
+    assert parse_column_mapping("просто подпись") is None
+    with pytest.raises(UploadError):
+        parse_column_mapping("вес=B")
+    with pytest.raises(UploadError):
+        parse_column_mapping("код=B цвет=C")
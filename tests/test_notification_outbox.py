@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import delete, update
+
+from database.db_base import async_session
+from database.db_notifications import (
+    NotificationOutbox, add_outbox_notifications, count_pending_notifications, delete_sent_notifications,
+    get_pending_notifications, mark_notification_failed, purge_failed_notifications
+)
+
+
+@pytest.fixture
+async def outbox(database):
+    async with async_session() as session:
+        await session.execute(delete(NotificationOutbox))
+        await session.commit()
+    yield
+    async with async_session() as session:
+        await session.execute(delete(NotificationOutbox))
+        await session.commit()
+
+
+async def _add(count: int) -> None:
+    async with async_session() as session:
+        await add_outbox_notifications(session, [
+            {"chat_id": 100 + i, "text": f"Уведомление {i}", "track_code": f"YT00000000{i:02}"}
+            for i in range(count)
+        ])
+        await session.commit()
+
+
+async def test_outbox_rows_are_written_with_caller_transaction(outbox):
+    async with async_session() as session:
+        await add_outbox_notifications(session, [{"chat_id": 1, "text": "x", "track_code": None}])
+        await session.rollback()
+
+    assert await count_pending_notifications() == 0
+
+
+async def test_claim_pages_by_id_and_ack_deletes(outbox):
+    await _add(5)
+
+    first = await get_pending_notifications(after_id=0, limit=2)
+    assert [item["chat_id"] for item in first] == [100, 101]
+    assert first[0] == {
+        "id": first[0]["id"], "chat_id": 100, "text": "Уведомление 0", "track_code": "YT0000000000", "attempts": 0
+    }
+
+    rest = await get_pending_notifications(after_id=first[-1]["id"], limit=10)
+    assert [item["chat_id"] for item in rest] == [102, 103, 104]
+
+    await delete_sent_notifications([item["id"] for item in first])
+    await delete_sent_notifications([])
+    assert await count_pending_notifications() == 3
+    # Новый проход с начала видит только неподтверждённые
+    assert [item["chat_id"] for item in await get_pending_notifications(0, 10)] == [102, 103, 104]
+
+
+async def test_failed_rows_leave_queue_and_are_purged_when_old(outbox):
+    await _add(3)
+    items = await get_pending_notifications(0, 10)
+
+    await mark_notification_failed(items[0]["id"], "failed", 5)
+    await mark_notification_failed(items[1]["id"], "unreachable", 1)
+    assert [item["id"] for item in await get_pending_notifications(0, 10)] == [items[2]["id"]]
+    assert await count_pending_notifications() == 1
+
+    assert await purge_failed_notifications(older_than_days=7) == 0
+
+    async with async_session() as session:
+        await session.execute(
+            update(NotificationOutbox)
+            .where(NotificationOutbox.id == items[0]["id"])
+            .values(created_at=datetime.now() - timedelta(days=8))
+        )
+        await session.commit()
+
+    assert await purge_failed_notifications(older_than_days=7) == 1
+    assert await count_pending_notifications() == 1
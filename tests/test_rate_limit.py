@@ -0,0 +1,108 @@
+import pytest
+
+import utils.rate_limit as rate_limit
+from utils.rate_limit import PerKeyRateLimiter, TokenBucket
+
+
+class FakeClock:
+    """
+    Подменяет monotonic и sleep: sleep лишь сдвигает время, тест не ждёт.
+    Время и скорости в тестах — степени двойки, чтобы расчёт токенов шёл без ошибок округления.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit, "monotonic", clock.monotonic)
+    monkeypatch.setattr(rate_limit, "sleep", clock.sleep)
+    return clock
+
+
+async def test_bucket_allows_burst_then_limits_rate(clock):
+    bucket = TokenBucket(rate=4, capacity=3)
+
+    for _ in range(3):
+        await bucket.acquire()
+    assert clock.sleeps == []
+
+    start = clock.now
+    for _ in range(5):
+        await bucket.acquire()
+    assert clock.now - start == 5 / 4
+
+
+async def test_bucket_refills_up_to_capacity(clock):
+    bucket = TokenBucket(rate=8)
+    assert bucket.capacity == 8
+
+    for _ in range(8):
+        await bucket.acquire()
+    clock.now += 60
+
+    for _ in range(8):
+        await bucket.acquire()
+    assert clock.sleeps == []
+    await bucket.acquire()
+    assert clock.sleeps == [1 / 8]
+
+
+async def test_bucket_pause_blocks_until_it_ends(clock):
+    bucket = TokenBucket(rate=8)
+    bucket.pause(5)
+    bucket.pause(1)  # более короткая пауза не сокращает текущую
+
+    start = clock.now
+    await bucket.acquire()
+    # Пауза, затем ожидание первого токена: запас обнуляется
+    assert clock.now - start == 5 + 1 / 8
+
+
+async def test_per_key_limiter_spaces_one_key_only(clock):
+    limiter = PerKeyRateLimiter(interval=1.0)
+
+    await limiter.wait(1)
+    await limiter.wait(2)
+    assert clock.sleeps == []
+
+    await limiter.wait(1)
+    assert clock.sleeps == [1.0]
+
+    clock.now += 5
+    await limiter.wait(1)
+    assert len(clock.sleeps) == 1
+
+
+async def test_per_key_limiter_reserves_slots_for_concurrent_waits(clock, monkeypatch):
+    limiter = PerKeyRateLimiter(interval=1.0)
+    waits = []
+
+    async def record_sleep(seconds):
+        waits.append(seconds)
+
+    # Время не идёт: три одновременных ожидания одного ключа получают слоты 0, 1, 2
+    monkeypatch.setattr(rate_limit, "sleep", record_sleep)
+    for _ in range(3):
+        await limiter.wait("chat")
+    assert waits == [1.0, 2.0]
+
+
+async def test_per_key_limiter_purges_stale_keys(clock):
+    limiter = PerKeyRateLimiter(interval=1.0, max_keys=3)
+    for key in range(4):
+        await limiter.wait(key)
+
+    clock.now += 2
+    await limiter.wait("new")
+    assert list(limiter._next_allowed) == ["new"]
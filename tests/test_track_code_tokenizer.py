@@ -0,0 +1,78 @@
+import pytest
+
+from utils.track_code_tokenizer import (
+    FS, MARKETPLACE, MAX_REJECT_SAMPLES, TrackCodeTokenizer, extract_track_codes, format_rejects, tokenize
+)
+
+
+def test_free_text_finds_codes_anywhere():
+    tokens, tokenizer = tokenize("Мои коды: yt1234567890, FS0012-2503-4 и ещё JD0000000001!")
+    assert tokens == [
+        ("YT1234567890", MARKETPLACE, None),
+        ("FS0012-2503-4", FS, 12),
+        ("JD0000000001", MARKETPLACE, None),
+    ]
+    # В свободном тексте отказы не считаются
+    assert tokenizer.rejected == 0
+
+
+def test_free_text_skips_short_and_too_long_tokens():
+    assert extract_track_codes("ABC1234 " + "A" * 65 + " YT12345678") == ["YT12345678"]
+
+
+def test_unique_codes_keep_first_order():
+    assert extract_track_codes("BBBBBBBB1 AAAAAAAA1 bbbbbbbb1") == ["BBBBBBBB1", "AAAAAAAA1"]
+
+
+def test_per_line_takes_code_at_line_start_with_trailing_data():
+    tokens, tokenizer = tokenize("YT1234567890 2.5kg\n  FS0012-2503-4\n\n", per_line=True)
+    assert [token[0] for token in tokens] == ["YT1234567890", "FS0012-2503-4"]
+    assert tokenizer.rejected == 0
+
+
+def test_per_line_rejects_instead_of_truncating():
+    tokens, tokenizer = tokenize("JD-0123456789\nабв YT1234567890\nshort\n", per_line=True)
+    assert tokens == []
+    assert tokenizer.rejected == 3
+    assert tokenizer.rejects == ["JD-0123456789", "абв YT1234567890", "short"]
+
+
+def test_per_line_rejects_keep_original_case():
+    tokens, tokenizer = tokenize("yt1234567890\nabc\n", per_line=True)
+    assert tokens == [("YT1234567890", MARKETPLACE, None)]
+    assert tokenizer.rejects == ["abc"]
+
+
+def test_fs_only_finds_code_anywhere_in_line_as_a_word():
+    tokens, tokenizer = tokenize(
+        "YT1234567890 fs0012-2503-4\nXFS0013-2503-4\nYT99999999\n", kinds=[FS], per_line=True
+    )
+    assert tokens == [("FS0012-2503-4", FS, 12)]
+    assert tokenizer.rejects == ["XFS0013-2503-4", "YT99999999"]
+
+
+def test_marketplace_only_rejects_fs_codes():
+    tokens, tokenizer = tokenize("FS0012-2503-4\nYT1234567890\n", kinds=[MARKETPLACE], per_line=True)
+    assert tokens == [("YT1234567890", MARKETPLACE, None)]
+    assert tokenizer.rejects == ["FS0012-2503-4"]
+
+
+@pytest.mark.parametrize("split_at", range(1, 30))
+def test_feed_handles_chunk_boundaries(split_at):
+    text = "YT1234567890\nFS0012-2503-4\nbad line\nJD0000000001"
+    tokenizer = TrackCodeTokenizer(per_line=True)
+    tokens = tokenizer.feed(text[:split_at]) + tokenizer.feed(text[split_at:]) + tokenizer.close()
+    assert [token[0] for token in tokens] == ["YT1234567890", "FS0012-2503-4", "JD0000000001"]
+    assert tokenizer.rejects == ["bad line"]
+
+
+def test_rejects_are_counted_but_samples_are_bounded():
+    _, tokenizer = tokenize("\n".join(f"bad {i}" for i in range(MAX_REJECT_SAMPLES + 5)), per_line=True)
+    assert tokenizer.rejected == MAX_REJECT_SAMPLES + 5
+    assert len(tokenizer.rejects) == MAX_REJECT_SAMPLES
+
+
+def test_format_rejects_escapes_html():
+    _, tokenizer = tokenize("<b>x</b> & y\n", per_line=True)
+    assert format_rejects(tokenizer) == "⚠️ Не распознано строк: <b>1</b>\n  <code>&lt;b&gt;x&lt;/b&gt; &amp; y</code>"
+    assert format_rejects(tokenize("YT1234567890", per_line=True)[1]) == ""
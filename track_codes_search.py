@@ -1,18 +1,20 @@
-from re import findall, IGNORECASE
+from datetime import datetime
 from logging import getLogger
-from typing import Union
+from typing import Iterable, Tuple, Union
 
 from aiogram import Router, F, Bot
 from aiogram.fsm.context import FSMContext
 from aiogram.types import Message, CallbackQuery
 from aiogram.exceptions import TelegramBadRequest
 
-from database.db_track_codes import get_user_track_codes, get_track_code
+from database.db_track_codes import get_user_track_codes, get_track_codes_info
+from database.db_track_events import get_track_code_timelines
 from keyboards.user_keyboards import main_keyboard, cancel_keyboard, add_track_codes_follow_up_keyboard
 from utils.message_common import send_chunked_response, extract_text_from_message
 from utils.fsm_guard import warn_if_user_is_inside_fsm
+from utils.track_code_tokenizer import extract_track_codes
 
-from track_numbers import TRACK_CODE_PATTERN, TrackCodeStates
+from track_numbers import TrackCodeStates
 
 track_code_search_router = Router()
 logger = getLogger(__name__)
@@ -24,6 +26,21 @@ STATUS_MESSAGES = {
     "arrived": "📍 Прибыл в пункт выдачи! (@fir2201)"
 }
 
+# Этапы пути посылки для истории в «Мои трек-коды»
+TIMELINE_STEPS = {
+    "in_stock": "склад",
+    "shipped": "отправлен",
+    "arrived": "пункт выдачи",
+}
+
+
+def format_timeline(events: Iterable[Tuple[str, datetime]]) -> str:
+    """«склад 01.03 → отправлен 05.03»: последняя дата каждого этапа в порядке пути."""
+    reached = {status: ts for status, ts in events if status in TIMELINE_STEPS}
+    return " → ".join(
+        f"{title} {reached[status]:%d.%m}" for status, title in TIMELINE_STEPS.items() if status in reached
+    )
+
 
 @track_code_search_router.message(F.text.lower() == "проверка трек-кодов")
 @track_code_search_router.callback_query(F.data == "start_check_codes")
@@ -65,17 +82,18 @@ async def process_track_code_search(message: Message, state: FSMContext, bot: Bo
             await message.answer("Пожалуйста, отправьте текст или .txt файл.", reply_markup=cancel_keyboard)
         return
 
-    track_codes = list(set(findall(TRACK_CODE_PATTERN, raw_text.upper(), flags=IGNORECASE)))
+    track_codes = extract_track_codes(raw_text)
 
     if not track_codes:
         await message.answer("❌ Не найдено корректных трек-кодов.", reply_markup=cancel_keyboard)
         return
 
     user_id = message.from_user.id
+    codes_info = await get_track_codes_info(track_codes)
 
     if len(track_codes) == 1:
         code = track_codes[0]
-        info = await get_track_code(code)
+        info = codes_info[code]
 
         if info:
             status_text = STATUS_MESSAGES.get(info["status"], info["status"])
@@ -105,8 +123,7 @@ async def process_track_code_search(message: Message, state: FSMContext, bot: Bo
     else:
         result_lines = [f"📦 <b>Проверка {len(track_codes)} кодов:</b>\n"]
 
-        for code in track_codes:
-            info = await get_track_code(code)
+        for code, info in codes_info.items():
             if info:
                 status_text = STATUS_MESSAGES.get(info["status"], "Неизв.")
                 is_mine = " (Ваш)" if info.get("tg_id") == user_id else ""
@@ -137,11 +154,15 @@ async def view_my_track_codes(callback: CallbackQuery):
         )
         return
 
+    timelines = await get_track_code_timelines([code for code, _ in my_codes])
     response_lines = [f"📋 <b>Ваши трек-коды ({len(my_codes)} шт.):</b>\n"]
 
     for code, status in my_codes:
         status_text = STATUS_MESSAGES.get(status, status)
         response_lines.append(f"• <code>{code}</code> — {status_text}")
+        timeline = format_timeline(timelines.get(code, ()))
+        if timeline:
+            response_lines.append(f"   <i>{timeline}</i>")
 
     await send_chunked_response(callback, "\n".join(response_lines))
 
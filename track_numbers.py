@@ -1,4 +1,3 @@
-from re import findall, IGNORECASE
 from logging import getLogger
 from typing import Union, List
 
@@ -10,12 +9,11 @@ from aiogram.types import Message, CallbackQuery
 from database.db_track_codes import add_multiple_track_codes
 from keyboards.user_keyboards import main_keyboard, cancel_keyboard, add_track_codes_follow_up_keyboard
 from utils.message_common import extract_text_from_message
+from utils.track_code_tokenizer import MARKETPLACE, extract_track_codes
 
 track_code_router = Router()
 logger = getLogger(__name__)
 
-TRACK_CODE_PATTERN = r'[A-Z0-9]{8,}'
-
 
 class TrackCodeStates(StatesGroup):
     add_multiple_codes = State()
@@ -66,9 +64,8 @@ async def process_multiple_track_codes(message: Message, state: FSMContext, bot:
             await message.answer("Не удалось получить данные для обработки.", reply_markup=cancel_keyboard)
         return
 
-    # Используем TRACK_CODE_PATTERN для поиска
-    found_codes = findall(TRACK_CODE_PATTERN, raw_text.upper(), flags=IGNORECASE)
-    unique_codes = list(set(found_codes))
+    # Пользователь добавляет коды маркетплейсов; FS-коды присваивает склад
+    unique_codes = extract_track_codes(raw_text, kinds=[MARKETPLACE])
 
     if not unique_codes:
         await message.answer(
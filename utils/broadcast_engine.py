@@ -0,0 +1,385 @@
+from asyncio import Queue, Task, create_task, gather, sleep
+from logging import getLogger
+from random import uniform
+from typing import List, Dict, Any, Optional, Set
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+from aiogram.types import InputMediaPhoto, InputMediaVideo, InputMediaDocument, InputMediaAudio
+
+from database.db_broadcasts import (
+    get_broadcast_job,
+    get_running_broadcast_jobs,
+    get_pending_deliveries,
+    save_delivery_results,
+    finish_broadcast_job,
+    mark_users_blocked,
+)
+from filters_and_config import BROADCAST_SENDERS, BROADCAST_PROGRESS_INTERVAL, JOB_POLL_INTERVAL
+from keyboards.admin_keyboards import admin_keyboard
+from utils.rate_limit import telegram_send_bucket
+
+logger = getLogger(__name__)
+
+
+_SEND_METHODS = {
+    "photo": "send_photo",
+    "video": "send_video",
+    "document": "send_document",
+    "animation": "send_animation",
+    "audio": "send_audio",
+}
+
+_INPUT_MEDIA = {
+    "photo": InputMediaPhoto,
+    "video": InputMediaVideo,
+    "document": InputMediaDocument,
+    "audio": InputMediaAudio,
+}
+
+BROADCAST_SEGMENTS = {
+    None: "всем пользователям",
+    "in_stock": "у кого товар на складе",
+    "shipped": "у кого товар отправлен",
+    "arrived": "у кого товар в пункте выдачи",
+}
+
+
+def build_input_media(media: List[Dict[str, str]], caption: str) -> list:
+    """Элементы альбома по сохранённым file_id; подпись — у первого элемента."""
+    return [
+        _INPUT_MEDIA[item["type"]](media=item["file_id"], caption=caption if index == 0 and caption else None)
+        for index, item in enumerate(media)
+    ]
+
+
+def format_broadcast_progress(job: Dict[str, Any], finished: bool = False) -> str:
+    done = job["sent"] + job["blocked"] + job["failed"]
+    percent = done / job["total"] if job["total"] else 1.0
+    title = "✅ <b>Рассылка завершена</b>" if finished else f"📤 <b>Рассылка идёт</b> ({percent:.0%})"
+    return (
+        f"{title}\n\n"
+        f"🎯 Аудитория: {BROADCAST_SEGMENTS.get(job.get('segment'), job.get('segment'))}\n"
+        f"👥 Получателей: <b>{job['total']}</b>\n"
+        f"📨 Отправлено: <b>{job['sent']}</b>\n"
+        f"🚫 Заблокировали бота: <b>{job['blocked']}</b>\n"
+        f"⚠️ Другие ошибки: <b>{job['failed']}</b>"
+    )
+
+
+class BroadcastRun:
+    """
+    Выполнение одного задания рассылки.
+
+    Feeder читает pending-доставки пачками, пул отправителей шлёт их под общим
+    token bucket (telegram_send_bucket), результаты пишутся в БД пачками.
+    После перезапуска задание продолжается с оставшихся pending-доставок.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        job_id: int,
+        senders: int = BROADCAST_SENDERS,
+        batch_size: int = 500,
+        max_attempts: int = 3,
+        flush_interval: float = 1.0,
+        progress_interval: float = BROADCAST_PROGRESS_INTERVAL
+    ):
+        self.bot = bot
+        self.job_id = job_id
+        self.senders = senders
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.flush_interval = flush_interval
+        self.progress_interval = progress_interval
+
+        self._queue: Queue = Queue(maxsize=batch_size * 2)
+        self._results: List[Dict[str, Any]] = []
+        self._blocked: List[int] = []
+        self._job: Dict[str, Any] = {}
+        self._use_file_ids = False
+        # Результаты не записались — задание нельзя запускать снова
+        self.paused = False
+
+    async def run(self) -> None:
+        self._job = await get_broadcast_job(self.job_id)
+        if not self._job or self._job["status"] != "running":
+            return
+
+        logger.info("Рассылка %s: старт. total=%s sent=%s", self.job_id, self._job["total"], self._job["sent"])
+
+        senders = [create_task(self._send_loop()) for _ in range(self.senders)]
+        background = [create_task(self._flush_loop()), create_task(self._progress_loop())]
+        try:
+            await self._feed()
+            await self._queue.join()
+        finally:
+            for task in senders + background:
+                task.cancel()
+            await gather(*senders, *background, return_exceptions=True)
+            await self._final_flush()
+
+        if self._results:
+            await self._pause()
+            return
+
+        await finish_broadcast_job(self.job_id)
+        self._job = await get_broadcast_job(self.job_id)
+        await self._report()
+
+        logger.info(
+            "Рассылка %s завершена. total=%s sent=%s blocked=%s errors=%s",
+            self.job_id, self._job["total"], self._job["sent"], self._job["blocked"], self._job["failed"]
+        )
+
+    async def _feed(self) -> None:
+        last_id = 0
+        while True:
+            batch = await get_pending_deliveries(self.job_id, last_id, self.batch_size)
+            for item in batch:
+                await self._queue.put(item)
+                last_id = item["id"]
+            if len(batch) < self.batch_size:
+                return
+
+    async def _send_loop(self) -> None:
+        while True:
+            item = await self._queue.get()
+            try:
+                status, attempts = await self._deliver(item)
+                self._results.append({"id": item["id"], "status": status, "attempts": attempts})
+                if status == "blocked":
+                    self._blocked.append(item["chat_id"])
+            except Exception as e:
+                logger.error("Рассылка %s: необработанная ошибка доставки %s: %s",
+                             self.job_id, item["id"], e, exc_info=True)
+                # Иначе доставка останется pending в завершённом задании
+                self._results.append({"id": item["id"], "status": "failed", "attempts": item["attempts"] + 1})
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, item: Dict[str, Any]) -> tuple:
+        """Отправляет сообщение одному получателю. Возвращает (status, attempts)."""
+        chat_id = item["chat_id"]
+        attempts = item["attempts"]
+
+        while True:
+            await telegram_send_bucket.acquire()
+            attempts += 1
+
+            try:
+                await self._send(chat_id)
+                return "sent", attempts
+
+            except TelegramRetryAfter as e:
+                logger.warning("Flood control при рассылке. Жду %s сек.", e.retry_after)
+                telegram_send_bucket.pause(e.retry_after)
+                attempts -= 1
+
+            except TelegramForbiddenError:
+                return "blocked", attempts
+
+            except TelegramBadRequest as e:
+                if "chat not found" in str(e).lower():
+                    return "blocked", attempts
+                if "to copy not found" in str(e).lower() and not self._use_file_ids:
+                    # Исходное сообщение админа удалено — дальше шлём по сохранённым file_id
+                    logger.warning("Рассылка %s: исходное сообщение недоступно, переходим на file_id", self.job_id)
+                    self._use_file_ids = True
+                    attempts -= 1
+                    continue
+                logger.warning("TelegramBadRequest при отправке пользователю %s: %s", chat_id, e)
+                return "failed", attempts
+
+            except Exception as e:
+                if attempts >= self.max_attempts:
+                    logger.error("Ошибка рассылки пользователю %s: %s", chat_id, e)
+                    return "failed", attempts
+                await sleep(min(30.0, 2 ** attempts) + uniform(0, 1))
+
+    async def _send(self, chat_id: int) -> None:
+        """
+        Копирует сообщение админа получателю: файлы не загружаются заново, форматирование
+        передаётся entities без повторного разбора HTML. Без исходника — по file_id.
+        """
+        job = self._job
+        message_ids = job["source_message_ids"]
+
+        if message_ids and not self._use_file_ids:
+            if len(message_ids) > 1:
+                await self.bot.copy_messages(chat_id, job["source_chat_id"], message_ids)
+            else:
+                await self.bot.copy_message(chat_id, job["source_chat_id"], message_ids[0])
+            return
+
+        media = job["media"]
+        if not media:
+            await self.bot.send_message(chat_id, job["text"])
+        elif job["content_type"] == "album":
+            await self.bot.send_media_group(chat_id, build_input_media(media, job["text"]))
+        else:
+            send = getattr(self.bot, _SEND_METHODS[media[0]["type"]])
+            await send(chat_id, media[0]["file_id"], caption=job["text"] or None)
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await sleep(self.flush_interval)
+            await self._flush()
+
+    async def _flush(self) -> None:
+        if self._results:
+            results, self._results = self._results, []
+            try:
+                await save_delivery_results(self.job_id, results)
+            except Exception as e:
+                logger.error("Рассылка %s: ошибка записи результатов: %s", self.job_id, e, exc_info=True)
+                self._results.extend(results)
+
+        if self._blocked:
+            blocked, self._blocked = self._blocked, []
+            try:
+                await mark_users_blocked(blocked)
+            except Exception as e:
+                logger.error("Ошибка сохранения заблокировавших бота: %s", e)
+
+    async def _final_flush(self) -> None:
+        """Последняя запись результатов с повторами: без неё задание нельзя завершать."""
+        await self._flush()
+        for attempt in range(1, self.max_attempts):
+            if not self._results:
+                return
+            await sleep(min(30.0, 2 ** attempt) + uniform(0, 1))
+            await self._flush()
+
+    async def _pause(self) -> None:
+        """
+        Отправленное не записано: эти доставки в БД ещё pending, и повторный запуск разослал бы их
+        второй раз. Задание ставится на паузу вместо продолжения, админ получает предупреждение.
+        """
+        self.paused = True
+        logger.error(
+            "Рассылка %s: не удалось записать %s результатов, задание приостановлено",
+            self.job_id, len(self._results)
+        )
+        try:
+            await finish_broadcast_job(self.job_id, status="paused")
+        except Exception as e:
+            # БД недоступна — задание остаётся running, но этот процесс его больше не запустит
+            logger.error("Рассылка %s: не удалось поставить задание на паузу: %s", self.job_id, e)
+
+        try:
+            await self.bot.send_message(
+                self._job["admin_chat_id"],
+                f"⏸ <b>Рассылка приостановлена</b>: не удалось сохранить результаты доставки.\n\n"
+                f"{format_broadcast_progress(self._job)}\n\n"
+                "Часть сообщений уже доставлена, но не отмечена. Чтобы не разослать их повторно, "
+                "рассылка не будет продолжена автоматически.",
+                reply_markup=admin_keyboard
+            )
+        except Exception as e:
+            logger.error("Не удалось сообщить о паузе рассылки %s: %s", self.job_id, e)
+
+    async def _progress_loop(self) -> None:
+        while True:
+            await sleep(self.progress_interval)
+            job = await get_broadcast_job(self.job_id)
+            if job:
+                self._job.update(job)
+                await self._edit_progress(format_broadcast_progress(self._job))
+
+    async def _edit_progress(self, text: str) -> None:
+        if not self._job.get("progress_message_id"):
+            return
+        try:
+            await self.bot.edit_message_text(
+                text=text, chat_id=self._job["admin_chat_id"], message_id=self._job["progress_message_id"]
+            )
+        except TelegramBadRequest as e:
+            if "not modified" not in str(e).lower():
+                logger.warning("Не удалось обновить прогресс рассылки %s: %s", self.job_id, e)
+        except Exception as e:
+            logger.warning("Не удалось обновить прогресс рассылки %s: %s", self.job_id, e)
+
+    async def _report(self) -> None:
+        report = format_broadcast_progress(self._job, finished=True)
+        await self._edit_progress(report)
+        try:
+            await self.bot.send_message(self._job["admin_chat_id"], report, reply_markup=admin_keyboard)
+        except Exception as e:
+            logger.error("Не удалось отправить отчёт о рассылке %s: %s", self.job_id, e)
+
+
+class BroadcastEngine:
+    """
+    Запускает задания рассылки в фоне и продолжает незавершённые после перезапуска.
+
+    Рассылки идут только в запущенном движке (один процесс или входной процесс при BOT_WORKERS > 0):
+    там же работает диспетчер уведомлений, и общий telegram_send_bucket держит лимит на весь бот.
+    Воркер только создаёт задание в БД — движок находит running-задания опросом раз в poll_interval
+    и так же перезапускает задания, прерванные ошибкой. Приостановленные (paused) не перезапускаются.
+    """
+
+    def __init__(self, poll_interval: float = JOB_POLL_INTERVAL):
+        self.poll_interval = poll_interval
+        self._bot: Optional[Bot] = None
+        self._poller: Optional[Task] = None
+        self._tasks: Dict[int, Task] = {}
+        # Приостановленные задания, которые не удалось пометить в БД: опрос их не перезапускает
+        self._paused: Set[int] = set()
+
+    def launch(self, bot: Bot, job_id: int) -> None:
+        if self._bot is None:
+            # Движок не запущен (воркер) — задание заберёт входной процесс по опросу
+            logger.info("Рассылка %s передана входному процессу", job_id)
+            return
+        if job_id in self._tasks or job_id in self._paused:
+            return
+        broadcast_run = BroadcastRun(bot, job_id)
+        task = create_task(broadcast_run.run())
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda t: self._on_done(broadcast_run, t))
+
+    def _on_done(self, broadcast_run: BroadcastRun, task: Task) -> None:
+        job_id = broadcast_run.job_id
+        self._tasks.pop(job_id, None)
+        if broadcast_run.paused:
+            self._paused.add(job_id)
+        if not task.cancelled() and task.exception():
+            logger.error("Рассылка %s прервана ошибкой: %s", job_id, task.exception(), exc_info=task.exception())
+
+    async def start(self, bot: Bot) -> None:
+        """Продолжает задания, прерванные перезапуском бота, и начинает опрос новых."""
+        if self._poller:
+            return
+        self._bot = bot
+        for job_id in await get_running_broadcast_jobs():
+            logger.info("Продолжаем рассылку %s после перезапуска", job_id)
+            self.launch(bot, job_id)
+        self._poller = create_task(self._poll())
+
+    async def _poll(self) -> None:
+        while True:
+            await sleep(self.poll_interval)
+            try:
+                for job_id in await get_running_broadcast_jobs():
+                    if job_id not in self._tasks:
+                        self.launch(self._bot, job_id)
+            except Exception as e:
+                logger.error("Ошибка выборки заданий рассылки: %s", e, exc_info=True)
+
+    async def stop(self) -> None:
+        """Останавливает рассылки. Неотправленные доставки остаются pending до следующего запуска."""
+        tasks = ([self._poller] if self._poller else []) + list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await gather(*tasks, return_exceptions=True)
+        self._poller = None
+        self._bot = None
+
+    @property
+    def running(self) -> List[int]:
+        return list(self._tasks)
+
+
+broadcast_engine = BroadcastEngine()
@@ -0,0 +1,316 @@
+from asyncio import get_running_loop
+from codecs import BOM_UTF8, BOM_UTF16_LE, BOM_UTF16_BE, getincrementaldecoder
+from csv import Sniffer, Error as CsvError, reader as csv_reader
+from datetime import date, datetime
+from itertools import chain
+from logging import getLogger
+from re import compile as re_compile
+from tempfile import SpooledTemporaryFile
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from zipfile import BadZipFile, ZipFile
+
+from aiogram import Bot
+from aiogram.types import Message
+from openpyxl import load_workbook
+
+from filters_and_config import UPLOAD_SPOOL_MAX_MB, UPLOAD_BATCH_SIZE
+from utils.track_code_tokenizer import ALL_KINDS, TrackCodeTokenizer, TrackToken
+
+logger = getLogger(__name__)
+
+TEXT = "text"
+CSV = "csv"
+XLSX = "xlsx"
+
+# Больше Bot API скачать не даёт
+TELEGRAM_DOWNLOAD_LIMIT = 20 * 1024 * 1024
+READ_SIZE = 64 * 1024
+# По сколько строк таблицы отдавать за раз: XLSX разбирается в потоке, чтобы не держать цикл событий
+ROWS_PER_BATCH = 1000
+# Сколько начала CSV (символов) смотреть, угадывая разделитель
+CSV_SNIFF_SIZE = 64 * 1024
+
+_NEWLINE_RE = re_compile(r"\r\n|\r|\n")
+
+Row = Sequence[Any]
+
+
+class UploadError(Exception):
+    """Файл нельзя прочитать. Текст исключения — ответ пользователю."""
+
+
+def detect_encoding(sample: bytes) -> str:
+    """
+    Кодировка текстового файла по началу: BOM, иначе UTF-8, если проба им декодируется, иначе cp1251
+    (так сохраняет выгрузки склад). Кодеки utf-8-sig/utf-16 сами отрезают BOM.
+    """
+    if sample.startswith(BOM_UTF8):
+        return "utf-8-sig"
+    if sample.startswith((BOM_UTF16_LE, BOM_UTF16_BE)):
+        return "utf-16"
+    try:
+        # final=False: проба могла оборвать многобайтовый символ на границе
+        getincrementaldecoder("utf-8")().decode(sample, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "cp1251"
+
+
+def detect_kind(file_name: str, sample: bytes) -> str:
+    name = file_name.lower()
+    if name.endswith(".xls"):
+        raise UploadError("Формат .xls не поддерживается. Сохраните таблицу как .xlsx или .csv.")
+    if name.endswith((".xlsx", ".xlsm")) or sample.startswith(b"PK\x03\x04"):
+        return XLSX
+    if name.endswith(".csv"):
+        return CSV
+    return TEXT
+
+
+def _check_workbook(buffer: Any) -> None:
+    # Оглавление архива читается быстро — битый файл отсекаем до разбора строк
+    try:
+        names = ZipFile(buffer).namelist()
+    except BadZipFile:
+        names = []
+    finally:
+        buffer.seek(0)
+    if "xl/workbook.xml" not in names:
+        raise UploadError("Не удалось открыть таблицу: файл повреждён или это не .xlsx.")
+
+
+def cell_text(value: Any) -> str:
+    """Значение ячейки как текст: числа без «.0» (коды в Excel часто числовые), даты — ISO."""
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value).strip()
+
+
+class Upload:
+    """
+    Текст или файл из сообщения, который читается потоком, а не одной строкой в памяти.
+
+    Файл скачивается в SpooledTemporaryFile: до UPLOAD_SPOOL_MAX_MB в памяти, больше — на диске.
+    Текстовые файлы и CSV декодируются кусками (кодировка — detect_encoding), XLSX читается openpyxl
+    в режиме read_only. iter_text отдаёт текст кусками (строки таблиц — ячейки через табуляцию),
+    iter_rows — пачки строк таблицы. Закрывается через async with или close().
+    """
+
+    def __init__(self, name: str, kind: str, text: Optional[str] = None, buffer: Optional[Any] = None,
+                 encoding: str = "utf-8", size: int = 0):
+        self.name = name
+        self.kind = kind
+        self.encoding = encoding
+        self.size = size
+        self._text = text
+        self._buffer = buffer
+
+    @classmethod
+    def from_text(cls, text: str) -> "Upload":
+        return cls("message", TEXT, text=text, size=len(text))
+
+    @classmethod
+    def from_file(cls, buffer: Any, file_name: str) -> "Upload":
+        size = buffer.seek(0, 2)
+        buffer.seek(0)
+        sample = buffer.read(READ_SIZE)
+        buffer.seek(0)
+
+        kind = detect_kind(file_name, sample)
+        if kind == XLSX:
+            _check_workbook(buffer)
+        encoding = detect_encoding(sample) if kind != XLSX else ""
+        return cls(file_name, kind, buffer=buffer, encoding=encoding, size=size)
+
+    # --- ЧТЕНИЕ ---
+
+    async def iter_text(self) -> AsyncIterator[str]:
+        if self._buffer is None:
+            yield self._text or ""
+            return
+
+        if self.kind == TEXT:
+            for chunk in self._iter_decoded():
+                yield chunk
+            return
+
+        async for rows in self.iter_rows():
+            yield "".join("\t".join(map(cell_text, row)) + "\n" for row in rows)
+
+    async def iter_rows(self) -> AsyncIterator[List[Row]]:
+        """Пачки строк: для XLSX — значения ячеек как есть, для CSV и текста — строки."""
+        if self._buffer is None:
+            yield [[line] for line in (self._text or "").splitlines()]
+            return
+
+        if self.kind == XLSX:
+            loop = get_running_loop()
+            batches = self._iter_xlsx_batches()
+            while True:
+                rows = await loop.run_in_executor(None, next, batches, None)
+                if rows is None:
+                    return
+                yield rows
+
+        for rows in _batched(self._iter_csv_rows() if self.kind == CSV else ([line] for line in self._iter_lines())):
+            yield rows
+
+    async def read_text(self) -> str:
+        """Весь текст сразу — для коротких списков (поиск, добавление кодов пользователем)."""
+        return "".join([chunk async for chunk in self.iter_text()])
+
+    def _iter_decoded(self) -> Iterator[str]:
+        # Через публичные seek/read буфера: после сброса на диск позицию ведёт сам SpooledTemporaryFile
+        decoder = getincrementaldecoder(self.encoding)(errors="replace")
+        self._buffer.seek(0)
+        while chunk := self._buffer.read(READ_SIZE):
+            if text := decoder.decode(chunk):
+                yield text
+        if text := decoder.decode(b"", final=True):
+            yield text
+
+    def _iter_raw_lines(self) -> Iterator[str]:
+        """Строки с исходными переводами строк (\n, \r\n, \r) — их разбирают токенизатор и csv."""
+        tail = ""
+        for chunk in self._iter_decoded():
+            text = tail + chunk
+            start = 0
+            for match in _NEWLINE_RE.finditer(text):
+                # «\r» в конце куска может оказаться началом «\r\n»
+                if match.end() == len(text) and match.group() == "\r":
+                    break
+                yield text[start:match.end()]
+                start = match.end()
+            tail = text[start:]
+        if tail:
+            yield tail
+
+    def _iter_lines(self) -> Iterator[str]:
+        for line in self._iter_raw_lines():
+            yield line.rstrip("\r\n")
+
+    def _iter_csv_rows(self) -> Iterator[List[str]]:
+        lines = self._iter_raw_lines()
+        # Разделитель угадывается по первым CSV_SNIFF_SIZE символам (целыми строками), а не по одной строке
+        sample: List[str] = []
+        sample_size = 0
+        for line in lines:
+            sample.append(line)
+            sample_size += len(line)
+            if sample_size >= CSV_SNIFF_SIZE:
+                break
+        try:
+            dialect = Sniffer().sniff("".join(sample), delimiters=",;\t")
+        except CsvError:
+            dialect = "excel"
+        yield from csv_reader(chain(sample, lines), dialect)
+
+    def _iter_xlsx_batches(self) -> Iterator[List[Row]]:
+        try:
+            workbook = load_workbook(self._buffer, read_only=True, data_only=True)
+        except (BadZipFile, KeyError, ValueError) as e:
+            raise UploadError("Не удалось открыть таблицу: файл повреждён или это не .xlsx.") from e
+        try:
+            yield from _batched(workbook.active.iter_rows(values_only=True))
+        finally:
+            workbook.close()
+
+    # --- ЗАКРЫТИЕ ---
+
+    def close(self) -> None:
+        if self._buffer is not None:
+            self._buffer.close()
+            self._buffer = None
+
+    async def __aenter__(self) -> "Upload":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.close()
+
+
+def _batched(rows: Iterable[Row], size: int = ROWS_PER_BATCH) -> Iterator[List[Row]]:
+    batch: List[Row] = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def open_upload(message: Message, bot: Bot) -> Optional[Upload]:
+    """
+    Upload из текста или документа сообщения. Если файл прочитать нельзя, сам отвечает
+    пользователю и возвращает None (как и при пустом сообщении).
+    """
+    if message.document:
+        document = message.document
+        if document.file_size and document.file_size > TELEGRAM_DOWNLOAD_LIMIT:
+            await message.answer("Файл больше 20 МБ — Telegram не даёт ботам скачивать такие. Разделите его на части.")
+            return None
+
+        buffer = SpooledTemporaryFile(max_size=int(UPLOAD_SPOOL_MAX_MB * 1024 * 1024))
+        try:
+            file_info = await bot.get_file(document.file_id)
+            await bot.download_file(file_info.file_path, destination=buffer)
+            upload = Upload.from_file(buffer, document.file_name or "")
+        except UploadError as e:
+            buffer.close()
+            await message.answer(str(e))
+            return None
+        except Exception as e:
+            buffer.close()
+            logger.error(f"Ошибка чтения файла от {message.from_user.id}: {e}")
+            await message.answer("Произошла ошибка при чтении файла.")
+            return None
+
+        logger.info(
+            "Файл %r от %s: %s байт, формат %s%s",
+            upload.name, message.from_user.id, upload.size, upload.kind,
+            f", кодировка {upload.encoding}" if upload.encoding else ""
+        )
+        return upload
+
+    if message.text:
+        return Upload.from_text(message.text)
+
+    return None
+
+
+# --- ТРЕК-КОДЫ ИЗ ФАЙЛА ---
+
+async def iter_token_batches(
+        upload: Upload,
+        tokenizer: TrackCodeTokenizer,
+        batch_size: int = UPLOAD_BATCH_SIZE
+) -> AsyncIterator[List[TrackToken]]:
+    """Коды из загрузки пачками не меньше batch_size (последняя — остаток)."""
+    batch: List[TrackToken] = []
+    async for chunk in upload.iter_text():
+        batch.extend(tokenizer.feed(chunk))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+
+    batch.extend(tokenizer.close())
+    if batch:
+        yield batch
+
+
+async def read_track_codes(
+        upload: Upload,
+        kinds: Iterable[str] = ALL_KINDS,
+        per_line: bool = False
+) -> Tuple[List[str], TrackCodeTokenizer]:
+    """Все уникальные коды загрузки (когда нужен весь список сразу) и токенизатор с отказами."""
+    tokenizer = TrackCodeTokenizer(kinds, per_line)
+    codes: Dict[str, None] = {}
+    async for batch in iter_token_batches(upload, tokenizer):
+        codes.update(dict.fromkeys(token[0] for token in batch))
+    return list(codes), tokenizer
@@ -0,0 +1,170 @@
+from functools import lru_cache
+from json import dumps, loads
+from logging import getLogger
+from typing import Any, Dict, Mapping, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from database.db_fsm import get_fsm_record, save_fsm_state, save_fsm_data, purge_expired_fsm_records
+from filters_and_config import FSM_STORAGE, FSM_REDIS_URL, FSM_STATE_TTL
+
+logger = getLogger(__name__)
+
+# Время жизни состояния по группе состояний (секунды). Брошенные бланки и рассылки
+# не должны копиться в хранилище; остальные группы живут FSM_STATE_TTL.
+STATE_GROUP_TTLS = {
+    "OrderItemsStates": 24 * 3600,
+    "UserDataStates": 24 * 3600,
+    "BroadcastStates": 3600,
+}
+
+# Порядок полей товара в компактной записи бланка (см. order_maker/create_order.process_link).
+# Новые поля добавляются только в конец: старые записи короче и просто не содержат их.
+# Запись товара — значения первых len(запись) полей; товар с другим набором ключей хранится как есть.
+ORDER_ITEM_FIELDS = ("photo_id", "quantity", "track", "link", "photo_unique_id")
+_PACKED_ITEMS_KEY = "__items__"
+
+# Как часто (в записях) SQL-хранилище чистит истёкшие записи (первый раз — при первой записи)
+_SQL_PURGE_EVERY = 1000
+
+
+def get_state_ttl(state: Optional[str]) -> Optional[int]:
+    """Возвращает TTL для состояния вида 'Group:state' (None — без ограничения)."""
+    if not state:
+        return None
+    group = state.split(":", 1)[0]
+    return STATE_GROUP_TTLS.get(group, FSM_STATE_TTL)
+
+
+def _is_packable(item: Any) -> bool:
+    # Ключи — начало ORDER_ITEM_FIELDS: тогда распаковка вернёт ровно те же ключи
+    return isinstance(item, dict) and set(item) == set(ORDER_ITEM_FIELDS[:len(item)])
+
+
+def dumps_fsm_data(data: Mapping[str, Any]) -> str:
+    """
+    Компактная сериализация данных FSM: JSON без пробелов, а список товаров бланка
+    хранится как список кортежей без повторения имён полей.
+    """
+    packed = dict(data)
+    items = packed.get("items")
+
+    if items and all(_is_packable(item) for item in items):
+        packed[_PACKED_ITEMS_KEY] = [[item[field] for field in ORDER_ITEM_FIELDS[:len(item)]] for item in items]
+        del packed["items"]
+
+    return dumps(packed, ensure_ascii=False, separators=(",", ":"))
+
+
+def loads_fsm_data(raw: str) -> Dict[str, Any]:
+    """Обратная операция к dumps_fsm_data."""
+    data = loads(raw)
+    packed_items = data.pop(_PACKED_ITEMS_KEY, None)
+
+    if packed_items is not None:
+        data["items"] = [dict(zip(ORDER_ITEM_FIELDS, values)) for values in packed_items]
+
+    return data
+
+
+def _state_name(state: StateType) -> Optional[str]:
+    return state.state if isinstance(state, State) else state
+
+
+class SQLStorage(BaseStorage):
+    """FSM-хранилище в таблице fsm_storage основной БД (переживает перезапуск, общее для процессов)."""
+
+    def __init__(self):
+        self.key_builder = DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        self._writes = 0
+
+    async def _count_write(self) -> None:
+        self._writes += 1
+        if self._writes % _SQL_PURGE_EVERY == 1:
+            purged = await purge_expired_fsm_records()
+            logger.info("Удалено истёкших FSM-записей: %s", purged)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state_name = _state_name(state)
+        await save_fsm_state(self.key_builder.build(key), state_name, get_state_ttl(state_name))
+        await self._count_write()
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state, _ = await get_fsm_record(self.key_builder.build(key))
+        return state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        raw = dumps_fsm_data(data) if data else None
+        await save_fsm_data(self.key_builder.build(key), raw, FSM_STATE_TTL)
+        await self._count_write()
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, raw = await get_fsm_record(self.key_builder.build(key))
+        return loads_fsm_data(raw) if raw else {}
+
+    async def close(self) -> None:
+        pass
+
+
+@lru_cache(maxsize=None)
+def _ttl_redis_storage_class() -> type:
+    """
+    Хранилище на Redis-протоколе (Redis, KeyDB, Dragonfly и т.п. — в том числе локальный экземпляр).
+    Требует пакет redis. TTL состояния применяется и к данным того же ключа.
+    """
+    from aiogram.fsm.storage.redis import RedisStorage
+
+    class TTLRedisStorage(RedisStorage):
+        async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+            state_name = _state_name(state)
+            ttl = get_state_ttl(state_name)
+
+            state_key = self.key_builder.build(key, "state")
+            if state_name is None:
+                await self.redis.delete(state_key)
+                return
+
+            await self.redis.set(state_key, state_name, ex=ttl)
+            if ttl:
+                await self.redis.expire(self.key_builder.build(key, "data"), ttl)
+
+        async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+            data_key = self.key_builder.build(key, "data")
+            if not data:
+                await self.redis.delete(data_key)
+                return
+
+            ttl = get_state_ttl(await self.get_state(key)) or FSM_STATE_TTL
+            await self.redis.set(data_key, self.json_dumps(data), ex=ttl)
+
+    return TTLRedisStorage
+
+
+def _create_redis_storage(redis: Any = None) -> BaseStorage:
+    """Redis-хранилище по FSM_REDIS_URL; redis — готовый клиент (например, локальная подмена в тестах)."""
+    options = dict(
+        key_builder=DefaultKeyBuilder(with_bot_id=True, with_destiny=True),
+        json_dumps=dumps_fsm_data,
+        json_loads=loads_fsm_data,
+    )
+    storage_class = _ttl_redis_storage_class()
+    if redis is not None:
+        return storage_class(redis, **options)
+    return storage_class.from_url(FSM_REDIS_URL, **options)
+
+
+def create_fsm_storage() -> BaseStorage:
+    """Создаёт FSM-хранилище по настройке FSM_STORAGE: memory, sql или redis."""
+    if FSM_STORAGE == "sql":
+        storage = SQLStorage()
+    elif FSM_STORAGE == "redis":
+        storage = _create_redis_storage()
+    else:
+        if FSM_STORAGE != "memory":
+            logger.warning("Неизвестный FSM_STORAGE=%s, используется memory.", FSM_STORAGE)
+        storage = MemoryStorage()
+
+    logger.info("FSM-хранилище: %s", type(storage).__name__)
+    return storage
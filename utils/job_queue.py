@@ -0,0 +1,242 @@
+from asyncio import Event, Task, create_task, gather, get_running_loop, wait_for, TimeoutError
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from enum import IntEnum
+from functools import partial
+from logging import getLogger
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from aiogram import Bot
+
+from database.db_jobs import (
+    create_job,
+    has_active_job,
+    get_pending_jobs,
+    mark_jobs_running,
+    finish_job,
+    requeue_interrupted_jobs,
+    purge_finished_jobs,
+)
+from filters_and_config import JOB_WORKERS, JOB_POLL_INTERVAL, JOB_RETENTION_DAYS
+from utils.sql_profiler import sql_profiler
+
+logger = getLogger(__name__)
+
+JobHandler = Callable[[Bot, Optional[int], Dict[str, Any]], Awaitable[None]]
+
+
+class JobPriority(IntEnum):
+    """
+    Приоритет очереди: меньше — раньше. Рассылок здесь нет: они идут часами и заняли бы место
+    в пуле, поэтому у них свой движок (utils/broadcast_engine.py) со своим лимитом отправки.
+    """
+    INTERACTIVE = 0
+    EXPORT = 1
+
+
+@dataclass(frozen=True)
+class JobType:
+    name: str
+    handler: JobHandler
+    priority: JobPriority
+    concurrency: int
+    failure_text: str
+
+
+class JobQueue:
+    """
+    Локальная очередь тяжёлых задач (бланки, выгрузки). Хендлер ставит задачу и сразу отвечает,
+    результат задача сама отправляет в чат.
+
+    Задачи хранятся в таблице background_jobs и переживают перезапуск. Одновременно выполняется
+    не больше workers задач и не больше concurrency задач каждого типа; свободные места получают
+    задачи с более высоким приоритетом. Синхронная работа задач идёт в собственном пуле потоков,
+    а не в executor по умолчанию, который нужен хендлерам.
+    """
+
+    def __init__(
+        self,
+        workers: int = JOB_WORKERS,
+        poll_interval: float = JOB_POLL_INTERVAL,
+        max_attempts: int = 3
+    ):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+
+        self._types: Dict[str, JobType] = {}
+        self._bot: Optional[Bot] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._wakeup = Event()
+        self._runner: Optional[Task] = None
+        self._running: Dict[int, Task] = {}
+        self._running_by_type: Dict[str, int] = {}
+
+    def register(
+        self,
+        name: str,
+        priority: JobPriority,
+        concurrency: int = 1,
+        failure_text: str = "⚠️ Не удалось выполнить задачу. Попробуйте ещё раз позже."
+    ) -> Callable[[JobHandler], JobHandler]:
+        """Декоратор обработчика задач типа name: async def handler(bot, chat_id, payload)."""
+        def decorator(handler: JobHandler) -> JobHandler:
+            self._types[name] = JobType(name, handler, priority, concurrency, failure_text)
+            return handler
+        return decorator
+
+    async def enqueue(
+        self,
+        name: str,
+        chat_id: Optional[int],
+        payload: Optional[Dict[str, Any]] = None,
+        unique: bool = False
+    ) -> Optional[int]:
+        """
+        Ставит задачу в очередь и возвращает её id.
+        unique=True — не ставить, если у чата уже есть невыполненная задача этого типа (тогда None).
+        """
+        job_type = self._types[name]
+        if unique and chat_id is not None and await has_active_job(name, chat_id):
+            return None
+
+        job_id = await create_job(name, int(job_type.priority), chat_id, payload or {})
+        logger.info("Задача %s (%s) поставлена в очередь. chat_id=%s", job_id, name, chat_id)
+        # В воркерах (BOT_WORKERS > 0) очередь не запущена — задачу заберёт входной процесс по опросу
+        self._wakeup.set()
+        return job_id
+
+    async def run_blocking(self, func: Callable, *args: Any, **kwargs: Any) -> Any:
+        """Выполняет синхронную функцию в пуле потоков очереди."""
+        loop = get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(func, *args, **kwargs))
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="jobs")
+        return self._executor
+
+    async def start(self, bot: Bot) -> None:
+        """Возвращает в очередь прерванные задачи и запускает выборку."""
+        if self._runner:
+            return
+
+        self._bot = bot
+        requeued, failed = await requeue_interrupted_jobs(self.max_attempts)
+        if requeued:
+            logger.info("Возвращено в очередь прерванных задач: %s", requeued)
+        for job in failed:
+            await self._notify_failure(job["job_type"], job["chat_id"])
+
+        purged = await purge_finished_jobs(JOB_RETENTION_DAYS)
+        if purged:
+            logger.info("Удалено завершённых задач: %s", purged)
+
+        self._runner = create_task(self._run())
+        logger.info("Очередь задач запущена. workers=%s types=%s", self.workers, list(self._types))
+
+    async def stop(self) -> None:
+        """Останавливает очередь. Прерванные задачи выполнятся заново при следующем запуске."""
+        tasks = ([self._runner] if self._runner else []) + list(self._running.values())
+        for task in tasks:
+            task.cancel()
+        await gather(*tasks, return_exceptions=True)
+
+        self._runner = None
+        self._running.clear()
+        self._running_by_type.clear()
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        logger.info("Очередь задач остановлена.")
+
+    @property
+    def started(self) -> bool:
+        """Очередь выполняет задачи в этом процессе (в воркерах при BOT_WORKERS > 0 — нет)."""
+        return self._runner is not None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"running": dict(self._running_by_type), "workers": self.workers}
+
+    # --- ВНУТРЕННИЕ ЗАДАЧИ ---
+
+    def _free_types(self) -> List[str]:
+        return [
+            name for name, job_type in self._types.items()
+            if self._running_by_type.get(name, 0) < job_type.concurrency
+        ]
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            started = 0
+
+            try:
+                started = await self._start_pending()
+            except Exception as e:
+                logger.error("Ошибка выборки задач из очереди: %s", e, exc_info=True)
+
+            if not started:
+                try:
+                    await wait_for(self._wakeup.wait(), self.poll_interval)
+                except TimeoutError:
+                    pass
+
+    async def _start_pending(self) -> int:
+        """Забирает из БД столько задач, сколько есть свободных мест. Возвращает число запущенных."""
+        slots = self.workers - len(self._running)
+        if slots <= 0:
+            return 0
+
+        jobs = await get_pending_jobs(self._free_types(), slots)
+
+        # Задачи идут по приоритету; тип, у которого кончились места, пропускается
+        taken = []
+        busy = dict(self._running_by_type)
+        for job in jobs:
+            job_type = self._types[job["job_type"]]
+            if busy.get(job_type.name, 0) >= job_type.concurrency:
+                continue
+            busy[job_type.name] = busy.get(job_type.name, 0) + 1
+            taken.append(job)
+
+        await mark_jobs_running([job["id"] for job in taken])
+        self._running_by_type = busy
+        for job in taken:
+            task = create_task(self._execute(job))
+            self._running[job["id"]] = task
+            task.add_done_callback(partial(self._on_done, job))
+
+        return len(taken)
+
+    def _on_done(self, job: Dict[str, Any], task: Task) -> None:
+        self._running.pop(job["id"], None)
+        self._running_by_type[job["job_type"]] -= 1
+        self._wakeup.set()
+
+    async def _execute(self, job: Dict[str, Any]) -> None:
+        job_type = self._types[job["job_type"]]
+        try:
+            with sql_profiler.track(f"job:{job_type.name}"):
+                await job_type.handler(self._bot, job["chat_id"], job["payload"])
+        except Exception as e:
+            logger.error("Задача %s (%s) завершилась ошибкой: %s", job["id"], job_type.name, e, exc_info=True)
+            await finish_job(job["id"], "failed", f"{type(e).__name__}: {e}")
+            await self._notify_failure(job_type.name, job["chat_id"])
+            return
+
+        await finish_job(job["id"], "done")
+        logger.info("Задача %s (%s) выполнена.", job["id"], job_type.name)
+
+    async def _notify_failure(self, name: str, chat_id: Optional[int]) -> None:
+        job_type = self._types.get(name)
+        if not chat_id or not job_type:
+            return
+        try:
+            await self._bot.send_message(chat_id, job_type.failure_text)
+        except Exception as e:
+            logger.warning("Не удалось сообщить чату %s об ошибке задачи %s: %s", chat_id, name, e)
+
+
+job_queue = JobQueue()
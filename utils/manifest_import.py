@@ -0,0 +1,295 @@
+from collections import Counter
+from datetime import date, datetime
+from logging import getLogger
+from re import compile as re_compile, IGNORECASE
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Set, Tuple
+
+from openpyxl.utils import column_index_from_string
+from openpyxl.utils.datetime import from_excel
+
+from database.db_track_admin import TrackCodeRow
+from filters_and_config import UPLOAD_BATCH_SIZE
+from utils.file_intake import Upload, UploadError, Row, cell_text
+from utils.track_code_tokenizer import FS_CODE_PATTERN, MAX_CODE_LENGTH, TRACK_CODE_PATTERN, RejectLog
+
+logger = getLogger(__name__)
+
+CODE = "code"
+INTERNAL_ID = "internal_id"
+WEIGHT = "weight"
+DATE = "date"
+
+# Заголовки колонок после normalize_header
+COLUMN_ALIASES: Dict[str, Set[str]] = {
+    CODE: {"трек", "трек код", "трекномер", "трек номер", "код", "код товара", "track", "track code",
+           "tracking", "tracking number", "tracking code"},
+    INTERNAL_ID: {"id", "fs", "fs id", "id клиента", "код клиента", "клиент", "внутренний id", "client",
+                  "client id", "customer id"},
+    WEIGHT: {"вес", "вес кг", "weight", "weight kg", "кг", "kg"},
+    DATE: {"дата", "дата поступления", "дата отправки", "дата прибытия", "date", "arrival date",
+           "shipment date"},
+}
+# Имена полей в подписи к файлу: «код=B id=A вес=D дата=E»
+FIELD_NAMES = {
+    "code": CODE, "код": CODE, "трек": CODE,
+    "id": INTERNAL_ID, "fs": INTERNAL_ID, "клиент": INTERNAL_ID,
+    "weight": WEIGHT, "вес": WEIGHT,
+    "date": DATE, "дата": DATE,
+}
+# Сколько первых строк могут быть заголовком (над ним бывают название склада, дата выгрузки)
+HEADER_SEARCH_ROWS = 20
+DATE_FORMATS = ("%d.%m.%Y", "%d.%m.%Y %H:%M", "%d.%m.%Y %H:%M:%S", "%Y-%m-%d", "%Y-%m-%d %H:%M:%S",
+                "%Y-%m-%dT%H:%M:%S", "%d/%m/%Y", "%d.%m.%y")
+
+_CODE_RE = re_compile(rf"{FS_CODE_PATTERN}|{TRACK_CODE_PATTERN}")
+_HEADER_JUNK_RE = re_compile(r"[^0-9a-zа-я]+")
+_MAPPING_RE = re_compile(r"([a-zа-яё]+)\s*=\s*([a-z]{1,3}|[0-9]{1,3})\b", IGNORECASE)
+_INTERNAL_ID_RE = re_compile(r"(?:FS)?\s*0*([0-9]{1,9})", IGNORECASE)
+
+
+def _looks_like_code(value: Any) -> bool:
+    """Для поиска данных без заголовка: слово без цифр («MANIFEST») и дата 20251017 — строка названия."""
+    text = cell_text(value).upper().replace(" ", "")
+    if not _CODE_RE.fullmatch(text) or not any(char.isdigit() for char in text):
+        return False
+    if len(text) == 8 and text.isdigit():
+        try:
+            datetime.strptime(text, "%Y%m%d")
+            return False
+        except ValueError:
+            pass
+    return True
+
+
+def normalize_header(value: Any) -> str:
+    return " ".join(_HEADER_JUNK_RE.sub(" ", cell_text(value).lower().replace("ё", "е")).split())
+
+
+def detect_header(row: Row) -> Dict[str, int]:
+    """Номера колонок (с нуля) по заголовкам строки; пустой словарь — строка не заголовок."""
+    mapping: Dict[str, int] = {}
+    for index, value in enumerate(row):
+        header = normalize_header(value)
+        for field, aliases in COLUMN_ALIASES.items():
+            if header in aliases and field not in mapping:
+                mapping[field] = index
+                break
+    return mapping
+
+
+def parse_column_mapping(text: Optional[str]) -> Optional[Dict[str, int]]:
+    """
+    Явное сопоставление колонок из подписи к файлу: «код=B id=A вес=D дата=E» (буквы Excel или
+    номера с единицы). None — подписи с сопоставлением нет, колонки ищутся по заголовку.
+    """
+    mapping: Dict[str, int] = {}
+    for name, column in _MAPPING_RE.findall(text or ""):
+        field = FIELD_NAMES.get(name.lower())
+        if field is None:
+            raise UploadError(f"Неизвестная колонка «{name}» в подписи. Можно: код, id, вес, дата.")
+        index = int(column) - 1 if column.isdigit() else column_index_from_string(column.upper()) - 1
+        if index < 0:
+            raise UploadError(f"Колонки нумеруются с 1: «{name}={column}».")
+        mapping[field] = index
+
+    if mapping and CODE not in mapping:
+        raise UploadError("В подписи не указана колонка с трек-кодом (например, «код=B»).")
+    return mapping or None
+
+
+# --- ЗНАЧЕНИЯ ЯЧЕЕК (ValueError — значение есть, но неверное) ---
+
+def parse_internal_id(value: Any) -> Optional[int]:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        if value != int(value) or value <= 0:
+            raise ValueError(value)
+        return int(value)
+    text = cell_text(value)
+    if not text:
+        return None
+    match = _INTERNAL_ID_RE.fullmatch(text)
+    if not match or not int(match.group(1)):
+        raise ValueError(text)
+    return int(match.group(1))
+
+
+def parse_weight(value: Any) -> Optional[float]:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        weight = float(value)
+    else:
+        text = cell_text(value).lower().replace(",", ".").removesuffix("кг").removesuffix("kg").strip()
+        if not text:
+            return None
+        weight = float(text)
+    if weight < 0:
+        raise ValueError(value)
+    return weight
+
+
+def parse_date(value: Any) -> Optional[datetime]:
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime.combine(value, datetime.min.time())
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        # Дата без формата ячейки приходит из Excel числом дней
+        if not 1 <= value < 100_000:
+            raise ValueError(value)
+        return from_excel(value)
+
+    text = cell_text(value)
+    if not text:
+        return None
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format)
+        except ValueError:
+            continue
+    raise ValueError(text)
+
+
+class ManifestParser(RejectLog):
+    """
+    Разбор строк манифеста склада (XLSX/CSV) в строки для add_or_update_track_codes_list:
+    (код, внутренний ID, вес, дата статуса).
+
+    Колонки берутся из mapping (подпись к файлу) или ищутся по заголовку в первых HEADER_SEARCH_ROWS
+    строках; пока заголовок не найден, строки копятся и данными не считаются. Без заголовка трек-кодом
+    считается колонка, где чаще всего встречаются похожие на код значения, и данные начинаются с первой
+    такой строки — строки над ней (название, дата выгрузки) пропускаются. ID клиента — из своей колонки
+    при любом статусе, для прибывших без колонки — из FS-кода; прибывший код без ID отклоняется.
+    Строки с неверными значениями отклоняются целиком (rejected/rejects), пустые пропускаются.
+    После последней пачки нужен finish() — файл может быть короче HEADER_SEARCH_ROWS строк.
+    """
+
+    def __init__(self, status: str, mapping: Optional[Dict[str, int]] = None):
+        super().__init__()
+        self.status = status
+        self.mapping = mapping
+        self.rows_read = 0
+        # Заголовок в явном сопоставлении тоже бывает — его строку не считаем ошибкой
+        self._header_expected = True
+        # Непустые строки до заголовка: (номер строки, строка)
+        self._pending: List[Tuple[int, Row]] = []
+
+    def parse(self, rows: Sequence[Row]) -> List[TrackCodeRow]:
+        parsed: List[TrackCodeRow] = []
+        for row in rows:
+            self.rows_read += 1
+            if not any(cell_text(value) for value in row):
+                continue
+
+            if self._header_expected:
+                if self._take_header(row):
+                    # Строки над заголовком — не данные
+                    self._pending.clear()
+                    continue
+                self._pending.append((self.rows_read, row))
+                if self.rows_read >= HEADER_SEARCH_ROWS:
+                    parsed.extend(self._release_pending())
+                continue
+
+            item = self._parse_row(row, self.rows_read)
+            if item:
+                parsed.append(item)
+        return parsed
+
+    def finish(self) -> List[TrackCodeRow]:
+        """Строки, отложенные в поисках заголовка, если файл закончился раньше HEADER_SEARCH_ROWS строк."""
+        return self._release_pending() if self._header_expected and self._pending else []
+
+    def _take_header(self, row: Row) -> bool:
+        header = detect_header(row)
+        if not header:
+            return False
+
+        if self.mapping is None:
+            if CODE not in header:
+                raise UploadError(
+                    "В заголовке таблицы нет колонки с трек-кодом. Назовите её «Трек-код» или укажите "
+                    "колонки в подписи к файлу: «код=B id=A вес=D дата=E»."
+                )
+            self.mapping = header
+            logger.info("Колонки манифеста по заголовку: %s", header)
+        self._header_expected = False
+        return True
+
+    def _release_pending(self) -> List[TrackCodeRow]:
+        """Заголовка нет: данные — с первой строки, где в колонке кода похожее на код значение."""
+        pending, self._pending = self._pending, []
+        self._header_expected = False
+
+        if self.mapping is None:
+            votes = Counter(
+                index for _, row in pending for index, value in enumerate(row) if _looks_like_code(value)
+            )
+            if not votes:
+                raise UploadError(
+                    f"В первых {HEADER_SEARCH_ROWS} строках нет ни заголовка, ни трек-кодов. "
+                    "Укажите колонки в подписи к файлу: «код=B id=A вес=D дата=E»."
+                )
+            code_column = votes.most_common(1)[0][0]
+            self.mapping = {CODE: code_column}
+            logger.info("Заголовок манифеста не найден, трек-коды в колонке %s", code_column + 1)
+
+        first = next((i for i, (_, row) in enumerate(pending) if _looks_like_code(self._cell(row, CODE))), None)
+        if first is None:
+            # Колонки указаны в подписи, но кодов в них нет — пусть админ увидит, что там
+            first = 0
+        elif first:
+            logger.info("Пропущено строк над данными манифеста: %s", first)
+
+        parsed: List[TrackCodeRow] = []
+        for number, row in pending[first:]:
+            item = self._parse_row(row, number)
+            if item:
+                parsed.append(item)
+        return parsed
+
+    def _cell(self, row: Row, field: str) -> Any:
+        index = self.mapping.get(field)
+        return row[index] if index is not None and index < len(row) else None
+
+    def _parse_row(self, row: Row, number: int) -> Optional[TrackCodeRow]:
+        code = cell_text(self._cell(row, CODE)).upper().replace(" ", "")
+        if len(code) > MAX_CODE_LENGTH or not _CODE_RE.fullmatch(code):
+            self._reject(f"стр. {number}: трек-код «{code}»" if code else f"стр. {number}: нет трек-кода")
+            return None
+
+        field = INTERNAL_ID
+        try:
+            internal_id = parse_internal_id(self._cell(row, INTERNAL_ID))
+            field = WEIGHT
+            weight = parse_weight(self._cell(row, WEIGHT))
+            field = DATE
+            status_at = parse_date(self._cell(row, DATE))
+        except (ValueError, OverflowError):
+            titles = {INTERNAL_ID: "ID клиента", WEIGHT: "вес", DATE: "дата"}
+            self._reject(f"стр. {number}: {code} — {titles[field]} «{cell_text(self._cell(row, field))}»")
+            return None
+
+        if self.status == "arrived" and internal_id is None:
+            if "-" not in code:
+                self._reject(f"стр. {number}: {code} — нет ID клиента")
+                return None
+            internal_id = int(code[2:6])
+
+        return code, internal_id, weight, status_at
+
+
+async def iter_manifest_batches(
+        upload: Upload,
+        parser: ManifestParser,
+        batch_size: int = UPLOAD_BATCH_SIZE
+) -> AsyncIterator[List[TrackCodeRow]]:
+    """Проверенные строки манифеста пачками не меньше batch_size (последняя — остаток)."""
+    batch: List[TrackCodeRow] = []
+    async for rows in upload.iter_rows():
+        batch.extend(parser.parse(rows))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+
+    batch.extend(parser.finish())
+    if batch:
+        yield batch
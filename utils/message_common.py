@@ -4,33 +4,24 @@ from typing import Optional, Union
 from aiogram import Bot
 from aiogram.types import Message, CallbackQuery
 
+from utils.file_intake import open_upload
+
 logger = getLogger(__name__)
 
 MAX_MESSAGE_LENGTH = 4096
 
 
 async def extract_text_from_message(message: Message, bot: Bot) -> Optional[str]:
-    if message.document:
-        try:
-            file_info = await bot.get_file(message.document.file_id)
-            downloaded_file = await bot.download_file(file_info.file_path)
-
-            # Читаем и декодируем байты
-            return downloaded_file.read().decode('utf-8').strip()
-
-        except UnicodeDecodeError:
-            logger.warning(f"Файл от {message.from_user.id} не UTF-8")
-            await message.answer("Ошибка: Файл должен быть в кодировке UTF-8.")
-            return None
-        except Exception as e:
-            logger.error(f"Ошибка чтения файла от {message.from_user.id}: {e}")
-            await message.answer("Произошла ошибка при чтении файла.")
-            return None
-
-    elif message.text:
-        return message.text.strip()
-
-    return None
+    """
+    Весь текст сообщения или документа одной строкой — для коротких списков.
+    Большие файлы админки читаются потоком через utils.file_intake.open_upload.
+    """
+    upload = await open_upload(message, bot)
+    if not upload:
+        return None
+
+    async with upload:
+        return (await upload.read_text()).strip()
 
 
 async def send_chunked_response(target: Union[Message, CallbackQuery], text: str):
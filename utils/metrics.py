@@ -0,0 +1,341 @@
+from bisect import bisect_left
+from contextvars import ContextVar
+from dataclasses import dataclass
+from logging import getLogger
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from aiohttp import web
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+logger = getLogger(__name__)
+
+# Границы корзин гистограмм (секунды) — как у клиентов Prometheus по умолчанию, плюс длинный хвост
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Число запросов к БД за один апдейт
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+# Ожидание соединения из пула: обычно доли миллисекунды, при нехватке — секунды
+WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами: счётчики корзин, сумма и число наблюдений."""
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Оценка квантиля линейной интерполяцией внутри корзины (как histogram_quantile)."""
+        if not self.count:
+            return 0.0
+
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index]
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+@dataclass
+class MetricFamily:
+    name: str
+    kind: str
+    help: str
+
+
+class MetricsRegistry:
+    """Счётчики, гистограммы и текущие значения (gauge) процесса с метками; выгружаются в формате Prometheus."""
+
+    def __init__(self):
+        self.families: Dict[str, MetricFamily] = {}
+        self.histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self.counters: Dict[str, Dict[Labels, float]] = {}
+        self.gauges: Dict[str, Dict[Labels, float]] = {}
+        self._buckets: Dict[str, Tuple[float, ...]] = {}
+
+    def histogram(self, name: str, help_text: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self.families[name] = MetricFamily(name, "histogram", help_text)
+        self.histograms.setdefault(name, {})
+        self._buckets[name] = buckets
+
+    def counter(self, name: str, help_text: str) -> None:
+        self.families[name] = MetricFamily(name, "counter", help_text)
+        self.counters.setdefault(name, {})
+
+    def gauge(self, name: str, help_text: str) -> None:
+        self.families[name] = MetricFamily(name, "gauge", help_text)
+        self.gauges.setdefault(name, {})
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        series = self.histograms[name]
+        key = tuple(sorted(labels.items()))
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = Histogram(self._buckets[name])
+        histogram.observe(value)
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        series = self.counters[name]
+        key = tuple(sorted(labels.items()))
+        series[key] = series.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels: str) -> None:
+        self.gauges[name][tuple(sorted(labels.items()))] = value
+
+    def series(self, name: str) -> Iterable[Tuple[Dict[str, str], Histogram]]:
+        for labels, histogram in self.histograms.get(name, {}).items():
+            yield dict(labels), histogram
+
+    def counter_value(self, name: str, **labels: str) -> float:
+        return self.counters.get(name, {}).get(tuple(sorted(labels.items())), 0)
+
+    def gauge_value(self, name: str, **labels: str) -> float:
+        return self.gauges.get(name, {}).get(tuple(sorted(labels.items())), 0)
+
+    def reset(self) -> None:
+        """Обнуляет счётчики и гистограммы; текущие значения (gauge) описывают состояние и остаются."""
+        for series in self.histograms.values():
+            series.clear()
+        for series in self.counters.values():
+            series.clear()
+
+    def render_prometheus(self) -> str:
+        lines: List[str] = []
+        for family in self.families.values():
+            lines.append(f"# HELP {family.name} {family.help}")
+            lines.append(f"# TYPE {family.name} {family.kind}")
+
+            if family.kind in ("counter", "gauge"):
+                values = self.counters if family.kind == "counter" else self.gauges
+                for labels, value in values[family.name].items():
+                    lines.append(f"{family.name}{_format_labels(labels)} {value:g}")
+                continue
+
+            for labels, histogram in self.histograms[family.name].items():
+                cumulative = 0
+                for bound, bucket_count in zip(histogram.buckets, histogram.counts):
+                    cumulative += bucket_count
+                    le = labels + (("le", f"{bound:g}"),)
+                    lines.append(f"{family.name}_bucket{_format_labels(le)} {cumulative}")
+                le = labels + (("le", "+Inf"),)
+                lines.append(f"{family.name}_bucket{_format_labels(le)} {histogram.count}")
+                lines.append(f"{family.name}_sum{_format_labels(labels)} {histogram.total:.6f}")
+                lines.append(f"{family.name}_count{_format_labels(labels)} {histogram.count}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = []
+    for key, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        escaped.append(f'{key}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+metrics = MetricsRegistry()
+metrics.histogram("bot_update_seconds", "Время обработки апдейта целиком")
+metrics.histogram("bot_handler_seconds", "Время работы хендлера (с внутренними middleware)")
+metrics.counter("bot_handler_errors_total", "Исключения, вылетевшие из хендлера")
+metrics.histogram("bot_update_db_queries", "Число SQL-запросов за апдейт", COUNT_BUCKETS)
+metrics.histogram("bot_update_db_seconds", "Суммарное время SQL-запросов за апдейт")
+metrics.histogram("bot_update_api_seconds", "Суммарное время запросов к Bot API за апдейт")
+metrics.histogram("bot_db_query_seconds", "Время одного SQL-запроса")
+metrics.histogram("bot_api_request_seconds", "Время одного запроса к Bot API")
+metrics.counter("bot_api_errors_total", "Запросы к Bot API, завершившиеся ошибкой")
+metrics.histogram("bot_db_pool_wait_seconds", "Ожидание соединения из пула БД", WAIT_BUCKETS)
+metrics.counter("bot_db_pool_slow_checkouts_total", "Ожидания соединения дольше DB_POOL_WAIT_WARNING")
+metrics.counter("bot_db_pool_timeouts_total", "Соединение из пула не получено за DB_POOL_TIMEOUT")
+metrics.gauge("bot_db_pool_in_use", "Соединений БД выдано сейчас")
+metrics.gauge("bot_db_pool_in_use_peak", "Максимум одновременно выданных соединений с запуска")
+metrics.gauge("bot_db_pool_capacity", "Предел соединений пула (pool_size + max_overflow)")
+
+
+def format_metrics_summary(top: int = 10) -> str:
+    """Сводка метрик процесса для админа: апдейты, самые тяжёлые хендлеры, БД и Bot API."""
+    def ms(seconds: float) -> str:
+        return f"{seconds * 1000:.0f}"
+
+    lines = ["📈 <b>Метрики процесса</b> (p50 / p95 / p99, мс)"]
+
+    updates = sorted(metrics.series("bot_update_seconds"), key=lambda item: -item[1].count)
+    lines.append("\n<b>Апдейты</b>")
+    if not updates:
+        lines.append("пока нет данных")
+    for labels, h in updates:
+        lines.append(
+            f"{labels.get('event_type')}: {h.count} шт., "
+            f"{ms(h.quantile(0.5))} / {ms(h.quantile(0.95))} / {ms(h.quantile(0.99))}"
+        )
+
+    handlers = sorted(metrics.series("bot_handler_seconds"), key=lambda item: -item[1].total)[:top]
+    if handlers:
+        lines.append(f"\n<b>Хендлеры</b> (топ-{top} по суммарному времени)")
+    for labels, h in handlers:
+        errors = metrics.counter_value("bot_handler_errors_total", handler=labels["handler"])
+        lines.append(
+            f"<code>{labels['handler']}</code>: {h.count} шт., "
+            f"{ms(h.quantile(0.5))} / {ms(h.quantile(0.95))} / {ms(h.quantile(0.99))}"
+            + (f", ошибок {errors:g}" if errors else "")
+        )
+
+    for _, queries in metrics.series("bot_update_db_queries"):
+        db_time = next((h for _, h in metrics.series("bot_update_db_seconds")), None)
+        lines.append(
+            f"\n<b>БД</b>: запросов на апдейт в среднем {queries.mean:.1f}, p95 {queries.quantile(0.95):.0f}"
+            + (f"; время на апдейт p95 {ms(db_time.quantile(0.95))} мс" if db_time else "")
+        )
+    for _, h in metrics.series("bot_db_query_seconds"):
+        lines.append(f"Один запрос: {h.count} шт., {ms(h.quantile(0.5))} / {ms(h.quantile(0.95))} / {ms(h.quantile(0.99))}")
+    capacity = metrics.gauge_value("bot_db_pool_capacity")
+    if capacity:
+        wait = next((h for _, h in metrics.series("bot_db_pool_wait_seconds")), None)
+        lines.append(
+            f"Пул: занято {metrics.gauge_value('bot_db_pool_in_use'):g} из {capacity:g}, "
+            f"пик {metrics.gauge_value('bot_db_pool_in_use_peak'):g}"
+            + (f"; ожидание соединения p95 {ms(wait.quantile(0.95))} / p99 {ms(wait.quantile(0.99))} мс" if wait else "")
+            + f"; долгих ожиданий {metrics.counter_value('bot_db_pool_slow_checkouts_total'):g}, "
+            f"таймаутов {metrics.counter_value('bot_db_pool_timeouts_total'):g}"
+        )
+
+    methods = sorted(metrics.series("bot_api_request_seconds"), key=lambda item: -item[1].count)[:top]
+    if methods:
+        lines.append("\n<b>Bot API</b>")
+    for labels, h in methods:
+        errors = metrics.counter_value("bot_api_errors_total", method=labels["method"])
+        lines.append(
+            f"{labels['method']}: {h.count} шт., "
+            f"{ms(h.quantile(0.5))} / {ms(h.quantile(0.95))} / {ms(h.quantile(0.99))}"
+            + (f", ошибок {errors:g}" if errors else "")
+        )
+
+    return "\n".join(lines)
+
+
+# --- КОНТЕКСТ АПДЕЙТА ---
+
+@dataclass
+class UpdateStats:
+    """Что потратил текущий апдейт: запросы к БД и к Bot API."""
+    db_queries: int = 0
+    db_seconds: float = 0.0
+    api_calls: int = 0
+    api_seconds: float = 0.0
+
+
+current_update_stats: ContextVar[Optional[UpdateStats]] = ContextVar("current_update_stats", default=None)
+
+
+# --- SQLALCHEMY ---
+
+# Время старта хранится на контексте выполнения: он живёт один запрос, поэтому запрос с ошибкой
+# (after_cursor_execute не вызывается) ничего не оставляет на соединении из пула
+_QUERY_START_ATTR = "_metrics_query_start"
+
+# Подписчики на длительность запросов (statement, parameters, seconds), например SQL-профайлер
+QueryObserver = Callable[[str, Any, float], None]
+_query_observers: List[QueryObserver] = []
+
+
+def add_query_observer(observer: QueryObserver) -> None:
+    """Подписывает observer на каждый выполненный запрос — общий замер с метриками, без своих событий."""
+    if observer not in _query_observers:
+        _query_observers.append(observer)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        setattr(context, _QUERY_START_ATTR, perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, _QUERY_START_ATTR, None)
+    if started is None:
+        return
+    elapsed = perf_counter() - started
+
+    metrics.observe("bot_db_query_seconds", elapsed)
+    stats = current_update_stats.get()
+    if stats is not None:
+        stats.db_queries += 1
+        stats.db_seconds += elapsed
+
+    for observer in _query_observers:
+        observer(statement, parameters, elapsed)
+
+
+def _handle_error(exception_context) -> None:
+    context = exception_context.execution_context
+    if context is not None and hasattr(context, _QUERY_START_ATTR):
+        delattr(context, _QUERY_START_ATTR)
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """Подписывается на события курсора движка. Async-движок вызывает их в контексте задачи апдейта."""
+    sync_engine = engine.sync_engine
+    if event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _handle_error)
+
+
+# --- HTTP-ЭНДПОИНТ ---
+
+class MetricsServer:
+    """Локальный HTTP-сервер с /metrics в текстовом формате Prometheus."""
+
+    def __init__(self):
+        self._runner: Optional[web.AppRunner] = None
+
+    async def start(self, host: str, port: int) -> None:
+        if self._runner or not port:
+            return
+
+        async def handle_metrics(request: web.Request) -> web.Response:
+            return web.Response(text=metrics.render_prometheus(), content_type="text/plain", charset="utf-8")
+
+        app = web.Application()
+        app.router.add_get("/metrics", handle_metrics)
+        runner = web.AppRunner(app, handle_signals=False, access_log=None)
+        await runner.setup()
+        try:
+            await web.TCPSite(runner, host, port).start()
+        except OSError as e:
+            logger.error("Не удалось запустить эндпоинт метрик на %s:%s: %s", host, port, e)
+            await runner.cleanup()
+            return
+
+        self._runner = runner
+        logger.info("Метрики Prometheus: http://%s:%s/metrics", host, port)
+
+    async def stop(self) -> None:
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+metrics_server = MetricsServer()
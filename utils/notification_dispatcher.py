@@ -0,0 +1,211 @@
+from asyncio import Queue, Event, Task, create_task, gather, sleep, wait_for, TimeoutError
+from logging import getLogger
+from random import uniform
+from typing import Optional, List, Dict, Any, Set
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+
+from database.db_notifications import (
+    get_pending_notifications,
+    delete_sent_notifications,
+    mark_notification_failed,
+    purge_failed_notifications,
+)
+from database.db_broadcasts import mark_users_blocked
+from database.db_track_admin import unbind_track_codes
+from filters_and_config import NOTIFICATION_RETENTION_DAYS
+from utils.rate_limit import PerKeyRateLimiter, telegram_send_bucket, TELEGRAM_PER_CHAT_INTERVAL
+
+logger = getLogger(__name__)
+
+
+class NotificationDispatcher:
+    """
+    Доставляет уведомления из таблицы notification_outbox.
+
+    Feeder читает outbox пачками и кладёт строки в ограниченную очередь, пул воркеров
+    отправляет их с учётом общего и per-chat лимитов Telegram. Доставленные строки удаляются
+    пачками, поэтому после перезапуска бот дошлёт всё, что осталось в outbox.
+
+    Каждый проход feeder'а читает все pending-строки заново, с начала таблицы: id выдаются при
+    INSERT, а не при COMMIT, и параллельная загрузка может зафиксировать строки с меньшими id уже
+    после курсора. Строки, которые уже в работе (_inflight), пропускаются до удаления или отметки
+    о неудаче.
+    """
+
+    def __init__(
+        self,
+        workers: int = 4,
+        batch_size: int = 500,
+        max_attempts: int = 5,
+        poll_interval: float = 5.0,
+        flush_interval: float = 1.0
+    ):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.flush_interval = flush_interval
+
+        self._bot: Optional[Bot] = None
+        self._queue: Optional[Queue] = None
+        self._wakeup = Event()
+        self._tasks: List[Task] = []
+        self._inflight: Set[int] = set()
+        self._sent_ids: List[int] = []
+        self._chat_limiter = PerKeyRateLimiter(TELEGRAM_PER_CHAT_INTERVAL)
+
+    async def start(self, bot: Bot) -> None:
+        """Запускает feeder, воркеры и сброс доставленных уведомлений."""
+        if self._tasks:
+            return
+
+        self._bot = bot
+        self._queue = Queue(maxsize=self.batch_size * 2)
+        self._inflight.clear()
+
+        purged = await purge_failed_notifications(NOTIFICATION_RETENTION_DAYS)
+        if purged:
+            logger.info("Удалено недоставленных уведомлений: %s", purged)
+
+        self._tasks.append(create_task(self._feed()))
+        self._tasks.append(create_task(self._flush_loop()))
+        self._tasks.extend(create_task(self._work()) for _ in range(self.workers))
+
+        logger.info("Диспетчер уведомлений запущен. workers=%s", self.workers)
+
+    def wake(self) -> None:
+        """Сообщает feeder'у, что в outbox появились новые уведомления."""
+        self._wakeup.set()
+
+    async def stop(self) -> None:
+        """Останавливает воркеры. Неотправленное остаётся в outbox до следующего запуска."""
+        for task in self._tasks:
+            task.cancel()
+        await gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+        await self._flush_sent()
+        logger.info("Диспетчер уведомлений остановлен.")
+
+    @property
+    def queue_size(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    # --- ВНУТРЕННИЕ ЗАДАЧИ ---
+
+    async def _feed(self) -> None:
+        after_id = 0
+        while True:
+            self._wakeup.clear()
+
+            try:
+                batch = await get_pending_notifications(after_id, self.batch_size)
+            except Exception as e:
+                logger.error("Ошибка чтения outbox уведомлений: %s", e, exc_info=True)
+                batch = []
+
+            for item in batch:
+                after_id = item["id"]
+                if item["id"] in self._inflight:
+                    continue
+                self._inflight.add(item["id"])
+                await self._queue.put(item)
+
+            if len(batch) < self.batch_size:
+                # Конец прохода: следующий начнётся с начала outbox
+                after_id = 0
+                try:
+                    await wait_for(self._wakeup.wait(), self.poll_interval)
+                except TimeoutError:
+                    pass
+
+    async def _work(self) -> None:
+        while True:
+            item = await self._queue.get()
+            try:
+                await self._deliver(item)
+            except Exception as e:
+                logger.error("Необработанная ошибка доставки уведомления %s: %s", item["id"], e, exc_info=True)
+                # Строка осталась pending — следующий проход feeder'а возьмёт её снова
+                self._inflight.discard(item["id"])
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, item: Dict[str, Any]) -> None:
+        chat_id = item["chat_id"]
+        attempts = item["attempts"]
+
+        while True:
+            await self._chat_limiter.wait(chat_id)
+            await telegram_send_bucket.acquire()
+            attempts += 1
+
+            try:
+                await self._bot.send_message(chat_id, item["text"])
+                self._sent_ids.append(item["id"])
+                return
+
+            except TelegramRetryAfter as e:
+                # Flood control не считается неудачной попыткой: ждём сколько просит Telegram
+                logger.warning("Flood control при отправке уведомления. Жду %s сек.", e.retry_after)
+                telegram_send_bucket.pause(e.retry_after)
+                attempts -= 1
+
+            except TelegramForbiddenError:
+                await self._mark_unreachable(item, attempts)
+                return
+
+            except TelegramBadRequest as e:
+                if "chat not found" in str(e).lower() or "blocked" in str(e).lower():
+                    await self._mark_unreachable(item, attempts)
+                else:
+                    logger.error("Уведомление %s -> %s отклонено: %s", item["id"], chat_id, e)
+                    await self._mark_failed(item, "failed", attempts)
+                return
+
+            except Exception as e:
+                if attempts >= self.max_attempts:
+                    logger.error("Уведомление %s -> %s не доставлено за %s попыток: %s",
+                                 item["id"], chat_id, attempts, e)
+                    await self._mark_failed(item, "failed", attempts)
+                    return
+
+                backoff = min(60.0, 2 ** attempts) + uniform(0, 1)
+                logger.warning("Ошибка отправки уведомления %s (попытка %s): %s. Повтор через %.1f сек.",
+                               item["id"], attempts, e, backoff)
+                await sleep(backoff)
+
+    async def _mark_unreachable(self, item: Dict[str, Any], attempts: int) -> None:
+        logger.warning("Чат %s недоступен. Сбрасываем привязку для %s.", item["chat_id"], item["track_code"])
+        await self._mark_failed(item, "unreachable", attempts)
+        await mark_users_blocked([item["chat_id"]])
+        if item["track_code"]:
+            await unbind_track_codes([item["track_code"]])
+
+    async def _mark_failed(self, item: Dict[str, Any], status: str, attempts: int) -> None:
+        await mark_notification_failed(item["id"], status, attempts)
+        self._inflight.discard(item["id"])
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await sleep(self.flush_interval)
+            await self._flush_sent()
+
+    async def _flush_sent(self) -> None:
+        if not self._sent_ids:
+            return
+
+        ids, self._sent_ids = self._sent_ids, []
+        try:
+            await delete_sent_notifications(ids)
+        except Exception as e:
+            logger.error("Ошибка очистки outbox уведомлений: %s", e, exc_info=True)
+            self._sent_ids.extend(ids)
+            return
+        # Пока строка не удалена, она pending: снимать её из _inflight раньше — значит отправить повторно
+        self._inflight.difference_update(ids)
+
+
+notification_dispatcher = NotificationDispatcher()
@@ -0,0 +1,30 @@
+from logging import getLogger
+from time import monotonic
+
+from aiogram import Bot
+
+logger = getLogger(__name__)
+
+
+class ThrottledProgress:
+    """Редактирует сообщение с прогрессом не чаще одного раза в interval секунд."""
+
+    def __init__(self, bot: Bot, chat_id: int, message_id: int, interval: float = 1.0):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.interval = interval
+        self._last_edit = 0.0
+        self._last_text = None
+
+    async def update(self, text: str, force: bool = False) -> None:
+        now = monotonic()
+        if text == self._last_text or (not force and now - self._last_edit < self.interval):
+            return
+
+        self._last_edit = now
+        self._last_text = text
+        try:
+            await self.bot.edit_message_text(text=text, chat_id=self.chat_id, message_id=self.message_id)
+        except Exception as e:
+            logger.warning("Не удалось обновить сообщение с прогрессом: %s", e)
@@ -0,0 +1,74 @@
+from asyncio import sleep
+from time import monotonic
+from typing import Dict, Hashable
+
+# Лимиты Telegram Bot API: ~30 сообщений в секунду на бота и ~1 сообщение в секунду в один чат.
+# Берём с запасом, чтобы не ловить flood control на пиках.
+TELEGRAM_GLOBAL_RATE = 25
+TELEGRAM_PER_CHAT_INTERVAL = 1.0
+
+
+class TokenBucket:
+    """Асинхронный token bucket: не больше rate операций в секунду со всплеском до capacity."""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated_at = monotonic()
+        self._paused_until = 0.0
+
+    def _refill(self) -> None:
+        now = monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def pause(self, seconds: float) -> None:
+        """Приостанавливает выдачу токенов (например, после TelegramRetryAfter)."""
+        self._paused_until = max(self._paused_until, monotonic() + seconds)
+        # Токены копятся только после паузы: иначе сразу после неё ушёл бы целый всплеск
+        self._tokens = 0
+        self._updated_at = self._paused_until
+
+    async def acquire(self) -> None:
+        """Ждёт, пока не освободится токен, и забирает его."""
+        while True:
+            pause_left = self._paused_until - monotonic()
+            if pause_left > 0:
+                await sleep(pause_left)
+                continue
+
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+
+            await sleep((1 - self._tokens) / self.rate)
+
+
+class PerKeyRateLimiter:
+    """Выдерживает минимальный интервал между операциями для одного ключа (например, chat_id)."""
+
+    def __init__(self, interval: float, max_keys: int = 10000):
+        self.interval = interval
+        self.max_keys = max_keys
+        self._next_allowed: Dict[Hashable, float] = {}
+
+    def _purge(self, now: float) -> None:
+        self._next_allowed = {key: ts for key, ts in self._next_allowed.items() if ts > now}
+
+    async def wait(self, key: Hashable) -> None:
+        now = monotonic()
+        if len(self._next_allowed) > self.max_keys:
+            self._purge(now)
+
+        slot = max(now, self._next_allowed.get(key, 0.0))
+        self._next_allowed[key] = slot + self.interval
+
+        if slot > now:
+            await sleep(slot - now)
+
+
+# Общий для всего процесса лимит исходящих сообщений (уведомления, рассылки). Оба отправителя работают
+# в одном процессе (входном при BOT_WORKERS > 0), поэтому лимит действует на весь бот
+telegram_send_bucket = TokenBucket(TELEGRAM_GLOBAL_RATE)
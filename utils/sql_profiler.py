@@ -0,0 +1,206 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from logging import getLogger
+from re import compile as re_compile, IGNORECASE
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from filters_and_config import SQL_N1_THRESHOLD
+from utils.metrics import add_query_observer, instrument_engine
+
+logger = getLogger(__name__)
+
+_PLACEHOLDER = r"(?:\?|%s|%\(\w+\)s|:\w+|\$\d+)"
+_NORMALIZE_RULES = (
+    # Списки IN (?, ?, ...) разной длины — один и тот же запрос
+    (re_compile(rf"\bIN\s*\(\s*{_PLACEHOLDER}(?:\s*,\s*{_PLACEHOLDER})*\s*\)", IGNORECASE), "IN (…)"),
+    # Многострочный VALUES (...), (...) — как однострочный
+    (re_compile(r"(\bVALUES\s*\([^()]*\))(?:\s*,\s*\([^()]*\))+", IGNORECASE), r"\1, …"),
+    (re_compile(r"'(?:[^']|'')*'"), "?"),
+    (re_compile(r"\b\d+(?:\.\d+)?\b"), "?"),
+    (re_compile(r"\s+"), " "),
+)
+
+# Сколько разных (хендлер, запрос) помнить — профайлер не должен разрастаться бесконечно
+MAX_OFFENDERS = 500
+SAMPLE_PARAMS_LENGTH = 200
+
+
+def normalize_sql(statement: str) -> str:
+    """Приводит SQL к шаблону: литералы и списки параметров заменяются, пробелы схлопываются."""
+    for pattern, replacement in _NORMALIZE_RULES:
+        statement = pattern.sub(replacement, statement)
+    return statement.strip()
+
+
+@dataclass
+class _StatementStats:
+    count: int = 0
+    seconds: float = 0.0
+    sample_params: str = ""
+
+
+@dataclass
+class UpdateProfile:
+    """Запросы одного апдейта (или фоновой задачи), сгруппированные по шаблону SQL."""
+    label: str
+    statements: Dict[str, _StatementStats] = field(default_factory=dict)
+
+
+@dataclass
+class Offender:
+    """Повторяющийся запрос: сколько апдейтов его повторяли, максимум за апдейт, примеры параметров."""
+    label: str
+    sql: str
+    updates: int = 0
+    max_count: int = 0
+    total_count: int = 0
+    total_seconds: float = 0.0
+    sample_params: List[str] = field(default_factory=list)
+
+
+_current_profile: ContextVar[Optional[UpdateProfile]] = ContextVar("current_sql_profile", default=None)
+
+
+class SQLProfiler:
+    """
+    Профилирование SQL по апдейтам и поиск N+1: если за один апдейт запрос одного шаблона
+    выполнен больше threshold раз, он попадает в отчёт вместе с примерами параметров.
+    Включается админом на время (/sql_profile on); выключенный профайлер ничего не считает.
+    """
+
+    def __init__(self, threshold: int = SQL_N1_THRESHOLD):
+        self.threshold = threshold
+        self.enabled = False
+        self.profiled_updates = 0
+        self.flagged_updates = 0
+        self.offenders: Dict[Tuple[str, str], Offender] = {}
+
+    def enable(self, threshold: Optional[int] = None) -> None:
+        if threshold:
+            self.threshold = threshold
+        self.enabled = True
+        logger.info("SQL-профайлер включён. threshold=%s", self.threshold)
+
+    def disable(self) -> None:
+        self.enabled = False
+        logger.info("SQL-профайлер выключен.\n%s", self.format_report(html=False))
+
+    def reset(self) -> None:
+        self.profiled_updates = 0
+        self.flagged_updates = 0
+        self.offenders.clear()
+
+    @contextmanager
+    def track(self, label: str) -> Iterator[Optional[UpdateProfile]]:
+        """Собирает запросы, выполненные внутри блока (апдейт или фоновая задача)."""
+        if not self.enabled:
+            yield None
+            return
+
+        profile = UpdateProfile(label)
+        token = _current_profile.set(profile)
+        try:
+            yield profile
+        finally:
+            _current_profile.reset(token)
+            self._finish(profile)
+
+    def label_current(self, label: str) -> None:
+        """Уточняет метку текущего профиля (хендлер становится известен после фильтров)."""
+        profile = _current_profile.get()
+        if profile is not None:
+            profile.label = label
+
+    def record(self, statement: str, parameters: Any, seconds: float) -> None:
+        profile = _current_profile.get()
+        if profile is None:
+            return
+
+        sql = normalize_sql(statement)
+        stats = profile.statements.get(sql)
+        if stats is None:
+            stats = profile.statements[sql] = _StatementStats(sample_params=repr(parameters)[:SAMPLE_PARAMS_LENGTH])
+        stats.count += 1
+        stats.seconds += seconds
+
+    def _finish(self, profile: UpdateProfile) -> None:
+        self.profiled_updates += 1
+        flagged = False
+
+        for sql, stats in profile.statements.items():
+            if stats.count <= self.threshold:
+                continue
+            flagged = True
+
+            key = (profile.label, sql)
+            offender = self.offenders.get(key)
+            if offender is None:
+                if len(self.offenders) >= MAX_OFFENDERS:
+                    continue
+                offender = self.offenders[key] = Offender(profile.label, sql)
+
+            offender.updates += 1
+            offender.max_count = max(offender.max_count, stats.count)
+            offender.total_count += stats.count
+            offender.total_seconds += stats.seconds
+            if len(offender.sample_params) < 3:
+                offender.sample_params.append(stats.sample_params)
+
+            logger.warning(
+                "N+1: %s выполнил запрос %s раз за апдейт (%.0f мс): %s",
+                profile.label, stats.count, stats.seconds * 1000, sql[:200]
+            )
+
+        if flagged:
+            self.flagged_updates += 1
+
+    def worst_offenders(self, limit: int = 10) -> List[Offender]:
+        """Худшие повторяющиеся запросы: больше всего суммарного времени, затем повторов."""
+        return sorted(
+            self.offenders.values(),
+            key=lambda item: (item.total_seconds, item.total_count),
+            reverse=True
+        )[:limit]
+
+    def format_report(self, limit: int = 10, html: bool = True) -> str:
+        def code(text: str) -> str:
+            if not html:
+                return text
+            return "<code>" + text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;") + "</code>"
+
+        status = "включён" if self.enabled else "выключен"
+        lines = [
+            f"SQL-профайлер {status}, порог N+1: {self.threshold} одинаковых запросов за апдейт",
+            f"Апдейтов профилировано: {self.profiled_updates}, с повторами: {self.flagged_updates}",
+        ]
+
+        for index, offender in enumerate(self.worst_offenders(limit), 1):
+            lines.append("")
+            lines.append(
+                f"{index}. {offender.label}: до {offender.max_count} раз за апдейт, "
+                f"в {offender.updates} апдейтах, всего {offender.total_seconds * 1000:.0f} мс"
+            )
+            lines.append(code(offender.sql[:500]))
+            for params in offender.sample_params:
+                lines.append("  параметры: " + code(params))
+
+        return "\n".join(lines)
+
+
+sql_profiler = SQLProfiler()
+
+def _on_query(statement: str, parameters: Any, seconds: float) -> None:
+    if sql_profiler.enabled:
+        sql_profiler.record(statement, parameters, seconds)
+
+
+def install_sql_profiler(engine: AsyncEngine) -> None:
+    """
+    Подключает профайлер к замеру запросов из utils.metrics (тот же хук, что и у метрик БД).
+    Пока профайлер выключен, стоимость — одна проверка на запрос.
+    """
+    instrument_engine(engine)
+    add_query_observer(_on_query)
@@ -0,0 +1,144 @@
+from re import compile as re_compile, IGNORECASE, MULTILINE
+from typing import Iterable, List, Optional, Tuple
+
+# Код маркетплейса: 8+ латинских букв/цифр. Код прибывшей посылки: FSXXXX-YYMM-Z, XXXX — внутренний id клиента
+TRACK_CODE_PATTERN = r"[A-Z0-9]{8,}"
+FS_CODE_PATTERN = r"FS[0-9]{4}-[0-9]{4}-[0-9]+"
+
+# Длиннее не бывает ни у одного перевозчика; столько же вмещает колонка track_codes.track_code
+MAX_CODE_LENGTH = 64
+
+MARKETPLACE = "marketplace"
+FS = "fs"
+ALL_KINDS = frozenset((MARKETPLACE, FS))
+
+# FS идёт первым: иначе от «FS0012-2503-4» не останется ничего (FS0012 короче 8 символов).
+# Без групп findall отдаёт готовые строки; FS-код отличается от кода маркетплейса дефисом
+_TOKEN = rf"{FS_CODE_PATTERN}|{TRACK_CODE_PATTERN}"
+_TEXT_RE = re_compile(_TOKEN)
+# Код в начале строки целиком (после него пробел или конец строки — допускается, например, вес),
+# иначе вся непустая строка — отказ, а не обрезанный код («JD-0123456789» не станет «0123456789»).
+# Кортежи (code, rejected). Без учёта регистра: отказ показывается админу так, как он его написал
+_LINE_RE = re_compile(rf"^[ \t]*({_TOKEN})(?=\s|$)|^([^\n]*\S[^\n]*)$", MULTILINE | IGNORECASE)
+# Только FS-коды (файлы прибывших): как раньше, код ищется в любом месте строки (перед ним бывает
+# код маркетплейса), но только отдельным словом — часть более длинного кода не берётся
+_FS_LINE_RE = re_compile(
+    rf"^[^\n]*?(?<![A-Z0-9-])({FS_CODE_PATTERN})(?![A-Z0-9-])|^([^\n]*\S[^\n]*)$", MULTILINE | IGNORECASE
+)
+
+# Сколько отклонённых строк хранить для показа (считаются все)
+MAX_REJECT_SAMPLES = 20
+
+# (код, вид, внутренний id клиента для FS-кодов)
+TrackToken = Tuple[str, str, Optional[int]]
+
+
+class RejectLog:
+    """Счётчик отклонённых строк и первые MAX_REJECT_SAMPLES из них для ответа админу."""
+
+    def __init__(self):
+        self.rejected = 0
+        self.rejects: List[str] = []
+
+    def _reject(self, line: str) -> None:
+        self.rejected += 1
+        if len(self.rejects) < MAX_REJECT_SAMPLES:
+            self.rejects.append(line.strip()[:100])
+
+
+class TrackCodeTokenizer(RejectLog):
+    """
+    Потоковый разбор трек-кодов за один проход регулярного выражения. Текст подаётся кусками (feed),
+    незаконченная строка ждёт следующего куска; close() дочитывает остаток. Коды приводятся
+    к верхнему регистру.
+
+    kinds — какие коды принимать (MARKETPLACE, FS). per_line — одна запись на строку (файлы админки):
+    строка начинается с кода целиком (для одних FS-кодов — содержит FS-код отдельным словом), остальные
+    непустые строки считаются отклонёнными — rejected (сколько всего) и rejects (первые
+    MAX_REJECT_SAMPLES строк). В режиме свободного текста отказы не считаются.
+    """
+
+    def __init__(self, kinds: Iterable[str] = ALL_KINDS, per_line: bool = False):
+        super().__init__()
+        self.kinds = frozenset(kinds)
+        self.per_line = per_line
+        self._tail = ""
+
+    def feed(self, chunk: str) -> List[TrackToken]:
+        text = self._tail + chunk
+        end = text.rfind("\n") + 1
+        self._tail = text[end:]
+        return self._scan(text[:end]) if end else []
+
+    def close(self) -> List[TrackToken]:
+        text, self._tail = self._tail, ""
+        return self._scan(text) if text.strip() else []
+
+    def _scan(self, text: str) -> List[TrackToken]:
+        # findall собирает совпадения на стороне C — в Python остаётся только раскладка по видам
+        tokens: List[TrackToken] = []
+        append = tokens.append
+        accept_marketplace = MARKETPLACE in self.kinds
+        accept_fs = FS in self.kinds
+
+        if not self.per_line:
+            for code in _TEXT_RE.findall(text.upper()):
+                if len(code) > MAX_CODE_LENGTH:
+                    continue
+                if "-" in code:
+                    if accept_fs:
+                        append((code, FS, int(code[2:6])))
+                elif accept_marketplace:
+                    append((code, MARKETPLACE, None))
+            return tokens
+
+        line_re = _FS_LINE_RE if self.kinds == {FS} else _LINE_RE
+        for code, rejected in line_re.findall(text):
+            # Совпадение в исходном регистре: в отказы идёт как есть, в коды — в верхнем регистре
+            if not code:
+                self._reject(rejected)
+            elif len(code) > MAX_CODE_LENGTH:
+                self._reject(code)
+            elif "-" in code:
+                if accept_fs:
+                    append((code.upper(), FS, int(code[2:6])))
+                else:
+                    self._reject(code)
+            elif accept_marketplace:
+                append((code.upper(), MARKETPLACE, None))
+            else:
+                self._reject(code)
+        return tokens
+
+
+def tokenize(
+        text: str,
+        kinds: Iterable[str] = ALL_KINDS,
+        per_line: bool = False
+) -> Tuple[List[TrackToken], TrackCodeTokenizer]:
+    """Разбирает текст целиком. Возвращает коды и токенизатор (в нём отказы)."""
+    tokenizer = TrackCodeTokenizer(kinds, per_line)
+    tokens = tokenizer.feed(text)
+    tokens.extend(tokenizer.close())
+    return tokens, tokenizer
+
+
+def unique_codes(tokens: Iterable[TrackToken]) -> List[str]:
+    """Коды без повторов в порядке первого появления."""
+    return list(dict.fromkeys(token[0] for token in tokens))
+
+
+def extract_track_codes(text: str, kinds: Iterable[str] = ALL_KINDS, per_line: bool = False) -> List[str]:
+    """Уникальные коды из текста (когда отказы не нужны)."""
+    return unique_codes(tokenize(text, kinds, per_line)[0])
+
+
+def format_rejects(log: RejectLog, limit: int = 5) -> str:
+    """Строка для ответа админу: сколько строк не распознано и какие (HTML)."""
+    if not log.rejected:
+        return ""
+    samples = "\n".join(
+        "  <code>" + line.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;") + "</code>"
+        for line in log.rejects[:limit]
+    )
+    return f"⚠️ Не распознано строк: <b>{log.rejected}</b>\n{samples}"
@@ -0,0 +1,66 @@
+from asyncio import Task, create_task, sleep
+from logging import getLogger
+from typing import Optional
+
+from database.db_track_events import purge_track_code_events
+from filters_and_config import TRACK_EVENTS_RETENTION_DAYS
+
+logger = getLogger(__name__)
+
+
+class TrackEventRetention:
+    """
+    Раз в interval секунд удаляет из track_code_events события старше retention_days дней.
+    Удаление идёт пачками с паузой: запись новых событий не ждёт долгой блокировки таблицы.
+
+    Партиционирования по времени нет намеренно. Событий — несколько на код, за год хранения это
+    миллионы строк, и удаление по индексу ts за сутки укладывается в секунды. Для RANGE-партиций MySQL
+    время события пришлось бы включить в первичный ключ, а SQLite (разработка, бенчмарки) их не умеет.
+    Если очистка начнёт занимать минуты, вместо неё стоит перейти на партиции по месяцам.
+    """
+
+    def __init__(
+        self,
+        retention_days: int = TRACK_EVENTS_RETENTION_DAYS,
+        interval: float = 24 * 3600,
+        batch_size: int = 10_000,
+        pause: float = 1.0
+    ):
+        self.retention_days = retention_days
+        self.interval = interval
+        self.batch_size = batch_size
+        self.pause = pause
+        self._task: Optional[Task] = None
+
+    def start(self) -> None:
+        if self._task or self.retention_days <= 0:
+            return
+        self._task = create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def purge(self) -> int:
+        """Удаляет все устаревшие события и возвращает их число."""
+        purged = 0
+        while True:
+            deleted = await purge_track_code_events(self.retention_days, self.batch_size)
+            purged += deleted
+            if deleted < self.batch_size:
+                return purged
+            await sleep(self.pause)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                purged = await self.purge()
+                if purged:
+                    logger.info("Удалено событий истории трек-кодов старше %s дн.: %s", self.retention_days, purged)
+            except Exception as e:
+                logger.error("Ошибка очистки истории трек-кодов: %s", e, exc_info=True)
+            await sleep(self.interval)
+
+
+track_event_retention = TrackEventRetention()
@@ -0,0 +1,150 @@
+from asyncio import Event, Semaphore, Task, create_task, get_running_loop, wait
+from logging import getLogger
+from signal import SIGINT, SIGTERM
+from typing import Any, Dict, Optional, Set
+
+from aiogram import Bot, Dispatcher
+from aiogram.methods import TelegramMethod
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+from filters_and_config import (
+    MAX_CONCURRENT_UPDATES, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET,
+    WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_DRAIN_TIMEOUT
+)
+
+logger = getLogger(__name__)
+
+# Заголовок, в котором Telegram присылает secret_token вебхука
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class BoundedRequestHandler(SimpleRequestHandler):
+    """
+    Обработчик вебхука с ограничением числа одновременно обрабатываемых апдейтов.
+
+    Когда все слоты заняты, ответ Telegram задерживается до освобождения слота —
+    Telegram сам снижает темп доставки, а очередь задач в памяти не растёт.
+    При остановке новые апдейты не принимаются, а уже принятые дорабатываются (drain).
+    Переопределён только публичный handle (маршрут вебхука): апдейт передаётся диспетчеру через
+    feed_raw_update, как в воркерах, без закрытых методов aiogram.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, max_concurrent: int, drain_timeout: float, **kwargs: Any):
+        super().__init__(dispatcher=dispatcher, bot=bot, handle_in_background=True, **kwargs)
+        self.max_concurrent = max_concurrent
+        self.drain_timeout = drain_timeout
+        self._slots = Semaphore(max_concurrent)
+        self._tasks: Set[Task] = set()
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        bot = await self.resolve_bot(request)
+        if not self.verify_secret(request.headers.get(SECRET_HEADER, ""), bot):
+            return web.Response(body="Unauthorized", status=401)
+        update = await request.json(loads=bot.session.json_loads)
+
+        await self._slots.acquire()
+        task = create_task(self._feed_update(bot, update))
+        self._tasks.add(task)
+        task.add_done_callback(self._release)
+
+        return web.json_response({}, dumps=bot.session.json_dumps)
+
+    async def _feed_update(self, bot: Bot, update: Dict[str, Any]) -> None:
+        result = await self.dispatcher.feed_raw_update(bot, update, **self.data)
+        if isinstance(result, TelegramMethod):
+            await self.dispatcher.silent_call_request(bot, result)
+
+    def _release(self, task: Task) -> None:
+        self._tasks.discard(task)
+        self._slots.release()
+
+    async def close(self) -> None:
+        """Дожидается обработки принятых апдейтов. Сессию бота закрывает run_webhook после хуков остановки."""
+        if not self._tasks:
+            return
+
+        logger.info("Webhook: дорабатываем принятые апдейты. in_flight=%s", len(self._tasks))
+        _, pending = await wait(set(self._tasks), timeout=self.drain_timeout)
+
+        if pending:
+            logger.warning("Webhook: не успели обработать %s апдейтов за %.0f с, отменяем.",
+                           len(pending), self.drain_timeout)
+            for task in pending:
+                task.cancel()
+            await wait(pending)
+
+
+def stop_signal_event() -> Event:
+    """Событие, которое выставляется по SIGINT/SIGTERM."""
+    stop = Event()
+    loop = get_running_loop()
+    for sig in (SIGINT, SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:  # Windows
+            pass
+    return stop
+
+
+async def run_webhook(
+    dp: Dispatcher,
+    bot: Bot,
+    handler: Optional[SimpleRequestHandler] = None,
+    **workflow_data: Any
+) -> None:
+    """
+    Запускает бота в режиме вебхука на aiohttp.
+    Хуки dp.startup/dp.shutdown срабатывают так же, как при long polling.
+    handler — свой обработчик запросов (например, раздача апдейтов воркерам), по умолчанию BoundedRequestHandler.
+    """
+    app = web.Application()
+    if handler is None:
+        handler = BoundedRequestHandler(
+            dispatcher=dp,
+            bot=bot,
+            max_concurrent=MAX_CONCURRENT_UPDATES,
+            drain_timeout=WEBHOOK_DRAIN_TIMEOUT,
+            secret_token=WEBHOOK_SECRET,
+            **workflow_data
+        )
+    # Порядок важен: сначала drain апдейтов (handler.close), потом dp.shutdown
+    handler.register(app, path=WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot, **workflow_data)
+
+    async def set_webhook(_: web.Application) -> None:
+        if not WEBHOOK_URL:
+            # Локальный запуск (например, для benchmarks/replay_updates.py) — в Telegram ничего не регистрируем
+            logger.warning("WEBHOOK_URL не задан, вебхук в Telegram не устанавливается.")
+            return
+
+        await bot.set_webhook(
+            url=WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=dp.resolve_used_update_types(),
+            max_connections=min(MAX_CONCURRENT_UPDATES, 100)
+        )
+        logger.info("Webhook установлен: %s%s", WEBHOOK_URL.rstrip("/"), WEBHOOK_PATH)
+
+    async def close_bot_session(_: web.Application) -> None:
+        await bot.session.close()
+
+    app.on_startup.append(set_webhook)
+    app.on_cleanup.append(close_bot_session)
+
+    runner = web.AppRunner(app, handle_signals=False)
+    await runner.setup()
+    site = web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT)
+    await site.start()
+    logger.info("Webhook-сервер слушает %s:%s (max_concurrent=%s)", WEBHOOK_HOST, WEBHOOK_PORT,
+                MAX_CONCURRENT_UPDATES)
+
+    try:
+        await stop_signal_event().wait()
+    finally:
+        logger.info("Webhook-сервер останавливается")
+        await runner.cleanup()
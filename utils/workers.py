@@ -0,0 +1,341 @@
+from asyncio import Lock, Semaphore, Task, create_task, get_running_loop, sleep, to_thread, wait
+from logging import getLogger
+from multiprocessing import get_context, parent_process
+from os import getpid
+from queue import Empty, Full
+from signal import SIGINT, SIG_IGN, signal
+from time import time
+from typing import Any, Callable, Dict, List, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.methods import TelegramMethod
+from aiogram.utils.backoff import Backoff, BackoffConfig
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+from aiohttp import web
+
+from database.db_info_content import info_content_cache
+from filters_and_config import (
+    BOT_RUN_MODE, BOT_WORKERS, MAX_CONCURRENT_UPDATES, WORKER_QUEUE_SIZE,
+    WORKER_HEARTBEAT_INTERVAL, WEBHOOK_DRAIN_TIMEOUT, WEBHOOK_SECRET
+)
+from utils.webhook_server import SECRET_HEADER, run_webhook, stop_signal_event
+
+logger = getLogger(__name__)
+
+# Общий для всех процессов словарь (multiprocessing.Manager): пульс воркеров и версия кэша контента.
+# None — бот работает в одном процессе.
+_shared: Optional[Dict[str, Any]] = None
+# Номер воркера этого процесса (None — входной процесс или один процесс)
+_worker_index: Optional[int] = None
+
+_CONTENT_GENERATION_KEY = "info_content_generation"
+_POLLING_TIMEOUT = 30
+# Как часто воркер проверяет, жив ли входной процесс (секунды)
+_QUEUE_POLL_TIMEOUT = 1.0
+
+
+def routing_key(update: Dict[str, Any]) -> int:
+    """
+    Ключ маршрутизации апдейта: id чата, иначе id пользователя, иначе update_id.
+    Апдейты с одним ключом всегда попадают в один воркер — так сохраняется порядок FSM.
+    """
+    for name, event in update.items():
+        if name == "update_id" or not isinstance(event, dict):
+            continue
+        chat = event.get("chat") or (event.get("message") or {}).get("chat")
+        if chat:
+            return chat["id"]
+        user = event.get("from") or event.get("user")
+        if user:
+            return user["id"]
+    return update.get("update_id", 0)
+
+
+# --- ВХОДНОЙ ПРОЦЕСС ---
+
+class WorkerPool:
+    """Процессы-воркеры и их очереди. Апдейт уходит в воркер по routing_key % workers."""
+
+    def __init__(self, workers: int, target: Callable, queue_size: int = WORKER_QUEUE_SIZE):
+        self.workers = workers
+        self.target = target
+        self._ctx = get_context("spawn")
+        self._manager = self._ctx.Manager()
+        self.shared = self._manager.dict()
+        self._queues = [self._ctx.Queue(maxsize=queue_size) for _ in range(workers)]
+        self._processes: List[Any] = [None] * workers
+        self._routed = [0] * workers
+        self._stopping = False
+        self._monitor_task: Optional[Task] = None
+
+    def _spawn(self, index: int) -> None:
+        process = self._ctx.Process(
+            target=self.target, args=(index, self._queues[index], self.shared),
+            name=f"bot-worker-{index}"
+        )
+        process.start()
+        self._processes[index] = process
+        logger.info("Запущен воркер %s (pid=%s)", index, process.pid)
+
+    def start(self) -> None:
+        for index in range(self.workers):
+            self._spawn(index)
+        self._monitor_task = create_task(self._monitor())
+
+    async def dispatch(self, update: Dict[str, Any]) -> None:
+        """Кладёт апдейт в очередь воркера. Если очередь полна — ждёт (backpressure)."""
+        index = routing_key(update) % self.workers
+        try:
+            self._queues[index].put_nowait(update)
+        except Full:
+            await get_running_loop().run_in_executor(None, self._queues[index].put, update)
+        self._routed[index] += 1
+
+    async def _monitor(self) -> None:
+        """Перезапускает упавшие воркеры и публикует состояние входного процесса."""
+        while not self._stopping:
+            for index, process in enumerate(self._processes):
+                if not process.is_alive() and not self._stopping:
+                    logger.error("Воркер %s завершился (exitcode=%s), перезапускаем", index, process.exitcode)
+                    self._spawn(index)
+
+            await to_thread(self.shared.__setitem__, "ingress", {
+                "pid": getpid(),
+                "ts": time(),
+                "routed": list(self._routed),
+            })
+            await sleep(WORKER_HEARTBEAT_INTERVAL)
+
+    async def stop(self) -> None:
+        """Просит воркеры доработать очереди и завершиться; зависшие завершает принудительно."""
+        if self._stopping:
+            return
+        self._stopping = True
+        if self._monitor_task:
+            self._monitor_task.cancel()
+
+        loop = get_running_loop()
+        for queue in self._queues:
+            await loop.run_in_executor(None, queue.put, None)
+
+        for index, process in enumerate(self._processes):
+            await loop.run_in_executor(None, process.join, WEBHOOK_DRAIN_TIMEOUT)
+            if process.is_alive():
+                logger.warning("Воркер %s не завершился за %.0f с, останавливаем", index, WEBHOOK_DRAIN_TIMEOUT)
+                process.terminate()
+
+        self._manager.shutdown()
+
+
+class FanOutRequestHandler(SimpleRequestHandler):
+    """Обработчик вебхука входного процесса: не обрабатывает апдейты сам, а раздаёт их воркерам."""
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, pool: WorkerPool, **kwargs: Any):
+        super().__init__(dispatcher=dispatcher, bot=bot, handle_in_background=True, **kwargs)
+        self.pool = pool
+
+    async def handle(self, request: web.Request) -> web.Response:
+        bot = await self.resolve_bot(request)
+        if not self.verify_secret(request.headers.get(SECRET_HEADER, ""), bot):
+            return web.Response(body="Unauthorized", status=401)
+        await self.pool.dispatch(await request.json(loads=bot.session.json_loads))
+        return web.json_response({}, dumps=bot.session.json_dumps)
+
+    async def close(self) -> None:
+        await self.pool.stop()
+
+
+async def _poll_into_pool(dp: Dispatcher, bot: Bot, pool: WorkerPool) -> None:
+    """Long polling входного процесса: забирает апдейты и раздаёт их воркерам."""
+    backoff = Backoff(BackoffConfig(min_delay=1.0, max_delay=5.0, factor=1.3, jitter=0.1))
+    allowed_updates = dp.resolve_used_update_types()
+    offset = None
+
+    while True:
+        try:
+            updates = await bot.get_updates(
+                offset=offset, timeout=_POLLING_TIMEOUT, allowed_updates=allowed_updates,
+                request_timeout=int(bot.session.timeout + _POLLING_TIMEOUT)
+            )
+        except Exception as e:
+            logger.error("Не удалось получить апдейты: %s: %s", type(e).__name__, e)
+            await backoff.asleep()
+            continue
+
+        backoff.reset()
+        for update in updates:
+            await pool.dispatch(update.model_dump(mode="json", by_alias=True, exclude_none=True))
+            offset = update.update_id + 1
+
+
+async def run_ingress(dp: Dispatcher, bot: Bot, worker_target: Callable) -> None:
+    """
+    Входной процесс: получает апдейты (polling или webhook) и раздаёт их BOT_WORKERS воркерам.
+    Сам апдейты не обрабатывает; фоновые подсистемы (уведомления) работают здесь в одном экземпляре.
+    """
+    if isinstance(dp.storage, MemoryStorage):
+        logger.warning(
+            "BOT_WORKERS=%s при FSM_STORAGE=memory: состояние анкет живёт внутри воркера "
+            "и теряется при его перезапуске. Рекомендуется FSM_STORAGE=sql или redis.", BOT_WORKERS
+        )
+
+    pool = WorkerPool(BOT_WORKERS, worker_target)
+    pool.start()
+
+    if BOT_RUN_MODE == "webhook":
+        handler = FanOutRequestHandler(dispatcher=dp, bot=bot, pool=pool, secret_token=WEBHOOK_SECRET)
+        await run_webhook(dp, bot, handler=handler, role="ingress")
+        return
+
+    await bot.delete_webhook()
+    await dp.emit_startup(bot=bot, role="ingress", **dp.workflow_data)
+    polling = create_task(_poll_into_pool(dp, bot, pool))
+    try:
+        await stop_signal_event().wait()
+    finally:
+        logger.info("Входной процесс останавливается")
+        polling.cancel()
+        await pool.stop()
+        await dp.emit_shutdown(bot=bot, role="ingress", **dp.workflow_data)
+        await bot.session.close()
+
+
+# --- ВОРКЕР ---
+
+class _ChatQueue:
+    """Последовательная обработка апдейтов одного чата внутри воркера."""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.pending = 0
+
+
+class UpdateWorker:
+    """Читает апдейты из своей очереди и обрабатывает их общим диспетчером."""
+
+    def __init__(self, dp: Dispatcher, bot: Bot, index: int, queue: Any, shared: Dict[str, Any]):
+        self.dp = dp
+        self.bot = bot
+        self.index = index
+        self.queue = queue
+        self.shared = shared
+        self.processed = 0
+        self.errors = 0
+        self.started = time()
+        self._slots = Semaphore(MAX_CONCURRENT_UPDATES)
+        self._chats: Dict[int, _ChatQueue] = {}
+        self._tasks = set()
+        self._seen_generation = None
+        self._seen_invalidations = info_content_cache.invalidations
+
+    async def _process(self, update: Dict[str, Any]) -> None:
+        key = routing_key(update)
+        chat = self._chats.setdefault(key, _ChatQueue())
+        chat.pending += 1
+        try:
+            async with chat.lock:
+                result = await self.dp.feed_raw_update(self.bot, update)
+                if isinstance(result, TelegramMethod):
+                    await self.dp.silent_call_request(self.bot, result)
+                self.processed += 1
+        except Exception as e:
+            self.errors += 1
+            logger.error("Воркер %s: ошибка обработки апдейта %s: %s", self.index, update.get("update_id"), e)
+        finally:
+            chat.pending -= 1
+            if not chat.pending:
+                self._chats.pop(key, None)
+            self._slots.release()
+
+    async def _sync_shared(self) -> None:
+        """Пульс воркера и межпроцессный сброс кэша контента."""
+        invalidations = info_content_cache.invalidations
+        if invalidations != self._seen_invalidations:
+            # Контент меняли в этом воркере — сообщаем остальным
+            self._seen_invalidations = invalidations
+            self._seen_generation = f"{getpid()}:{invalidations}"
+            await to_thread(self.shared.__setitem__, _CONTENT_GENERATION_KEY, self._seen_generation)
+        else:
+            generation = await to_thread(self.shared.get, _CONTENT_GENERATION_KEY)
+            if generation != self._seen_generation:
+                self._seen_generation = generation
+                info_content_cache.invalidate()
+                self._seen_invalidations += 1
+
+        await to_thread(self.shared.__setitem__, self.index, {
+            "pid": getpid(),
+            "ts": time(),
+            "started": self.started,
+            "processed": self.processed,
+            "errors": self.errors,
+            "in_flight": len(self._tasks),
+        })
+
+    async def _heartbeat(self) -> None:
+        while True:
+            await self._sync_shared()
+            await sleep(WORKER_HEARTBEAT_INTERVAL)
+
+    async def run(self) -> None:
+        global _shared, _worker_index
+        _shared = self.shared
+        _worker_index = self.index
+
+        await self.dp.emit_startup(bot=self.bot, role="worker", worker_index=self.index, **self.dp.workflow_data)
+        heartbeat = create_task(self._heartbeat())
+        loop = get_running_loop()
+        logger.info("Воркер %s запущен (pid=%s)", self.index, getpid())
+
+        try:
+            while True:
+                try:
+                    update = await loop.run_in_executor(None, self.queue.get, True, _QUEUE_POLL_TIMEOUT)
+                except Empty:
+                    if not parent_process().is_alive():
+                        logger.error("Воркер %s: входной процесс завершился, останавливаемся", self.index)
+                        break
+                    continue
+
+                if update is None:
+                    break
+
+                await self._slots.acquire()
+                task = create_task(self._process(update))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+            if self._tasks:
+                await wait(set(self._tasks))
+        finally:
+            heartbeat.cancel()
+            await self.dp.emit_shutdown(bot=self.bot, role="worker", **self.dp.workflow_data)
+            await self.bot.session.close()
+
+
+async def run_worker_loop(dp: Dispatcher, bot: Bot, index: int, queue: Any, shared: Dict[str, Any]) -> None:
+    """Точка входа воркера. Ctrl+C приходит всей группе процессов — остановкой управляет входной процесс."""
+    signal(SIGINT, SIG_IGN)
+    await UpdateWorker(dp, bot, index, queue, shared).run()
+
+
+# --- СОСТОЯНИЕ ДЛЯ АДМИНКИ ---
+
+def process_scope_note() -> str:
+    """
+    Пометка для отчётов админки, которые считает каждый процесс отдельно (метрики, SQL-профайлер).
+    Апдейты админа всегда попадают в один воркер, поэтому без пометки частичный отчёт выглядел бы общим.
+    """
+    if _worker_index is None:
+        return ""
+    return (
+        f"\n\nℹ️ Только воркер #{_worker_index} (pid {getpid()}) из {BOT_WORKERS}: каждый процесс считает "
+        f"отдельно. Остальные воркеры — эндпоинты метрик на портах METRICS_PORT + 1 + N, /workers — их пульс."
+    )
+
+
+async def get_workers_status() -> Optional[Dict[str, Any]]:
+    """Снимок пульса входного процесса и воркеров или None, если бот работает в одном процессе."""
+    if _shared is None:
+        return None
+    return await to_thread(dict, _shared)